@@ -0,0 +1,620 @@
+"""
+Banc d’essai hors ligne : les vrais handlers du bot sous charge synthétique.
+
+Aucune connexion à Discord : un faux client (joueurs, MP, salon, interactions)
+remplace la passerelle, et Mongo est soit en mémoire (memoire_mongo.py), soit
+la base dédiée BASE_BANC d’un mongod local (--mongo), jamais celle du bot.
+Pour chaque taille de catalogue synthétique, un flux ouvert d’événements
+(réactions, MP, clics "Accepter", `!mes_quetes`, `!classement`, `!rang`,
+publications du tableau) est injecté au débit demandé dans :
+  on_raw_reaction_add, on_message, BoutonAccepter.callback, mes_quetes,
+  classement_lumes, rang, poster_hebdo.
+Les traitements mis en file par le bot sont attendus : la latence d’un
+événement court jusqu’à la fin de son traitement (MP exclus : ils partent
+en tâche de fond, leur délai de livraison est rapporté à part).
+
+Rapport : p50/p99 par type d’événement, événements/s, appels Mongo par
+événement, retard de la boucle asyncio. Le résultat peut être enregistré
+(--sortie) puis comparé à une référence (--reference).
+
+Usage : python banc_essai.py --quetes 100,1000,10000 --debit 500 --duree 10 --sortie base.json
+"""
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import discord
+
+import maitre_des_quetes as mdq
+from base_donnees import INDEX_JOURNAL, INDEX_PROGRESSION, INDEX_UTILISATEURS, NOM_BASE, BaseDonnees
+from cache_joueurs import CacheJoueurs
+from catalogue import SourceCatalogue
+from classement import Classement
+from compiler_catalogue import compiler
+from envois import FileEnvois
+from file_evenements import FileEvenements
+from journal import JournalQuotidien
+from memoire_mongo import CollectionMemoire
+from pages_joueurs import CachePages
+from rotation import RotationQuetes
+from serveurs import ConfigsServeurs
+
+MIX_DEFAUT = "accepter=20,reaction=40,mp=25,mes_quetes=15,classement=3,rang=3,tableau=0.05"
+# Base dédiée au banc avec --mongo (supprimée avant et après chaque passe)
+BASE_BANC = "lumharel_bot_banc"
+EMOJIS = ["🍃", "🌰", "🍄", "🔥", "🌪️", "❄️", "🌙", "☁️", "🗝️", "🧊", "💫", "🎐"]
+EMOJIS_BRUIT = ["😀", "👍", "❤️", "😂", "🎉"]
+
+# Appels Mongo de l’événement en cours (une liste par tâche)
+_appels_db = contextvars.ContextVar("appels_db", default=None)
+# Traitements mis en file par l’événement en cours (futurs de FileEvenements)
+_en_file = contextvars.ContextVar("en_file", default=None)
+_ids = itertools.count(1)
+
+
+def snowflake() -> int:
+    return discord.utils.time_snowflake(discord.utils.utcnow()) + next(_ids)
+
+
+# ======================
+#  CATALOGUE SYNTHÉTIQUE
+# ======================
+def catalogue_synthetique(n: int, graine: int = 0) -> dict:
+    """n quêtes réparties sur les 4 catégories, au format de quetes.json."""
+    alea = random.Random(graine)
+    brut = {"Quêtes Journalières": [], "Quêtes Interactions": [],
+            "Quêtes Recherches": [], "Quêtes Énigmes": []}
+    prefixes = {"Quêtes Journalières": "QJ", "Quêtes Interactions": "QI",
+                "Quêtes Recherches": "QR", "Quêtes Énigmes": "QE"}
+    for i in range(n):
+        cat = list(brut)[i % 4]
+        quete = {
+            "id": f"{prefixes[cat]}{i:06d}",
+            "nom": f"Quête synthétique {i}",
+            "resume": f"Résumé {i}",
+            "description": f"Description de la quête {i}.",
+            "details_mp": f"Objectif de la quête {i}.",
+            "recompense": alea.randint(1, 10),
+        }
+        if cat in ("Quêtes Journalières", "Quêtes Interactions"):
+            quete["type"] = "reaction"
+            quete["emoji"] = alea.sample(EMOJIS, 2)
+        else:
+            quete["type"] = "texte"
+            quete["reponse_attendue"] = f"reponse {i}"
+            quete["enonce"] = f"Énoncé {i}"
+        brut[cat].append(quete)
+    return brut
+
+
+# ======================
+#  FAUX DISCORD
+# ======================
+class FauxDiscord:
+    """Compte les appels sortants et simule leur latence."""
+
+    def __init__(self, latence=0.0):
+        self.latence = latence
+        self.appels = 0
+
+    async def appel(self):
+        self.appels += 1
+        await asyncio.sleep(self.latence)
+
+
+class FauxMessage:
+    def __init__(self, discord_, contenu=None, embed=None):
+        self._discord = discord_
+        self._state = mdq.bot._connection  # lu par commands.Context (process_commands)
+        self.id = snowflake()
+        self.content = contenu
+        self.embeds = [embed] if embed else []
+        self.author = None
+
+    async def delete(self):
+        await self._discord.appel()
+
+    async def edit(self, **kwargs):
+        await self._discord.appel()
+
+
+class FauxServeur:
+    def __init__(self):
+        self.id = snowflake()
+        self.name = "Lumharel (banc)"
+        self.membres = {}  # tous les joueurs du banc sont membres
+
+    def get_member(self, user_id: int):
+        return self.membres.get(user_id)
+
+
+SERVEUR = FauxServeur()
+
+
+class FauxJoueur:
+    def __init__(self, discord_, user_id: int):
+        self._discord = discord_
+        self.id = user_id
+        self.name = self.display_name = f"joueur{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.mutual_guilds = [SERVEUR]
+        SERVEUR.membres[user_id] = self
+
+    async def send(self, contenu=None, **kwargs):
+        await self._discord.appel()
+        return FauxMessage(self._discord, contenu, kwargs.get("embed"))
+
+
+class FauxMP(discord.DMChannel):
+    """Vrai type DMChannel (pour l’isinstance de on_message), sans état Discord."""
+
+    def __init__(self, discord_, joueur):
+        self._discord = discord_
+        self.joueur = joueur
+        self.id = snowflake()
+
+    async def send(self, contenu=None, **kwargs):
+        await self._discord.appel()
+        return FauxMessage(self._discord, contenu, kwargs.get("embed"))
+
+
+class FauxSalon:
+    def __init__(self, discord_):
+        self._discord = discord_
+        self.id = snowflake()
+        self.name = "quêtes"
+        self.guild = SERVEUR
+
+    async def send(self, contenu=None, **kwargs):
+        await self._discord.appel()
+        message = FauxMessage(self._discord, contenu, kwargs.get("embed"))
+        message.author = mdq.bot.user
+        return message
+
+    async def history(self, limit=100):
+        return
+        yield
+
+    async def delete_messages(self, messages):
+        await self._discord.appel()
+
+    def get_partial_message(self, message_id):
+        return FauxMessage(self._discord)
+
+
+class FausseReponse:
+    def __init__(self, discord_):
+        self._discord = discord_
+        self._faite = False
+
+    def is_done(self):
+        return self._faite
+
+    async def send_message(self, *args, **kwargs):
+        self._faite = True
+        await self._discord.appel()
+
+    async def edit_message(self, **kwargs):
+        self._faite = True
+        await self._discord.appel()
+
+    async def defer(self, **kwargs):
+        self._faite = True
+        await self._discord.appel()
+
+
+class FauxFollowup:
+    def __init__(self, discord_):
+        self._discord = discord_
+
+    async def send(self, *args, **kwargs):
+        await self._discord.appel()
+
+
+class FausseInteraction:
+    def __init__(self, discord_, joueur):
+        self.user = joueur
+        self.guild_id = SERVEUR.id
+        self.response = FausseReponse(discord_)
+        self.followup = FauxFollowup(discord_)
+
+
+class FauxContexte:
+    def __init__(self, discord_, joueur):
+        self._discord = discord_
+        self.author = joueur
+        self.guild = SERVEUR
+
+    async def send(self, contenu=None, **kwargs):
+        await self._discord.appel()
+        return FauxMessage(self._discord, contenu, kwargs.get("embed"))
+
+    reply = send
+
+
+class FauxPayload:
+    def __init__(self, joueur, emoji, salon_id, message_id):
+        self.member = joueur
+        self.user_id = joueur.id
+        self.emoji = emoji
+        self.channel_id = salon_id
+        self.guild_id = SERVEUR.id
+        self.message_id = message_id
+
+
+# ======================
+#  BASE COMPTÉE
+# ======================
+class CollectionComptee:
+    """Compte chaque appel de collection dans l’événement en cours."""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.name = collection.name
+
+    def __getattr__(self, nom):
+        methode = getattr(self._collection, nom)
+
+        async def appeler(*args, **kwargs):
+            appels = _appels_db.get()
+            if appels is not None:
+                appels[0] += 1
+            return await methode(*args, **kwargs)
+        return appeler
+
+
+def vider_base_banc(base):
+    """Supprime la base du banc ; jamais celle du bot."""
+    if base.db.name == NOM_BASE:
+        raise SystemExit(f"❌ Refus de supprimer la base {NOM_BASE} du bot.")
+    base.client.drop_database(base.db.name)
+
+
+def installer_base(mongo_uri, latence_db, workers):
+    """Branche le bot sur une base neuve : en mémoire, ou BASE_BANC sur un mongod local (vidée)."""
+    if mongo_uri:
+        base = BaseDonnees(mongo_uri, nom_base=BASE_BANC)
+        vider_base_banc(base)
+        collections = {"progression": base.progression, "utilisateurs": base.utilisateurs,
+                       "rotation": base.rotation, "tableau": base.tableau, "serveurs": base.serveurs,
+                       "journal": base.journal, "commandes": base.commandes}
+        # Les transactions de terminer_quete passent par ce client (MONGO_TRANSACTIONS=0 si autonome)
+        mdq.base = base
+    else:
+        base = None
+        collections = {nom: CollectionMemoire(nom, latence_db)
+                       for nom in ("progression", "utilisateurs", "rotation", "tableau", "serveurs", "journal",
+                                   "commandes")}
+        mdq.base.transactions = False  # pas de sessions en mémoire
+
+    comptees = {nom: CollectionComptee(c) for nom, c in collections.items()}
+    mdq.progression = comptees["progression"]
+    mdq.utilisateurs = comptees["utilisateurs"]
+    mdq.tableau_collection = comptees["tableau"]
+    mdq.commandes = comptees["commandes"]
+    mdq.rotation = RotationQuetes(comptees["rotation"])
+    mdq.serveurs = ConfigsServeurs(comptees["serveurs"])
+    mdq.cache_joueurs = CacheJoueurs()
+    mdq.cache_pages = CachePages()
+    mdq.classement = Classement(comptees["utilisateurs"])
+    mdq.journal = JournalQuotidien(comptees["journal"], mdq.TZ_PARIS)
+    mdq.file_evenements = FileSuivie(workers)
+    mdq.file_evenements.demarrer()
+    mdq.envois = FileEnvois()
+    mdq.envois.demarrer()
+    return base, collections
+
+
+class FileSuivie(FileEvenements):
+    """
+    File du bot qui rattache chaque traitement à l’événement qui l’a soumis :
+    la latence mesurée va jusqu’à la fin du traitement, et ses appels Mongo
+    sont comptés pour cet événement.
+    """
+
+    def soumettre(self, cle_joueur, priorite, fabrique, cle_fusion=None):
+        appels = _appels_db.get()
+
+        async def fabrique_comptee():
+            _appels_db.set(appels)
+            return await fabrique()
+
+        futur = super().soumettre(cle_joueur, priorite, fabrique_comptee, cle_fusion)
+        suivis = _en_file.get()
+        if futur is not None and suivis is not None:
+            suivis.append(futur)
+        return futur
+
+
+# ======================
+#  SCÉNARIO
+# ======================
+class Mesures:
+    def __init__(self):
+        self.latences = {}   # type -> [s]
+        self.appels_db = {}  # type -> [n]
+        self.erreurs = {}
+        self.retards_boucle = []
+
+    def ajouter(self, genre, latence, appels):
+        self.latences.setdefault(genre, []).append(latence)
+        self.appels_db.setdefault(genre, []).append(appels)
+
+
+def centile(valeurs, p):
+    if not valeurs:
+        return 0.0
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(p / 100 * len(valeurs)))]
+
+
+async def surveiller_boucle(mesures, arret, pas=0.005):
+    while not arret.is_set():
+        debut = time.perf_counter()
+        await asyncio.sleep(pas)
+        mesures.retards_boucle.append(max(0.0, time.perf_counter() - debut - pas))
+
+
+class Generateur:
+    """Produit les événements synthétiques d’un scénario."""
+
+    def __init__(self, catalogue, faux, salon, joueurs, alea):
+        self.catalogue = catalogue
+        self.faux = faux
+        self.salon = salon
+        self.joueurs = joueurs
+        self.alea = alea
+        self.ids = [q["id"] for q in catalogue.toutes]
+        self.a_reponse = [q for q in catalogue.toutes if q.get("reponse_attendue")]
+        self.mps = {}
+
+    def mp(self, joueur):
+        if joueur.id not in self.mps:
+            self.mps[joueur.id] = FauxMP(self.faux, joueur)
+        return self.mps[joueur.id]
+
+    def evenement(self, genre):
+        joueur = self.alea.choice(self.joueurs)
+        if genre == "accepter":
+            bouton = mdq.BoutonAccepter(self.alea.choice(self.ids))
+            return bouton.callback(FausseInteraction(self.faux, joueur))
+        if genre == "reaction":
+            emoji = self.alea.choice(EMOJIS if self.alea.random() < 0.7 else EMOJIS_BRUIT)
+            message_id = self.alea.randrange(20)  # quelques messages "autels"
+            return mdq.on_raw_reaction_add(FauxPayload(joueur, emoji, self.salon.id, message_id))
+        if genre == "mp":
+            message = FauxMessage(self.faux)
+            message.author = joueur
+            message.channel = self.mp(joueur)
+            if self.a_reponse and self.alea.random() < 0.5:
+                message.content = self.alea.choice(self.a_reponse)["reponse_attendue"]
+            else:
+                message.content = f"bonjour {self.alea.random()}"
+            return mdq.on_message(message)
+        if genre == "mes_quetes":
+            return mdq.mes_quetes.callback(FauxContexte(self.faux, joueur))
+        if genre == "classement":
+            return mdq.classement_lumes.callback(FauxContexte(self.faux, joueur))
+        if genre == "rang":
+            return mdq.rang.callback(FauxContexte(self.faux, joueur))
+        if genre == "tableau":
+            return mdq.poster_hebdo()
+        raise ValueError(genre)
+
+
+def charger_catalogue(contenu: bytes, essais: int = 3):
+    """
+    Écrit le catalogue dans un fichier et le charge comme le bot :
+    (source, meilleure durée en s sur `essais` chargements).
+    """
+    with tempfile.NamedTemporaryFile("wb", suffix=".json", delete=False) as f:
+        f.write(contenu)
+    try:
+        durees = []
+        for _ in range(essais):
+            debut = time.perf_counter()
+            source = SourceCatalogue(f.name)
+            source.charger()
+            durees.append(time.perf_counter() - debut)
+        return source, min(durees)
+    finally:
+        os.unlink(f.name)
+
+
+async def executer_scenario(n_quetes, args):
+    # Catalogue : compilé en instantané, écrit puis chargé comme en production ;
+    # le même catalogue en JSON brut est chargé pour comparaison
+    brut = catalogue_synthetique(n_quetes, args.graine)
+    mdq.quetes, chargement = charger_catalogue(compiler([("synthetique", brut)]))
+    _, chargement_brut = charger_catalogue(json.dumps(brut, ensure_ascii=False).encode())
+
+    base, collections = installer_base(args.mongo, args.latence_db / 1000, args.workers)
+    for cles, options in INDEX_PROGRESSION:
+        await collections["progression"].create_index(cles, **options)
+    for cles, options in INDEX_UTILISATEURS:
+        await collections["utilisateurs"].create_index(cles, **options)
+    for cles, options in INDEX_JOURNAL:
+        await collections["journal"].create_index(cles, **options)
+
+    faux = FauxDiscord(args.latence_discord / 1000)
+    salon = FauxSalon(faux)
+    mdq.bot._connection.user = FauxJoueur(faux, 1)
+    mdq.bot.get_channel = lambda _id: salon
+    mdq.bot.get_guild = lambda guild_id: SERVEUR if guild_id == SERVEUR.id else None
+    await mdq.serveurs.definir(SERVEUR.id, salon_quetes=salon.id)
+
+    alea = random.Random(args.graine)
+    joueurs = [FauxJoueur(faux, 1000 + i) for i in range(args.joueurs)]
+    generateur = Generateur(mdq.quetes.actuel, faux, salon, joueurs, alea)
+    genres, poids = zip(*args.mix.items())
+
+    mesures = Mesures()
+    arret = asyncio.Event()
+    moniteur = asyncio.create_task(surveiller_boucle(mesures, arret))
+    en_vol = set()
+
+    async def traiter(genre, prevu):
+        appels = [0]
+        suivis = []
+        _appels_db.set(appels)
+        _en_file.set(suivis)
+        try:
+            await generateur.evenement(genre)
+            await asyncio.gather(*suivis)
+        except Exception as e:
+            mesures.erreurs[f"{genre}: {type(e).__name__}"] = mesures.erreurs.get(f"{genre}: {type(e).__name__}", 0) + 1
+        mesures.ajouter(genre, time.perf_counter() - prevu, appels[0])
+
+    total = int(args.debit * args.duree)
+    debut = time.perf_counter()
+    for i in range(total):
+        prevu = debut + i / args.debit
+        attente = prevu - time.perf_counter()
+        if attente > 0:
+            await asyncio.sleep(attente)
+        tache = asyncio.create_task(traiter(alea.choices(genres, poids)[0], prevu))
+        en_vol.add(tache)
+        tache.add_done_callback(en_vol.discard)
+    await asyncio.gather(*list(en_vol))
+    duree = time.perf_counter() - debut
+    arret.set()
+    await moniteur
+    await mdq.file_evenements.arreter()
+    await mdq.envois.arreter()
+
+    if base is not None:
+        vider_base_banc(base)
+        base.executeur.fermer()
+
+    evenements = sum(len(v) for v in mesures.latences.values())
+    return {
+        "quetes": n_quetes,
+        "chargement_catalogue_ms": round(chargement * 1000, 2),
+        "chargement_brut_ms": round(chargement_brut * 1000, 2),
+        "evenements": evenements,
+        "evenements_s": round(evenements / duree, 1),
+        "appels_discord_par_evenement": round(faux.appels / max(evenements, 1), 2),
+        "file": mdq.file_evenements.stats(),
+        "envois": {k: v for k, v in mdq.envois.stats().items() if k != "workers"},
+        "retard_boucle_ms": {
+            "p50": round(centile(mesures.retards_boucle, 50) * 1000, 3),
+            "p99": round(centile(mesures.retards_boucle, 99) * 1000, 3),
+            "max": round(max(mesures.retards_boucle, default=0) * 1000, 3),
+        },
+        "par_type": {
+            genre: {
+                "n": len(latences),
+                "p50_ms": round(centile(latences, 50) * 1000, 3),
+                "p99_ms": round(centile(latences, 99) * 1000, 3),
+                "appels_db": round(sum(mesures.appels_db[genre]) / len(latences), 2),
+            }
+            for genre, latences in sorted(mesures.latences.items())
+        },
+        "erreurs": mesures.erreurs,
+    }
+
+
+# ======================
+#  RAPPORT
+# ======================
+def afficher(resultat):
+    print(f"\n📊 {resultat['quetes']} quêtes — {resultat['evenements']} événements, "
+          f"{resultat['evenements_s']} évt/s, catalogue chargé en {resultat['chargement_catalogue_ms']} ms "
+          f"(JSON brut : {resultat['chargement_brut_ms']} ms)")
+    r = resultat["retard_boucle_ms"]
+    f = resultat["file"]
+    print(f"   File : profondeur max {f['profondeur_max']}/{f['taille_max']}, "
+          f"rejets={f['rejets']}, fusions={f['fusions']}")
+    e = resultat["envois"]
+    print(f"   Envois : livrés={e['livres']}, regroupés={e['regroupes']}, "
+          f"livraison p99 ≤ {e['latence_p99'] * 1000:g} ms")
+    print(f"   Boucle : retard p50={r['p50']} ms, p99={r['p99']} ms, max={r['max']} ms ; "
+          f"{resultat['appels_discord_par_evenement']} appels Discord/évt")
+    for genre, m in resultat["par_type"].items():
+        print(f"   {genre:<11} n={m['n']:<7} p50={m['p50_ms']:>9.3f} ms  p99={m['p99_ms']:>9.3f} ms  "
+              f"db/évt={m['appels_db']}")
+    for erreur, n in resultat["erreurs"].items():
+        print(f"   ⚠️ {erreur} × {n}")
+
+
+def comparer(resultats, reference, tolerance, debit) -> bool:
+    """
+    Compare les p99 et le débit à une référence ; False si une régression dépasse la tolérance.
+    Le débit n’est comparé qu’à débit demandé égal (en flux ouvert, il le suit tant que rien ne sature).
+    """
+    meme_debit = reference.get("parametres", {}).get("debit") == debit
+    par_taille = {r["quetes"]: r for r in reference["resultats"]}
+    ok = True
+    for r in resultats:
+        ref = par_taille.get(r["quetes"])
+        if ref is None:
+            continue
+        print(f"\n🔁 {r['quetes']} quêtes vs référence")
+        for genre, m in r["par_type"].items():
+            avant = ref["par_type"].get(genre)
+            if not avant or not avant["p99_ms"]:
+                continue
+            ecart = m["p99_ms"] / avant["p99_ms"] - 1
+            regression = ecart > tolerance
+            ok &= not regression
+            print(f"   {'❌' if regression else '✅'} {genre:<11} p99 {avant['p99_ms']} → {m['p99_ms']} ms ({ecart:+.0%})")
+        if meme_debit and ref["evenements_s"] and r["evenements_s"] < ref["evenements_s"] * (1 - tolerance):
+            ok = False
+            print(f"   ❌ débit {ref['evenements_s']} → {r['evenements_s']} évt/s")
+    return ok
+
+
+def lire_mix(texte: str) -> dict:
+    mix = {}
+    for morceau in texte.split(","):
+        genre, _, poids = morceau.partition("=")
+        mix[genre.strip()] = float(poids)
+    return {g: p for g, p in mix.items() if p > 0}
+
+
+async def principal(args):
+    resultats = []
+    for n in args.quetes:
+        resultat = await executer_scenario(n, args)
+        afficher(resultat)
+        resultats.append(resultat)
+    return resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quetes", type=lambda s: [int(x) for x in s.split(",")], default=[100, 1000, 10000],
+                        help="tailles de catalogue, séparées par des virgules (ex. 100,1000,100000)")
+    parser.add_argument("--joueurs", type=int, default=1000)
+    parser.add_argument("--debit", type=float, default=200, help="événements par seconde")
+    parser.add_argument("--duree", type=float, default=5, help="secondes par taille de catalogue")
+    parser.add_argument("--mix", type=lire_mix, default=lire_mix(MIX_DEFAUT),
+                        help=f"poids par type d’événement (défaut : {MIX_DEFAUT})")
+    parser.add_argument("--latence-db", type=float, default=0.5, help="ms par appel (base en mémoire)")
+    parser.add_argument("--latence-discord", type=float, default=20, help="ms par appel Discord simulé")
+    parser.add_argument("--mongo", help=f"URI d’un mongod local à utiliser (base {BASE_BANC}, vidée)")
+    parser.add_argument("--workers", type=int, default=16, help="workers de la file d’événements")
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--sortie", help="fichier JSON où enregistrer les résultats")
+    parser.add_argument("--reference", help="fichier JSON de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="régression p99 tolérée (0.2 = +20 %%)")
+    args = parser.parse_args()
+
+    resultats = asyncio.run(principal(args))
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump({"parametres": {k: v for k, v in vars(args).items() if k not in ("sortie", "reference")},
+                       "resultats": resultats}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.sortie}")
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            if not comparer(resultats, json.load(f), args.tolerance, args.debit):
+                sys.exit(1)
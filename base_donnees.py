@@ -0,0 +1,240 @@
+"""
+Accès MongoDB non bloquant pour le bot.
+
+pymongo est synchrone : chaque appel est exécuté dans un pool de threads borné
+pour ne jamais bloquer la boucle asyncio (heartbeats, interactions Discord).
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import PyMongoError
+
+from metriques import DUREE_MONGO
+
+# Taille du pool de connexions Mongo et nombre de threads d’exécution.
+MONGO_POOL_SIZE = int(os.getenv("MONGO_POOL_SIZE", "20"))
+MONGO_WORKERS = int(os.getenv("MONGO_WORKERS", "8"))
+# Transactions multi-documents (replica set, Atlas) ; 0 pour un mongod autonome
+MONGO_TRANSACTIONS = os.getenv("MONGO_TRANSACTIONS", "1") == "1"
+# Essais d’une transaction sur erreur transitoire (et de sa validation si l’issue est inconnue)
+MONGO_ESSAIS_TRANSACTION = int(os.getenv("MONGO_ESSAIS_TRANSACTION", "3"))
+# Base du bot en production
+NOM_BASE = "lumharel_bot"
+
+# Index de progression_quetes : (clés, options). La progression est propre à chaque serveur.
+INDEX_PROGRESSION = (
+    ([("serveur", ASCENDING), ("user_id", ASCENDING), ("quest_id", ASCENDING), ("statut", ASCENDING)],
+     {"unique": True, "name": "serveur_joueur_quete_statut"}),
+    ([("user_id", ASCENDING), ("statut", ASCENDING)], {"name": "joueur_statut"}),
+)
+# Index remplacés, supprimés par creer_index (l’ancien unique empêchait la même quête sur deux serveurs)
+INDEX_PROGRESSION_OBSOLETES = ("joueur_quete_statut",)
+
+# Index de utilisateurs : classement par Lumes (top-N lu dans l’index, voir classement.py)
+INDEX_UTILISATEURS = (
+    ([("lumes", DESCENDING), ("_id", ASCENDING)], {"name": "classement"}),
+)
+
+# Index de journal_quotidien : une complétion par (serveur, joueur, quête, jour), purge TTL (voir journal.py)
+INDEX_JOURNAL = (
+    ([("serveur", ASCENDING), ("user_id", ASCENDING), ("quest_id", ASCENDING), ("jour", ASCENDING)],
+     {"unique": True, "name": "serveur_joueur_quete_jour"}),
+    ([("expire", ASCENDING)], {"expireAfterSeconds": 0, "name": "expiration"}),
+)
+
+
+def _transitoire(erreur: BaseException) -> bool:
+    """Erreur après laquelle la transaction entière peut être rejouée."""
+    return isinstance(erreur, PyMongoError) and erreur.has_error_label("TransientTransactionError")
+
+
+class ExecuteurMongo:
+    """Pool de threads borné qui exécute les appels pymongo hors de la boucle."""
+
+    def __init__(self, workers=MONGO_WORKERS):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mongo")
+        self._en_attente = 0
+        self._max_en_attente = 0
+
+    async def executer(self, fonction, *args, **kwargs):
+        self._en_attente += 1
+        self._max_en_attente = max(self._max_en_attente, self._en_attente)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, partial(fonction, *args, **kwargs))
+        finally:
+            self._en_attente -= 1
+
+    def etat(self):
+        """Réglages et profondeur de file courante (appels en vol + en attente)."""
+        return {
+            "threads": self.workers,
+            "file_courante": self._en_attente,
+            "file_max": self._max_en_attente,
+        }
+
+    def fermer(self):
+        self._pool.shutdown(wait=False)
+
+
+class CollectionAsync:
+    """Enveloppe awaitable d’une collection pymongo (mêmes noms de méthodes)."""
+
+    def __init__(self, collection, executeur: ExecuteurMongo):
+        self._collection = collection
+        self._executeur = executeur
+
+    @property
+    def name(self):
+        return self._collection.name
+
+    async def _appeler(self, operation, fonction, *args, **kwargs):
+        with DUREE_MONGO.chronometre(operation, self.name):
+            return await self._executeur.executer(fonction, *args, **kwargs)
+
+    async def find_one(self, *args, **kwargs):
+        return await self._appeler("find_one", self._collection.find_one, *args, **kwargs)
+
+    async def find(self, *args, **kwargs):
+        """Retourne la liste complète des documents (à réserver aux petits résultats)."""
+        return await self._appeler("find", lambda: list(self._collection.find(*args, **kwargs)))
+
+    async def count_documents(self, *args, **kwargs):
+        return await self._appeler("count_documents", self._collection.count_documents, *args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        return await self._appeler("insert_one", self._collection.insert_one, *args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs):
+        return await self._appeler("delete_one", self._collection.delete_one, *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return await self._appeler("update_one", self._collection.update_one, *args, **kwargs)
+
+    async def update_many(self, *args, **kwargs):
+        return await self._appeler("update_many", self._collection.update_many, *args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return await self._appeler("find_one_and_update", self._collection.find_one_and_update, *args, **kwargs)
+
+    async def find_one_and_delete(self, *args, **kwargs):
+        return await self._appeler("find_one_and_delete", self._collection.find_one_and_delete, *args, **kwargs)
+
+    async def create_index(self, *args, **kwargs):
+        return await self._appeler("create_index", self._collection.create_index, *args, **kwargs)
+
+    async def index_information(self):
+        return await self._appeler("index_information", self._collection.index_information)
+
+    async def drop_index(self, *args, **kwargs):
+        return await self._appeler("drop_index", self._collection.drop_index, *args, **kwargs)
+
+
+class BaseDonnees:
+    """Client Mongo + collections du bot, toutes accessibles en `await`."""
+
+    def __init__(self, uri, pool_size=MONGO_POOL_SIZE, workers=MONGO_WORKERS, nom_base=NOM_BASE):
+        self.pool_size = pool_size
+        self.transactions = MONGO_TRANSACTIONS
+        # connect=False : rien n’est ouvert à l’import ; la connexion se fait au ping de démarrage
+        self.client = MongoClient(uri, maxPoolSize=pool_size, connect=False)
+        self.executeur = ExecuteurMongo(workers)
+        db = self.client[nom_base]
+        self.db = db
+        # Un document par (joueur, quête, statut) ; remplace quetes_acceptees /
+        # quetes_terminees (voir migrer_progression.py).
+        self.progression = CollectionAsync(db.progression_quetes, self.executeur)
+        self.utilisateurs = CollectionAsync(db.utilisateurs, self.executeur)
+        # Complétions des quêtes journalières, une par jour (voir journal.py)
+        self.journal = CollectionAsync(db.journal_quotidien, self.executeur)
+        # Permutation mélangée + curseur par (tableau, catégorie), voir rotation.py
+        self.rotation = CollectionAsync(db.rotation_quetes, self.executeur)
+        # IDs des messages postés par (salon, catégorie), pour les remplacer sans relire l’historique
+        self.tableau = CollectionAsync(db.messages_tableau, self.executeur)
+        # Configuration par serveur Discord (voir serveurs.py)
+        self.serveurs = CollectionAsync(db.config_serveurs, self.executeur)
+        # Baux d’élection de leader (voir election.py)
+        self.baux = CollectionAsync(db.baux, self.executeur)
+        # Messages de commande déjà pris par une réplique (un seul traitement par message)
+        self.commandes = CollectionAsync(db.commandes_traitees, self.executeur)
+        # Tâches planifiées, lues et écrites directement par APScheduler (MongoDBJobStore)
+        self.nom_taches = "taches_planifiees"
+
+    async def en_transaction(self, fonction):
+        """
+        Exécute `await fonction(session)` en transaction et retourne son résultat.
+        Les écritures de `fonction` reçoivent `session=` : validées ensemble, annulées
+        sur exception. Sur erreur transitoire (étiquette TransientTransactionError,
+        élection, conflit d’écriture), la transaction est rejouée en entier ; si
+        l’issue de la validation est inconnue (UnknownTransactionCommitResult),
+        seule la validation est rejouée. Au plus MONGO_ESSAIS_TRANSACTION essais :
+        `fonction` ne doit rien faire d’autre qu’écrire dans la session.
+        Sans transactions (MONGO_TRANSACTIONS=0), `fonction(None)` : chaque
+        écriture est validée seule.
+        """
+        if not self.transactions:
+            return await fonction(None)
+        session = await self.executeur.executer(self.client.start_session)
+        try:
+            for essai in range(1, MONGO_ESSAIS_TRANSACTION + 1):
+                dernier = essai == MONGO_ESSAIS_TRANSACTION
+                session.start_transaction()
+                try:
+                    resultat = await fonction(session)
+                except BaseException as e:
+                    if session.in_transaction:
+                        await self.executeur.executer(session.abort_transaction)
+                    if not dernier and _transitoire(e):
+                        continue
+                    raise
+                if await self._valider(session, dernier):
+                    return resultat
+        finally:
+            session.end_session()
+
+    async def _valider(self, session, dernier: bool) -> bool:
+        """Valide la transaction ; False si elle est à rejouer en entier."""
+        for essai in range(1, MONGO_ESSAIS_TRANSACTION + 1):
+            try:
+                with DUREE_MONGO.chronometre("commit", "transaction"):
+                    await self.executeur.executer(session.commit_transaction)
+                return True
+            except PyMongoError as e:
+                if essai < MONGO_ESSAIS_TRANSACTION and e.has_error_label("UnknownTransactionCommitResult"):
+                    continue
+                if not dernier and e.has_error_label("TransientTransactionError"):
+                    return False
+                raise
+
+    async def ping(self):
+        """Ouvre la connexion (sélection du serveur) et vérifie que Mongo répond."""
+        with DUREE_MONGO.chronometre("ping", "admin"):
+            await self.executeur.executer(self.client.admin.command, "ping")
+
+    async def creer_index(self):
+        """Crée les index nécessaires (idempotent : sans effet s’ils existent déjà)."""
+        for cles, options in INDEX_PROGRESSION:
+            await self.progression.create_index(cles, **options)
+        existants = await self.progression.index_information()
+        for nom in INDEX_PROGRESSION_OBSOLETES:
+            if nom in existants:
+                await self.progression.drop_index(nom)
+        for cles, options in INDEX_UTILISATEURS:
+            await self.utilisateurs.create_index(cles, **options)
+        for cles, options in INDEX_JOURNAL:
+            await self.journal.create_index(cles, **options)
+        # Les baux expirés sont purgés par Mongo (le code ne s’y fie pas, il compare `expire`)
+        await self.baux.create_index("expire", expireAfterSeconds=0, name="expiration")
+        await self.commandes.create_index("expire", expireAfterSeconds=0, name="expiration")
+
+    def etat(self):
+        return {"pool_mongo": self.pool_size, **self.executeur.etat()}
+
+    def resume(self):
+        e = self.etat()
+        return (f"pool Mongo={e['pool_mongo']}, threads={e['threads']}, "
+                f"file={e['file_courante']} (max {e['file_max']})")
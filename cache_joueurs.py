@@ -0,0 +1,96 @@
+"""
+Cache en mémoire de l’état de quêtes de chaque joueur (IDs acceptés / terminés).
+
+- LRU borné + TTL : un joueur inactif sort du cache, une donnée modifiée
+  ailleurs (autre process, édition manuelle) est relue au bout du TTL ;
+- cache négatif : « aucune quête en cours » est mémorisé comme un état vide ;
+- écriture traversante : les handlers mettent le cache à jour juste après
+  leurs écritures Mongo.
+"""
+import os
+import time
+from collections import OrderedDict
+
+CACHE_JOUEURS_TAILLE = int(os.getenv("CACHE_JOUEURS_TAILLE", "10000"))
+CACHE_JOUEURS_TTL = float(os.getenv("CACHE_JOUEURS_TTL", "300"))
+
+
+class EtatJoueur:
+    __slots__ = ("acceptees", "terminees")
+
+    def __init__(self, acceptees=(), terminees=()):
+        self.acceptees = frozenset(acceptees)
+        self.terminees = frozenset(terminees)
+
+
+class CacheJoueurs:
+    def __init__(self, taille_max=CACHE_JOUEURS_TAILLE, ttl=CACHE_JOUEURS_TTL):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self._entrees = OrderedDict()  # user_id -> (expiration, EtatJoueur)
+        self.hits = 0
+        self.hits_negatifs = 0
+        self.misses = 0
+        # Incrémenté à chaque écriture : une lecture Mongo commencée avant
+        # une écriture ne doit pas écraser le cache avec un état périmé.
+        self.generation = 0
+
+    def get(self, user_id: str):
+        """Retourne l’EtatJoueur en cache, ou None s’il faut relire la base."""
+        entree = self._entrees.get(user_id)
+        if entree is None or entree[0] < time.monotonic():
+            if entree is not None:
+                del self._entrees[user_id]
+            self.misses += 1
+            return None
+        self._entrees.move_to_end(user_id)
+        self.hits += 1
+        if not entree[1].acceptees:
+            self.hits_negatifs += 1
+        return entree[1]
+
+    def mettre(self, user_id: str, etat: EtatJoueur):
+        self._entrees[user_id] = (time.monotonic() + self.ttl, etat)
+        self._entrees.move_to_end(user_id)
+        while len(self._entrees) > self.taille_max:
+            self._entrees.popitem(last=False)
+
+    def mettre_si_inchange(self, user_id: str, etat: EtatJoueur, generation: int):
+        if generation == self.generation:
+            self.mettre(user_id, etat)
+
+    def accepter(self, user_id: str, quete_id: str):
+        self.generation += 1
+        entree = self._entrees.get(user_id)
+        if entree is not None:
+            etat = entree[1]
+            self.mettre(user_id, EtatJoueur(etat.acceptees | {quete_id}, etat.terminees))
+
+    def terminer(self, user_id: str, quete_id: str, rejouable=False):
+        """Une quête rejouable quitte les acceptées sans rejoindre les terminées."""
+        self.generation += 1
+        entree = self._entrees.get(user_id)
+        if entree is not None:
+            etat = entree[1]
+            terminees = etat.terminees if rejouable else etat.terminees | {quete_id}
+            self.mettre(user_id, EtatJoueur(etat.acceptees - {quete_id}, terminees))
+
+    def invalider(self, user_id: str):
+        self.generation += 1
+        self._entrees.pop(user_id, None)
+
+    def vider(self):
+        """Après une écriture en masse (import, attribution de quêtes) : tout sera relu."""
+        self.generation += 1
+        self._entrees.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "taille": len(self._entrees),
+            "taille_max": self.taille_max,
+            "hits": self.hits,
+            "hits_negatifs": self.hits_negatifs,
+            "misses": self.misses,
+            "taux": round(self.hits / total, 3) if total else 0.0,
+        }
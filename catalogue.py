@@ -0,0 +1,307 @@
+"""
+Catalogue des quêtes compilé en mémoire.
+
+Le JSON est lu une seule fois au démarrage puis uniquement quand le fichier
+change (mtime puis empreinte du contenu). Chaque version est un objet
+immuable ; le remplacement est une simple réaffectation, donc atomique pour
+les handlers qui lisent `source.actuel`.
+
+Le fichier peut être un quetes.json brut (vérifié au chargement) ou un
+instantané produit par compiler_catalogue.py : déjà vérifié et normalisé,
+il se charge sans recalcul, après contrôle du sha1 de ses octets.
+"""
+import hashlib
+import json
+import os
+from types import MappingProxyType
+
+from reponses import MoteurReponses, normaliser, variantes_reponse
+
+# Catégories canoniques ; les variantes "(AJOUTS)" y sont rattachées.
+CATEGORIES = (
+    "Quêtes Journalières",
+    "Quêtes Interactions",
+    "Quêtes Recherches",
+    "Quêtes Énigmes",
+)
+
+# Un instantané commence par son en-tête {"format": …} ; un quetes.json brut, jamais
+FORMAT_INSTANTANE = "mdq-catalogue/2"
+PREFIXE_INSTANTANE = b'{"format":'
+TYPES = ("reaction", "texte")
+
+
+class CatalogueInvalide(ValueError):
+    """Catalogue refusé : `erreurs` liste les problèmes trouvés."""
+
+    def __init__(self, erreurs):
+        self.erreurs = list(erreurs)
+        super().__init__(f"{len(self.erreurs)} erreur(s) : " + " ; ".join(self.erreurs[:5])
+                         + (" …" if len(self.erreurs) > 5 else ""))
+
+
+def normaliser_emoji(emoji: str) -> str:
+    """Retire le sélecteur de variante (🌬️ == 🌬) pour comparer les réactions."""
+    return str(emoji).replace("\ufe0f", "").strip()
+
+
+def categorie_canonique(cat: str) -> str:
+    if "Journali" in cat:
+        return "Quêtes Journalières"
+    if "Interaction" in cat:
+        return "Quêtes Interactions"
+    if "Recherche" in cat:
+        return "Quêtes Recherches"
+    if "Énigme" in cat or "Enigme" in cat:
+        return "Quêtes Énigmes"
+    return cat
+
+
+def _texte(valeur) -> bool:
+    return isinstance(valeur, str) and bool(valeur.strip())
+
+
+def verifier_quete(quete, categorie: str) -> list:
+    """Problèmes d’une quête brute : champs nécessaires aux embeds, aux réactions et aux réponses."""
+    if not isinstance(quete, dict):
+        return [f"{categorie} : entrée qui n’est pas un objet ({quete!r:.40})"]
+    qid = str(quete.get("id") or "").upper() or "?"
+    erreurs = []
+    requis = ["id", "nom"]
+    if categorie == "Quêtes Énigmes":
+        if not quete.get("image_url"):
+            requis.append("enonce")
+    else:
+        requis += ["description", "details_mp"]
+    erreurs += [f"{qid} : `{champ}` manquant ou vide" for champ in requis if not _texte(quete.get(champ))]
+    # Résumé du tableau : peut être vide, mais doit exister
+    if not isinstance(quete.get("resume"), str):
+        erreurs.append(f"{qid} : `resume` manquant")
+
+    # Récompense négative possible (quête où le joueur donne des Lumes)
+    recompense = quete.get("recompense")
+    if not isinstance(recompense, int) or isinstance(recompense, bool):
+        erreurs.append(f"{qid} : `recompense` doit être un entier ({recompense!r})")
+
+    genre = quete.get("type")
+    if genre not in TYPES:
+        erreurs.append(f"{qid} : `type` inconnu ({genre!r}), attendu {' ou '.join(TYPES)}")
+    elif genre == "reaction":
+        emojis = quete.get("emoji")
+        emojis = [emojis] if isinstance(emojis, str) else emojis
+        if not emojis or not isinstance(emojis, list) or not all(_texte(e) for e in emojis):
+            erreurs.append(f"{qid} : quête \"reaction\" sans `emoji`")
+    elif not any(normaliser(v) for v in variantes_reponse(quete)):
+        erreurs.append(f"{qid} : quête \"texte\" sans `reponse_attendue`")
+
+    for champ in ("channel", "image_url"):
+        if quete.get(champ) is not None and not _texte(quete[champ]):
+            erreurs.append(f"{qid} : `{champ}` doit être un texte")
+    return erreurs
+
+
+def verifier(brut) -> list:
+    """Problèmes d’un catalogue brut ({catégorie: [quêtes]}) : schéma, catégories, IDs uniques."""
+    if not isinstance(brut, dict):
+        return ["le catalogue doit être un objet {catégorie: [quêtes]}"]
+    erreurs = []
+    vus = set()
+    for cat_brute, liste in brut.items():
+        cat = categorie_canonique(cat_brute)
+        if cat not in CATEGORIES:
+            erreurs.append(f"catégorie inconnue : {cat_brute!r}")
+            continue
+        if not isinstance(liste, list):
+            erreurs.append(f"{cat_brute} : liste de quêtes attendue")
+            continue
+        for quete in liste:
+            erreurs += verifier_quete(quete, cat)
+            qid = str(quete.get("id") or "").upper() if isinstance(quete, dict) else ""
+            if qid in vus:
+                erreurs.append(f"{qid} : ID en double")
+            vus.add(qid)
+    return erreurs
+
+
+class Catalogue:
+    """Vue figée du catalogue : par ID, par catégorie et liste à plat."""
+
+    def __init__(self, brut: dict, version: str):
+        self.version = version
+        par_categorie = {}
+        par_id = {}
+        for cat_brute, quetes in brut.items():
+            cat = categorie_canonique(cat_brute)
+            liste = par_categorie.setdefault(cat, [])
+            for q in quetes:
+                qid = str(q.get("id", "")).upper()
+                if not qid:
+                    continue
+                quete = MappingProxyType({**q, "id": qid, "categorie": cat})
+                liste.append(quete)
+                par_id[qid] = quete
+
+        self.par_categorie = MappingProxyType({c: tuple(l) for c, l in par_categorie.items()})
+        self.par_id = MappingProxyType(par_id)
+        self.toutes = tuple(par_id.values())
+
+        # Réponses attendues normalisées une fois pour toutes
+        self.reponses = MoteurReponses(self.toutes)
+
+        # Index inversé emoji -> {salon (ou None) -> ids des quêtes "reaction"}
+        index = {}
+        for quete in self.toutes:
+            if quete.get("type") != "reaction":
+                continue
+            emojis = quete.get("emoji") or []
+            if isinstance(emojis, str):
+                emojis = [emojis]
+            salon = quete.get("channel")
+            for e in emojis:
+                index.setdefault(normaliser_emoji(e), {}).setdefault(salon, set()).add(quete["id"])
+        self.index_reactions = MappingProxyType({
+            e: MappingProxyType({s: frozenset(ids) for s, ids in par_salon.items()})
+            for e, par_salon in index.items()
+        })
+        self._reactions_tous_salons = {
+            e: frozenset().union(*par_salon.values()) for e, par_salon in self.index_reactions.items()
+        }
+
+    def quete(self, quest_id: str):
+        """Retourne la quête pour un ID donné, sinon None."""
+        return self.par_id.get(quest_id.upper())
+
+    def categorie(self, quest_id: str) -> str:
+        q = self.quete(quest_id)
+        return q["categorie"] if q else "Quête"
+
+    def candidats_reaction(self, emoji: str, salon: str = None) -> frozenset:
+        """
+        IDs des quêtes "reaction" qu’un emoji peut terminer (ensemble vide sinon).
+        Si `salon` est donné, seules les quêtes sans `channel` ou de ce salon comptent.
+        """
+        emoji = normaliser_emoji(emoji)
+        if salon is None:
+            return self._reactions_tous_salons.get(emoji, frozenset())
+        par_salon = self.index_reactions.get(emoji)
+        if not par_salon:
+            return frozenset()
+        return par_salon.get(None, frozenset()) | par_salon.get(salon, frozenset())
+
+    def __len__(self):
+        return len(self.toutes)
+
+
+def empreinte(contenu: bytes) -> str:
+    """Version d’un contenu : début de son sha1."""
+    return hashlib.sha1(contenu).hexdigest()[:12]
+
+
+def serialiser_instantane(categories: dict, sources) -> bytes:
+    """
+    Instantané tel qu’il est écrit : une ligne d’en-tête JSON (format, version,
+    sources) puis les catégories en JSON compact. La version est l’empreinte
+    exacte de ces octets, vérifiée au chargement sans resérialiser.
+    """
+    charge = json.dumps(categories, ensure_ascii=False, separators=(",", ":")).encode()
+    entete = {"format": FORMAT_INSTANTANE, "version": empreinte(charge), "sources": list(sources)}
+    return json.dumps(entete, ensure_ascii=False, separators=(",", ":")).encode() + b"\n" + charge
+
+
+def lire_instantane(contenu: bytes) -> tuple:
+    """(version, catégories) d’un instantané ; lève CatalogueInvalide si modifié, tronqué ou d’un autre format."""
+    ligne, _, charge = contenu.partition(b"\n")
+    try:
+        entete = json.loads(ligne)
+    except ValueError as e:
+        raise CatalogueInvalide([f"instantané : en-tête illisible ({e})"]) from e
+    if not isinstance(entete, dict) or entete.get("format") != FORMAT_INSTANTANE:
+        format_ = entete.get("format") if isinstance(entete, dict) else None
+        raise CatalogueInvalide([f"instantané de format {format_!r}, attendu {FORMAT_INSTANTANE} : "
+                                 "à recompiler avec compiler_catalogue.py"])
+    version = entete.get("version")
+    if not isinstance(version, str):
+        raise CatalogueInvalide(["instantané : `version` absente"])
+    if empreinte(charge) != version:
+        raise CatalogueInvalide([f"instantané : contenu modifié ou tronqué (version {version} ≠ empreinte du contenu)"])
+    try:
+        categories = json.loads(charge)
+    except ValueError as e:
+        raise CatalogueInvalide([f"instantané : JSON illisible ({e})"]) from e
+    if not isinstance(categories, dict) or not all(isinstance(l, list) for l in categories.values()):
+        raise CatalogueInvalide(["instantané : `categories` mal formé"])
+    return version, categories
+
+
+def construire_catalogue(contenu: bytes) -> Catalogue:
+    """Instantané compilé (empreinte vérifiée) ou JSON brut (vérifié) ; lève CatalogueInvalide sinon."""
+    if contenu.startswith(PREFIXE_INSTANTANE):
+        version, categories = lire_instantane(contenu)
+        return Catalogue(categories, version)
+    try:
+        brut = json.loads(contenu)
+    except ValueError as e:
+        raise CatalogueInvalide([f"JSON illisible : {e}"]) from e
+    erreurs = verifier(brut)
+    if erreurs:
+        raise CatalogueInvalide(erreurs)
+    return Catalogue(brut, empreinte(contenu))
+
+
+class SourceCatalogue:
+    """Fichier JSON surveillé ; `actuel` renvoie toujours la dernière version valide."""
+
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+        self._actuel = None
+        self._mtime = None
+        self._empreinte = None
+
+    @property
+    def actuel(self) -> Catalogue:
+        if self._actuel is None:
+            self.charger()
+        return self._actuel
+
+    def charger(self) -> Catalogue:
+        mtime = os.stat(self.chemin).st_mtime_ns
+        with open(self.chemin, "rb") as f:
+            contenu = f.read()
+        self._actuel = construire_catalogue(contenu)
+        self._mtime = mtime
+        self._empreinte = hashlib.sha1(contenu).digest()
+        return self._actuel
+
+    def recharger_si_modifie(self) -> bool:
+        """
+        Recharge si le fichier a changé. Un fichier invalide est ignoré :
+        l’ancienne version reste en service. Retourne True si la version a changé.
+        """
+        try:
+            mtime = os.stat(self.chemin).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime and self._actuel is not None:
+            return False
+
+        try:
+            with open(self.chemin, "rb") as f:
+                contenu = f.read()
+        except OSError as e:
+            # Supprimé ou remplacé entre-temps, droits : relu au prochain passage (mtime non retenu)
+            print(f"❌ Catalogue illisible, version {self._actuel.version if self._actuel else '?'} conservée : {e}")
+            return False
+        self._mtime = mtime
+        empreinte = hashlib.sha1(contenu).digest()
+        if self._actuel is not None and empreinte == self._empreinte:
+            return False
+        self._empreinte = empreinte
+        try:
+            catalogue = construire_catalogue(contenu)
+        except (ValueError, KeyError, AttributeError, TypeError) as e:
+            print(f"❌ Catalogue invalide, version {self._actuel.version if self._actuel else '?'} conservée : {e}")
+            return False
+        if self._actuel is not None and catalogue.version == self._actuel.version:
+            return False
+        self._actuel = catalogue
+        return True
@@ -0,0 +1,121 @@
+"""
+Classement des joueurs par Lumes.
+
+- index descendant sur `utilisateurs.lumes` (voir base_donnees.INDEX_UTILISATEURS) :
+  le top-N se lit dans l’index, sans tri de la collection ;
+- rang = 1 + nombre de joueurs strictement plus riches (ex æquo au même rang),
+  lu par dichotomie (bisect) dans la liste triée de tous les soldes, gardée en
+  mémoire : O(log n) quel que soit le rang. Cette liste est relue avec le top
+  (projection `lumes` seule, un entier par joueur) et chaque complétion y
+  déplace le solde du joueur (insort) ;
+- le classement est global, comme les Lumes (un seul solde par joueur, tous
+  serveurs confondus) : `!classement` n’y nomme que les membres du serveur qui
+  le demande, et seul le propriétaire du bot crée des Lumes (`!recompenser`) ;
+- le top-N est gardé en mémoire : chaque complétion y reporte le nouveau solde
+  (renvoyé par son `$inc`), et il n’est relu en base qu’à l’expiration du TTL
+  (changements faits ailleurs : autre réplique, édition manuelle) ou quand une
+  baisse de solde le rend incomplet.
+"""
+import asyncio
+import bisect
+import os
+import time
+
+from pymongo import ASCENDING, DESCENDING
+
+CLASSEMENT_TAILLE = int(os.getenv("CLASSEMENT_TAILLE", "10"))
+CLASSEMENT_TTL = float(os.getenv("CLASSEMENT_TTL", "300"))
+
+TRI = [("lumes", DESCENDING), ("_id", ASCENDING)]
+
+
+class Classement:
+    def __init__(self, collection, taille=CLASSEMENT_TAILLE, ttl=CLASSEMENT_TTL):
+        self.collection = collection
+        self.taille = taille
+        self.ttl = ttl
+        self._top = []           # [(user_id, pseudo, lumes)], du plus riche au moins riche
+        self._soldes = []        # soldes de tous les joueurs, croissants
+        self._par_joueur = {}    # user_id -> solde présent dans _soldes
+        self._expiration = 0.0   # 0 : à relire
+        self._verrou = asyncio.Lock()
+        self.relectures = 0
+        self.maj_incrementales = 0
+
+    async def _relire(self):
+        docs = await self.collection.find({}, projection={"pseudo": 1, "lumes": 1}, sort=TRI, limit=self.taille)
+        self._top = [(d["_id"], d.get("pseudo"), d.get("lumes", 0)) for d in docs]
+        comptes = await self.collection.find({}, projection={"lumes": 1})
+        self._par_joueur = {d["_id"]: d.get("lumes", 0) for d in comptes}
+        self._soldes = sorted(self._par_joueur.values())
+        self._expiration = time.monotonic() + self.ttl
+        self.relectures += 1
+
+    async def top(self) -> list:
+        """Top-N en cache ; relu au plus une fois à la fois, même sous forte demande."""
+        if self._expiration < time.monotonic():
+            async with self._verrou:
+                if self._expiration < time.monotonic():
+                    await self._relire()
+        return self._top
+
+    def maj(self, user_id: str, pseudo: str, lumes: int):
+        """Report d’un nouveau solde (renvoyé par le `$inc`) dans le top en cache, sans relecture."""
+        if not self._expiration:
+            return
+        self.maj_incrementales += 1
+        self._deplacer_solde(user_id, lumes)
+        ancien = next((e for e in self._top if e[0] == user_id), None)
+        top = [e for e in self._top if e[0] != user_id]
+        top.append((user_id, pseudo, lumes))
+        top.sort(key=_ordre)
+        if len(top) > self.taille:
+            top.pop()  # le nouveau venu n’a pas dépassé le dernier, ou l’a évincé
+        elif ancien is not None and lumes < ancien[2] and len(top) == self.taille and top[-1][0] == user_id:
+            # Un joueur du top est tombé dernier : un joueur hors cache peut le dépasser
+            self._expiration = 0.0
+        self._top = top
+
+    def _deplacer_solde(self, user_id: str, lumes: int):
+        """Remplace le solde du joueur dans la liste triée (ajouté s’il n’y était pas)."""
+        ancien = self._par_joueur.get(user_id)
+        if ancien is not None:
+            del self._soldes[bisect.bisect_left(self._soldes, ancien)]
+        bisect.insort(self._soldes, lumes)
+        self._par_joueur[user_id] = lumes
+
+    async def rang(self, user_id: str):
+        """
+        (rang, lumes) du joueur, ou None s’il n’a pas de compte. Lu dans la liste
+        triée des soldes ; un compte créé depuis la dernière relecture (ailleurs
+        qu’une complétion d’ici) est lu en base puis ajouté à la liste.
+        """
+        top = await self.top()
+        for uid, _, lumes in top:
+            if uid == user_id:
+                # Tous les joueurs plus riches sont dans le top
+                return 1 + sum(1 for e in top if e[2] > lumes), lumes
+        lumes = self._par_joueur.get(user_id)
+        if lumes is None:
+            doc = await self.collection.find_one({"_id": user_id}, projection={"lumes": 1})
+            if doc is None:
+                return None
+            lumes = doc.get("lumes", 0)
+            self._deplacer_solde(user_id, lumes)
+        return 1 + len(self._soldes) - bisect.bisect_right(self._soldes, lumes), lumes
+
+    def invalider(self):
+        self._expiration = 0.0
+
+    def stats(self):
+        return {
+            "taille": len(self._top),
+            "joueurs": len(self._soldes),
+            "relectures": self.relectures,
+            "maj_incrementales": self.maj_incrementales,
+        }
+
+
+def _ordre(entree):
+    """Même ordre que TRI : Lumes décroissantes, puis _id croissant."""
+    return -entree[2], entree[0]
@@ -0,0 +1,93 @@
+"""
+Compilation hors ligne du catalogue : sources JSON -> instantané vérifié.
+
+Fusionne plusieurs fichiers de quêtes (quetes.json, fichiers d’ajouts…),
+rattache les catégories "(AJOUTS)" à leur catégorie canonique, vérifie le
+schéma et l’unicité des IDs, puis pré-normalise emojis et réponses.
+L’instantané écrit (en-tête d’une ligne, puis catégories en JSON compact) est
+versionné par le sha1 de ses octets : le bot le charge sans aucun recalcul
+(QUETES_JSON_PATH=quetes.compile.json).
+Code de sortie 1 et aucun fichier écrit si le catalogue est invalide.
+
+Usage : python compiler_catalogue.py quetes.json [ajouts.json …] [-o quetes.compile.json]
+"""
+import argparse
+import json
+import sys
+import time
+
+from catalogue import (CATEGORIES, CatalogueInvalide, categorie_canonique, construire_catalogue,
+                       normaliser_emoji, serialiser_instantane, verifier)
+from reponses import normaliser, variantes_reponse
+
+
+def fusionner(sources) -> dict:
+    """[(nom, {catégorie: [quêtes]})] -> {catégorie canonique: [quêtes]}, dans l’ordre des sources."""
+    fusion = {}
+    erreurs = []
+    for nom, brut in sources:
+        erreurs += [f"{nom} : {e}" for e in verifier(brut)]
+        if not isinstance(brut, dict):
+            continue
+        for cat_brute, liste in brut.items():
+            if isinstance(liste, list):
+                fusion.setdefault(categorie_canonique(cat_brute), []).extend(liste)
+    # Les IDs doivent aussi être uniques d’un fichier à l’autre
+    erreurs += [e for e in verifier(fusion) if e.endswith("ID en double")]
+    if erreurs:
+        raise CatalogueInvalide(erreurs)
+    return fusion
+
+
+def normaliser_quete(quete, categorie: str) -> dict:
+    compilee = {**quete, "id": str(quete["id"]).upper(), "categorie": categorie}
+    if quete.get("type") == "reaction":
+        emojis = quete["emoji"]
+        emojis = [emojis] if isinstance(emojis, str) else emojis
+        compilee["emoji"] = list(dict.fromkeys(normaliser_emoji(e) for e in emojis))
+    # Pour toutes les quêtes (vide pour la plupart des "reaction") : rien à renormaliser au chargement
+    compilee["reponses_normalisees"] = list(dict.fromkeys(
+        c for c in (normaliser(v) for v in variantes_reponse(quete)) if c))
+    return compilee
+
+
+def compiler(sources) -> bytes:
+    """Octets de l’instantané, prêts à écrire ; lève CatalogueInvalide."""
+    fusion = fusionner(sources)
+    categories = {
+        cat: [normaliser_quete(q, cat) for q in fusion[cat]]
+        for cat in CATEGORIES if cat in fusion
+    }
+    return serialiser_instantane(categories, [nom for nom, _ in sources])
+
+
+def lire_sources(chemins) -> list:
+    sources = []
+    for chemin in chemins:
+        try:
+            with open(chemin, "rb") as f:
+                sources.append((chemin, json.loads(f.read())))
+        except (OSError, ValueError) as e:
+            raise CatalogueInvalide([f"{chemin} : {e}"]) from e
+    return sources
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("sources", nargs="+", help="fichiers JSON {catégorie: [quêtes]}, fusionnés dans l’ordre")
+    parser.add_argument("-o", "--sortie", default="quetes.compile.json")
+    args = parser.parse_args()
+
+    debut = time.perf_counter()
+    try:
+        instantane = compiler(lire_sources(args.sources))
+        catalogue = construire_catalogue(instantane)  # relu comme le bot le chargera
+    except CatalogueInvalide as e:
+        for erreur in e.erreurs:
+            print(f"❌ {erreur}", file=sys.stderr)
+        raise SystemExit(f"❌ Catalogue refusé ({len(e.erreurs)} erreur(s)), rien n’a été écrit.")
+
+    with open(args.sortie, "wb") as f:
+        f.write(instantane)
+    print(f"✅ {len(catalogue)} quêtes compilées depuis {len(args.sources)} source(s) -> {args.sortie} "
+          f"(version {catalogue.version}) en {(time.perf_counter() - debut) * 1000:.0f} ms.")
@@ -0,0 +1,60 @@
+"""
+Élection d’un leader par bail (document Mongo avec date d’expiration).
+
+Toutes les répliques servent les événements ; seul le titulaire du bail fait
+tourner le planificateur (publication des tableaux). Le titulaire renouvelle
+son bail bien avant l’expiration ; s’il disparaît, une autre réplique le
+reprend dès qu’il a expiré. À l’arrêt propre, le bail est libéré tout de
+suite pour un passage de relais sans attente (déploiement sans coupure).
+"""
+import datetime
+import os
+import socket
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+BAIL_DUREE = float(os.getenv("BAIL_DUREE", "30"))
+
+
+def identite_locale() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class Bail:
+    def __init__(self, collection, nom: str, duree=BAIL_DUREE, identite=None):
+        self.collection = collection
+        self.nom = nom
+        self.duree = duree
+        self.identite = identite or identite_locale()
+        self.detenu = False
+
+    async def acquerir(self) -> bool:
+        """Prend le bail s’il est libre ou expiré, le prolonge si on le détient déjà."""
+        maintenant = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": self.nom, "$or": [{"titulaire": self.identite}, {"expire": {"$lt": maintenant}}]},
+                {"$set": {"titulaire": self.identite,
+                          "expire": maintenant + datetime.timedelta(seconds=self.duree),
+                          "renouvele": maintenant}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            self.detenu = doc is not None and doc.get("titulaire") == self.identite
+        except DuplicateKeyError:
+            self.detenu = False  # bail valide détenu par une autre réplique
+        return self.detenu
+
+    async def liberer(self):
+        if self.detenu:
+            await self.collection.update_one(
+                {"_id": self.nom, "titulaire": self.identite},
+                {"$set": {"expire": datetime.datetime.now(datetime.timezone.utc)}},
+            )
+            self.detenu = False
+
+    async def titulaire(self):
+        doc = await self.collection.find_one({"_id": self.nom})
+        return doc.get("titulaire") if doc else None
@@ -0,0 +1,164 @@
+"""
+File des messages sortants (MP et replis dans un salon).
+
+Les handlers confient leurs MP à la file et répondent tout de suite à
+l’interaction. Les MP sont envoyés en tâche de fond :
+- un destinataire à la fois (chaque MP a son propre bucket de rate limit
+  Discord), et au plus ENVOIS_WORKERS envois simultanés en tout ;
+- les messages en attente pour un même destinataire sont regroupés en un
+  seul envoi (textes concaténés, jusqu’à 10 embeds) ;
+- erreurs transitoires réessayées avec backoff (les 429 sont gérés par
+  discord.py) ; si le MP est refusé, le repli du message est appelé.
+"""
+import asyncio
+import os
+import time
+import traceback
+from collections import deque
+
+import discord
+
+from metriques import registre
+from publication import avec_reessais
+
+ENVOIS_WORKERS = int(os.getenv("ENVOIS_WORKERS", "8"))
+ENVOIS_TAILLE_MAX = int(os.getenv("ENVOIS_TAILLE_MAX", "10000"))
+
+# Limites Discord d’un message
+CONTENU_MAX = 2000
+EMBEDS_MAX = 10
+
+LATENCE = registre.histogramme("mdq_envoi_latence_secondes", "Délai entre la mise en file et la livraison.")
+ENVOIS = registre.compteur("mdq_envois_total", "Messages sortants par résultat.", ("resultat",))
+REGROUPES = registre.compteur("mdq_envois_regroupes_total", "Messages regroupés avec un autre envoi.")
+
+
+class Envoi:
+    __slots__ = ("contenu", "embed", "repli", "entree", "futur")
+
+    def __init__(self, contenu, embed, repli, futur):
+        self.contenu = contenu
+        self.embed = embed
+        self.repli = repli
+        self.entree = time.perf_counter()
+        self.futur = futur
+
+
+class FileEnvois:
+    def __init__(self, workers=ENVOIS_WORKERS, taille_max=ENVOIS_TAILLE_MAX):
+        self.workers = workers
+        self.taille_max = taille_max
+        self.profondeur = 0
+        self._par_destinataire = {}  # id -> (destinataire, deque[Envoi])
+        self._prets = None
+        self._taches = []
+
+    @property
+    def active(self) -> bool:
+        return bool(self._taches)
+
+    def demarrer(self):
+        if self._taches:
+            return
+        self._prets = asyncio.Queue()
+        for cle in self._par_destinataire:
+            self._prets.put_nowait(cle)
+        self._taches = [asyncio.create_task(self._worker(), name=f"envois-{i}") for i in range(self.workers)]
+
+    async def arreter(self):
+        for tache in self._taches:
+            tache.cancel()
+        await asyncio.gather(*self._taches, return_exceptions=True)
+        self._taches = []
+
+    def envoyer(self, destinataire, contenu: str = None, *, embed: discord.Embed = None, repli=None):
+        """
+        Met un message en file pour `destinataire` (utilisateur ou salon), sans attendre.
+        `repli()` (coroutine) est appelé si Discord refuse l’envoi (MP fermés).
+        Retourne un futur : True si livré, False sinon ; None si la file est pleine.
+        """
+        if self.profondeur >= self.taille_max:
+            ENVOIS.inc("rejete")
+            return None
+        futur = asyncio.get_running_loop().create_future()
+        cle = destinataire.id
+        entree = self._par_destinataire.get(cle)
+        if entree is None:
+            entree = self._par_destinataire[cle] = (destinataire, deque())
+            if self._prets is not None:
+                self._prets.put_nowait(cle)
+        entree[1].append(Envoi(contenu, embed, repli, futur))
+        self.profondeur += 1
+        return futur
+
+    def _lot(self, file: deque) -> list:
+        """Premiers messages en attente qui tiennent dans un seul message Discord."""
+        lot = [file.popleft()]
+        longueur = len(lot[0].contenu or "")
+        embeds = int(lot[0].embed is not None)
+        while file:
+            suivant = file[0]
+            longueur_suivante = longueur + len(suivant.contenu or "") + 1
+            embeds_suivants = embeds + int(suivant.embed is not None)
+            if longueur_suivante > CONTENU_MAX or embeds_suivants > EMBEDS_MAX:
+                break
+            lot.append(file.popleft())
+            longueur, embeds = longueur_suivante, embeds_suivants
+        REGROUPES.inc(n=len(lot) - 1)
+        return lot
+
+    async def _worker(self):
+        while True:
+            cle = await self._prets.get()
+            destinataire, file = self._par_destinataire[cle]
+            lot = self._lot(file)
+            self.profondeur -= len(lot)
+            try:
+                await self._livrer(destinataire, lot)
+            except Exception as e:
+                print(f"❌ Envoi en échec ({cle}) : {e!r}")
+                traceback.print_exc()
+                ENVOIS.inc("echec", n=len(lot))
+                for envoi in lot:
+                    if not envoi.futur.done():
+                        envoi.futur.set_result(False)
+            finally:
+                # Le destinataire n’est repris qu’après cet envoi : ses messages restent dans l’ordre
+                if file:
+                    self._prets.put_nowait(cle)
+                else:
+                    del self._par_destinataire[cle]
+
+    async def _livrer(self, destinataire, lot):
+        contenu = "\n".join(e.contenu for e in lot if e.contenu) or None
+        embeds = [e.embed for e in lot if e.embed is not None]
+        try:
+            await avec_reessais(lambda: destinataire.send(contenu, embeds=embeds) if embeds
+                                else destinataire.send(contenu))
+            livre = True
+            ENVOIS.inc("livre", n=len(lot))
+        except discord.Forbidden:
+            livre = False
+            ENVOIS.inc("repli", n=len(lot))
+            for envoi in lot:
+                if envoi.repli is not None:
+                    try:
+                        await avec_reessais(envoi.repli)
+                    except discord.HTTPException:
+                        pass
+        fin = time.perf_counter()
+        for envoi in lot:
+            LATENCE.observer(fin - envoi.entree)
+            if not envoi.futur.done():
+                envoi.futur.set_result(livre)
+
+    def stats(self):
+        return {
+            "workers": len(self._taches),
+            "profondeur": self.profondeur,
+            "destinataires": len(self._par_destinataire),
+            "livres": ENVOIS.valeurs.get(("livre",), 0),
+            "replis": ENVOIS.valeurs.get(("repli",), 0),
+            "regroupes": REGROUPES.total(),
+            "latence_p99": LATENCE.quantile(0.99),
+        }
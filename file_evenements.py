@@ -0,0 +1,131 @@
+"""
+File bornée des événements de quêtes, vidée par un pool de workers.
+
+- ordre par joueur : les événements d’un même joueur sont traités un par un,
+  dans leur ordre d’arrivée ; des joueurs différents avancent en parallèle ;
+- priorités : un joueur est repris selon la priorité de son prochain
+  événement (interactions et MP avant les réactions) ;
+- sous pression : au-delà du seuil, les réactions sont refusées ; une
+  réaction identique à une autre encore en attente est fusionnée avec elle ;
+- profondeur, attente, rejets et fusions sont exportés dans les métriques.
+"""
+import asyncio
+import itertools
+import os
+import time
+import traceback
+from collections import deque
+
+from metriques import registre
+
+FILE_WORKERS = int(os.getenv("FILE_WORKERS", "16"))
+FILE_TAILLE_MAX = int(os.getenv("FILE_TAILLE_MAX", "5000"))
+# Part de la file au-delà de laquelle les événements de basse priorité sont refusés
+FILE_SEUIL_PRESSION = float(os.getenv("FILE_SEUIL_PRESSION", "0.8"))
+
+HAUTE = 0  # interactions, MP
+BASSE = 1  # réactions
+
+_NOMS_PRIORITE = {HAUTE: "haute", BASSE: "basse"}
+
+ATTENTE = registre.histogramme("mdq_file_attente_secondes", "Attente dans la file avant traitement.",
+                               ("priorite",))
+REJETS = registre.compteur("mdq_file_rejets_total", "Événements refusés (file pleine ou sous pression).",
+                           ("priorite",))
+FUSIONS = registre.compteur("mdq_file_fusions_total", "Événements identiques fusionnés avec un autre en attente.")
+
+
+class FileEvenements:
+    def __init__(self, workers=FILE_WORKERS, taille_max=FILE_TAILLE_MAX, seuil_pression=FILE_SEUIL_PRESSION):
+        self.workers = workers
+        self.taille_max = taille_max
+        self.seuil = int(taille_max * seuil_pression)
+        self.profondeur = 0
+        self.profondeur_max = 0
+        self._par_joueur = {}   # clé joueur -> deque[(priorité, fabrique, clé de fusion, entrée, futur)]
+        self._en_cours = set()  # joueurs dont un événement est en traitement
+        self._fusion = set()    # clés de fusion en attente
+        self._prets = None      # PriorityQueue[(priorité, n°, clé joueur)]
+        self._ordre = itertools.count()
+        self._taches = []
+
+    @property
+    def active(self) -> bool:
+        return bool(self._taches)
+
+    def demarrer(self):
+        if self._taches:
+            return
+        self._prets = asyncio.PriorityQueue()
+        for cle in self._par_joueur:
+            if cle not in self._en_cours:
+                self._prets.put_nowait((self._par_joueur[cle][0][0], next(self._ordre), cle))
+        self._taches = [asyncio.create_task(self._worker(), name=f"file-{i}") for i in range(self.workers)]
+
+    async def arreter(self):
+        for tache in self._taches:
+            tache.cancel()
+        await asyncio.gather(*self._taches, return_exceptions=True)
+        self._taches = []
+
+    def soumettre(self, cle_joueur, priorite: int, fabrique, cle_fusion=None):
+        """
+        Met en file `fabrique()` (qui crée la coroutine à exécuter), sans attendre.
+        Retourne un futur résolu à la fin du traitement, ou None si l’événement
+        est refusé ou fusionné.
+        """
+        if cle_fusion is not None and cle_fusion in self._fusion:
+            FUSIONS.inc()
+            return None
+        limite = self.seuil if priorite == BASSE else self.taille_max
+        if self.profondeur >= limite:
+            REJETS.inc(_NOMS_PRIORITE[priorite])
+            return None
+
+        futur = asyncio.get_running_loop().create_future()
+        file = self._par_joueur.setdefault(cle_joueur, deque())
+        file.append((priorite, fabrique, cle_fusion, time.perf_counter(), futur))
+        if cle_fusion is not None:
+            self._fusion.add(cle_fusion)
+        self.profondeur += 1
+        self.profondeur_max = max(self.profondeur_max, self.profondeur)
+        if len(file) == 1 and cle_joueur not in self._en_cours and self._prets is not None:
+            self._prets.put_nowait((priorite, next(self._ordre), cle_joueur))
+        return futur
+
+    async def _worker(self):
+        while True:
+            _, _, cle = await self._prets.get()
+            file = self._par_joueur[cle]
+            priorite, fabrique, cle_fusion, entree, futur = file.popleft()
+            self.profondeur -= 1
+            self._fusion.discard(cle_fusion)
+            ATTENTE.observer(time.perf_counter() - entree, _NOMS_PRIORITE[priorite])
+
+            self._en_cours.add(cle)
+            try:
+                resultat = await fabrique()
+                if not futur.done():
+                    futur.set_result(resultat)
+            except Exception as e:
+                print(f"❌ Événement en échec ({cle}) : {e!r}")
+                traceback.print_exc()
+                if not futur.done():
+                    futur.set_exception(e)
+                    futur.exception()  # marquée comme lue : personne n’est obligé de l’attendre
+            finally:
+                self._en_cours.discard(cle)
+                if file:
+                    self._prets.put_nowait((file[0][0], next(self._ordre), cle))
+                else:
+                    del self._par_joueur[cle]
+
+    def stats(self):
+        return {
+            "workers": len(self._taches),
+            "profondeur": self.profondeur,
+            "profondeur_max": self.profondeur_max,
+            "taille_max": self.taille_max,
+            "rejets": REJETS.total(),
+            "fusions": FUSIONS.total(),
+        }
@@ -0,0 +1,59 @@
+"""
+Journal des complétions de quêtes rejouables (journalières), une entrée par jour.
+
+Une quête journalière terminée n’est pas ajoutée aux terminées permanentes :
+elle est inscrite dans `journal_quotidien` sous la clé (serveur, joueur, quête,
+jour à Paris). L’index unique sur cette clé garantit une seule complétion par
+jour, même entre process ; la vérification avant acceptation est une lecture
+ponctuelle dans cet index. Le jour change à minuit heure de Paris, et chaque
+entrée porte une date `expire` (fin de son jour + JOURNAL_RETENTION_JOURS) :
+l’index TTL purge les anciennes entrées, la collection reste de taille bornée.
+"""
+import datetime
+import os
+
+JOURNAL_RETENTION_JOURS = int(os.getenv("JOURNAL_RETENTION_JOURS", "7"))
+
+# Catégories rejouables une fois par jour
+CATEGORIES_QUOTIDIENNES = ("Quêtes Journalières",)
+
+
+class JournalQuotidien:
+    def __init__(self, collection, tz, retention=JOURNAL_RETENTION_JOURS):
+        self.collection = collection
+        self.tz = tz
+        self.retention = retention
+
+    def jour(self, maintenant=None) -> datetime.date:
+        """Jour courant à l’heure locale du fuseau (Paris)."""
+        return (maintenant or datetime.datetime.now(self.tz)).astimezone(self.tz).date()
+
+    def fin_du_jour(self, jour: datetime.date) -> datetime.datetime:
+        """Minuit local suivant `jour` (remise à zéro), en UTC ; tient compte des changements d’heure."""
+        minuit = datetime.datetime.combine(jour + datetime.timedelta(days=1), datetime.time())
+        return self.tz.localize(minuit).astimezone(datetime.timezone.utc)
+
+    def _cle(self, espace: str, user_id: str, quest_id: str, jour: datetime.date) -> dict:
+        return {"serveur": espace, "user_id": user_id, "quest_id": quest_id, "jour": jour.isoformat()}
+
+    async def fait_aujourdhui(self, espace: str, user_id: str, quest_id: str, maintenant=None) -> bool:
+        doc = await self.collection.find_one(
+            self._cle(espace, user_id, quest_id, self.jour(maintenant)), projection={"_id": 1},
+        )
+        return doc is not None
+
+    async def inscrire(self, espace: str, user, quete, maintenant=None, session=None) -> dict:
+        """
+        Inscrit la complétion du jour et retourne sa clé (pour `retirer`).
+        Lève DuplicateKeyError si la quête a déjà été faite aujourd’hui.
+        """
+        jour = self.jour(maintenant)
+        cle = self._cle(espace, str(user.id), quete["id"], jour)
+        await self.collection.insert_one({
+            **cle, "nom": quete["nom"], "pseudo": user.name,
+            "expire": self.fin_du_jour(jour) + datetime.timedelta(days=self.retention),
+        }, session=session)
+        return cle
+
+    async def retirer(self, cle: dict):
+        await self.collection.delete_one(cle)
@@ -1,78 +1,57 @@
 import os
-import re
-import json
-import unicodedata
-from random import choice
+import asyncio
+import datetime
+import tempfile
+import time
+import weakref
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ui import View
-from pymongo import MongoClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
 
+from apscheduler.jobstores.mongodb import MongoDBJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 import pytz
 
-# --- Loader quetes + index par ID ------------------------------------------
-import json
-import os
-
-# Chemin vers ton JSON (adapte si besoin)
+from base_donnees import BaseDonnees
+from cache_joueurs import CacheJoueurs, EtatJoueur
+import metriques
+from metriques import COMPLETIONS, DUREE_TACHE, LUMES, QUETES_TROUVEES, mesure
+from catalogue import CatalogueInvalide, SourceCatalogue
+from classement import Classement
+from election import BAIL_DUREE, Bail
+from envois import FileEnvois
+from file_evenements import BASSE, HAUTE, FileEvenements
+from journal import CATEGORIES_QUOTIDIENNES, JournalQuotidien
+from operations_masse import accorder_quete, attribuer_lumes, exporter, importer
+from pages_joueurs import CachePages, lignes_quetes, paginer
+from publication import Buckets, RapportPublication, avec_reessais
+from rendu import EMOJI_PAR_CATEGORIE, Rendu
+from rotation import RotationQuetes
+from serveurs import SERVEURS_INTERVALLE, ConfigsServeurs
+
+# --- Catalogue des quêtes ------------------------------------------------
+# Chemin vers ton JSON (adapte si besoin) : quetes.json brut ou instantané de compiler_catalogue.py
 CHEMIN_QUETES = os.getenv("QUETES_JSON_PATH", "quetes.json")
+# Intervalle (s) de vérification du fichier pour le rechargement à chaud
+CATALOGUE_INTERVALLE = int(os.getenv("CATALOGUE_INTERVALLE", "30"))
+# Si activé, les réponses en MP tolèrent une faute de frappe (bornée selon la longueur)
+REPONSES_TOLERANTES = os.getenv("REPONSES_TOLERANTES", "0") == "1"
+# Si activé, une quête "reaction" avec un champ `channel` ne compte que dans ce salon
+REACTIONS_PAR_SALON = os.getenv("REACTIONS_PAR_SALON", "0") == "1"
 
-# Cache global
-QUETES_RAW = None
-QUETES_INDEX = {}   # {"QE012": {"id": "...", ...}, ...}
-CATEGORIE_PAR_ID = {}  # {"QE012": "Quêtes Énigmes", ...}
-
-def charger_toutes_les_quetes():
-    global QUETES_RAW, QUETES_INDEX, CATEGORIE_PAR_ID
-    if QUETES_RAW is not None:
-        return  # déjà chargé
-
-    with open(CHEMIN_QUETES, "r", encoding="utf-8") as f:
-        QUETES_RAW = json.load(f)
-
-    QUETES_INDEX.clear()
-    CATEGORIE_PAR_ID.clear()
-
-    # Liste des catégories possibles selon ta structure
-    categories_possibles = [
-        "Quêtes Interactions",
-        "Quêtes Recherches",
-        "Quêtes Énigmes",
-        # si tu as aussi les "(AJOUTS)" dans un autre fichier/canvas, ajoute-les ici :
-        "Quêtes Interactions (AJOUTS)",
-        "Quêtes Recherches (AJOUTS)",
-        "Quêtes Énigmes (AJOUTS)",
-    ]
-
-    for cat in categories_possibles:
-        if cat not in QUETES_RAW:
-            continue
-        for q in QUETES_RAW[cat]:
-            qid = q.get("id", "").upper()
-            if not qid:
-                continue
-            QUETES_INDEX[qid] = q
-            # si tes ajouts portent la même nature, on “normalize” la catégorie
-            if "Interaction" in cat:
-                CATEGORIE_PAR_ID[qid] = "Quêtes Interactions"
-            elif "Recherche" in cat:
-                CATEGORIE_PAR_ID[qid] = "Quêtes Recherches"
-            elif "Énigme" in cat or "Enigme" in cat:
-                CATEGORIE_PAR_ID[qid] = "Quêtes Énigmes"
-            else:
-                CATEGORIE_PAR_ID[qid] = cat
+# Source unique partagée par tous les handlers : `quetes.actuel` est le catalogue en service.
+quetes = SourceCatalogue(CHEMIN_QUETES)
 
 def charger_quete_par_id(quest_id: str):
-    """Retourne l'objet quête (dict) pour un ID donné, sinon None."""
-    charger_toutes_les_quetes()
-    return QUETES_INDEX.get(quest_id.upper())
+    """Retourne l'objet quête pour un ID donné, sinon None."""
+    return quetes.actuel.quete(quest_id)
 
 def categorie_par_id(quest_id: str) -> str:
-    charger_toutes_les_quetes()
-    return CATEGORIE_PAR_ID.get(quest_id.upper(), "Quête")
+    return quetes.actuel.categorie(quest_id)
 
 # ======================
 #  CONFIG DISCORD & DB
@@ -82,344 +61,973 @@ intents.message_content = True
 intents.members = True
 intents.reactions = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+def lire_shards(texte: str):
+    """ "0-3,8" -> [0, 1, 2, 3, 8] ; vide -> None (tous les shards dans ce process)."""
+    if not texte.strip():
+        return None
+    ids = []
+    for morceau in texte.split(","):
+        debut, _, fin = morceau.strip().partition("-")
+        ids.extend(range(int(debut), int(fin or debut) + 1))
+    return sorted(set(ids))
+
+# Répartition de la passerelle : SHARD_COUNT shards au total (0 : nombre conseillé par
+# Discord), dont ce process ne sert que SHARDS (tous si vide). Les process d’une même
+# plage sont des répliques : elles se partagent le scheduler de cette plage.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARDS = lire_shards(os.getenv("SHARDS", ""))
+GROUPE_SHARDS = os.getenv("SHARDS", "").strip() or "tous"
+
+class MaitreDesQuetes(commands.AutoShardedBot):
+    async def setup_hook(self):
+        # Une seule fois, avant la connexion à la passerelle (on_ready, lui, revient à chaque reconnexion)
+        await demarrer()
+
+    async def close(self):
+        # Bail rendu tout de suite : la réplique suivante reprend le scheduler sans attendre l’expiration
+        if maintenir_bail.is_running():
+            maintenir_bail.cancel()
+        if _scheduler is not None and _scheduler.running:
+            _scheduler.shutdown(wait=False)
+        try:
+            await bail_planificateur.liberer()
+        except PyMongoError:
+            pass
+        await super().close()
+
+bot = MaitreDesQuetes(command_prefix="!", intents=intents,
+                      shard_count=SHARD_COUNT or None, shard_ids=SHARDS if SHARD_COUNT else None)
+# Durée de chaque requête HTTP Discord, par route
+metriques.instrumenter_http(bot.http)
 
 MONGO_URI = os.getenv("MONGO_URI")
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
+# Serveur historique, repris dans config_serveurs au premier démarrage (voir serveurs.py)
 QUESTS_CHANNEL_ID = int(os.getenv("QUESTS_CHANNEL_ID", "0"))
 ANNOUNCE_CHANNEL_ID = int(os.getenv("ANNOUNCE_CHANNEL_ID", "0"))  # optionnel
-
-client = MongoClient(MONGO_URI)
-db = client.lumharel_bot
-accepted_collection = db.quetes_acceptees
-completed_collection = db.quetes_terminees
-utilisateurs = db.utilisateurs
-rotation_collection = db.rotation_quetes
+ANNOUNCE_ROLE_ID = int(os.getenv("ANNOUNCE_ROLE_ID", "1345479226886979641"))  # optionnel
+
+# Accès Mongo non bloquant : chaque appel s’attend (`await`), exécuté hors de la boucle.
+base = BaseDonnees(MONGO_URI)
+progression = base.progression
+utilisateurs = base.utilisateurs
+tableau_collection = base.tableau
+commandes = base.commandes
+
+STATUT_ACCEPTEE = "acceptee"
+STATUT_TERMINEE = "terminee"
+
+# Permutation + curseur par (tableau, catégorie), avancés atomiquement en base
+rotation = RotationQuetes(base.rotation)
+
+# Salons et rôle de chaque serveur, en mémoire (relus toutes les SERVEURS_INTERVALLE s)
+serveurs = ConfigsServeurs(base.serveurs)
+
+# IDs acceptés / terminés par (serveur, joueur), mis à jour par les handlers après chaque écriture
+cache_joueurs = CacheJoueurs()
+# Pages de `!mes_quetes` déjà rendues, invalidées à chaque acceptation / complétion
+cache_pages = CachePages()
+# Top des Lumes en mémoire, tenu à jour par les complétions (relu à l’expiration du TTL)
+classement = Classement(utilisateurs)
+
+# Événements de quêtes (réactions, MP, acceptations) : file bornée + pool de workers
+file_evenements = FileEvenements()
+# MP et replis en salon : envoyés en tâche de fond, regroupés par destinataire
+envois = FileEnvois()
+
+metriques.registre.jauge("mdq_file_profondeur", "Événements en attente dans la file.",
+                         lambda: file_evenements.profondeur)
+metriques.registre.jauge("mdq_envois_profondeur", "Messages sortants en attente.",
+                         lambda: envois.profondeur)
+metriques.registre.jauge("mdq_cache_joueurs_hits", "Lectures servies par le cache joueurs.",
+                         lambda: cache_joueurs.hits)
+metriques.registre.jauge("mdq_cache_joueurs_misses", "Lectures du cache joueurs relues en base.",
+                         lambda: cache_joueurs.misses)
+metriques.registre.jauge("mdq_cache_pages_hits", "Pages de !mes_quetes servies depuis le cache.",
+                         lambda: cache_pages.hits)
+metriques.registre.jauge("mdq_demarrage_secondes", "Durée de la séquence de démarrage (setup_hook).",
+                         lambda: duree_demarrage.get("total", 0.0))
+metriques.registre.jauge("mdq_mongo_file", "Appels Mongo en vol ou en attente.",
+                         lambda: base.executeur.etat()["file_courante"])
 
 TZ_PARIS = pytz.timezone("Europe/Paris")
 
-# ======================
-#  CONSTANTES UI
-# ======================
-EMOJI_PAR_CATEGORIE = {
-    "Quêtes Journalières": "🕘",
-    "Quêtes Interactions": "🕹️",
-    "Quêtes Recherches": "🔍",
-    "Quêtes Énigmes": "🧩",
-}
-COULEURS_PAR_CATEGORIE = {
-    "Quêtes Journalières": 0x4CAF50,
-    "Quêtes Interactions": 0x2196F3,
-    "Quêtes Recherches": 0x9C27B0,
-    "Quêtes Énigmes": 0xFFC107,
-}
+# Complétions des journalières : une par jour (heure de Paris), purgées par TTL
+journal = JournalQuotidien(base.journal, TZ_PARIS)
+
+# Embeds des quêtes, rendus une fois par version du catalogue
+rendu = Rendu()
 
 # ======================
 #  UTILS
 # ======================
-def ids_quetes(liste):
-    return [q["id"] if isinstance(q, dict) else q for q in liste]
-
-def normaliser(texte):
-    if not isinstance(texte, str):
-        return ""
-    texte = texte.lower().strip()
-    texte = unicodedata.normalize("NFKD", texte)
-    texte = "".join(c for c in texte if not unicodedata.combining(c))
-    texte = texte.replace("’", "'")
-    texte = re.sub(r'[“”«»]', '"', texte)
-    texte = re.sub(r"\s+", " ", texte)
-    texte = texte.replace("\u200b", "")
-    return texte
-
-def charger_quetes():
-    with open("quetes.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-    # Injecter la catégorie dans chaque quête
-    for categorie, quetes in data.items():
-        for quete in quetes:
-            quete["categorie"] = categorie
-    return data
-
-async def purger_messages_categorie(channel: discord.TextChannel, categorie: str, limit=100):
+def cle_joueur(espace: str, user_id: str) -> str:
+    """Clé des caches joueurs : la progression est propre à chaque serveur."""
+    return f"{espace}:{user_id}"
+
+async def etat_joueur(espace: str, user_id: str) -> EtatJoueur:
+    """IDs des quêtes acceptées et terminées d’un joueur sur un serveur (cache, sinon Mongo)."""
+    cle = cle_joueur(espace, user_id)
+    etat = cache_joueurs.get(cle)
+    if etat is not None:
+        return etat
+    generation = cache_joueurs.generation
+    docs = await progression.find({"serveur": espace, "user_id": user_id}, {"_id": 0, "quest_id": 1, "statut": 1})
+    etat = EtatJoueur(
+        [d["quest_id"] for d in docs if d["statut"] == STATUT_ACCEPTEE],
+        [d["quest_id"] for d in docs if d["statut"] == STATUT_TERMINEE],
+    )
+    cache_joueurs.mettre_si_inchange(cle, etat, generation)
+    return etat
+
+def configs_partagees(user) -> list:
+    """Configs des serveurs configurés que le joueur partage avec ce process."""
+    configs = (serveurs.get(g.id) for g in getattr(user, "mutual_guilds", ()))
+    return [c for c in configs if c is not None]
+
+# Les MP arrivent tous au shard 0 : quand la passerelle est répartie (SHARDS), ce
+# process ne voit dans `user.mutual_guilds` que ses propres serveurs, et son cache
+# joueurs ignore les écritures des autres process. Les serveurs du joueur sont alors
+# lus en base (index joueur_statut). Un process qui sert tous les shards voit tous
+# les serveurs du joueur : ses quêtes en cours viennent du cache joueurs.
+async def quetes_en_cours(user) -> dict:
+    """{espace: IDs des quêtes acceptées} du joueur, sur tous les serveurs."""
+    user_id = str(user.id)
+    par_espace = {}
+    if SHARDS is None:
+        for config in configs_partagees(user):
+            acceptees = (await etat_joueur(config.espace, user_id)).acceptees
+            if acceptees:
+                par_espace.setdefault(config.espace, set()).update(acceptees)
+        return par_espace
+    docs = await progression.find({"user_id": user_id, "statut": STATUT_ACCEPTEE},
+                                  {"_id": 0, "serveur": 1, "quest_id": 1})
+    for d in docs:
+        if "serveur" in d:
+            par_espace.setdefault(d["serveur"], set()).add(d["quest_id"])
+    return par_espace
+
+async def espace_mp(user):
+    """
+    Serveur affiché par `!mes_quetes` en MP : un serveur où le joueur a une quête
+    en cours, sinon un serveur partagé visible ici, sinon un serveur où il a joué.
+    """
+    en_cours = await quetes_en_cours(user)
+    if en_cours:
+        return min(en_cours)
+    partages = configs_partagees(user)
+    if partages:
+        return partages[0].espace
+    doc = await progression.find_one({"user_id": str(user.id), "serveur": {"$exists": True}},
+                                     {"_id": 0, "serveur": 1})
+    return doc["serveur"] if doc else None
+
+async def crediter(user, lumes: int, session=None):
+    """Verse des Lumes (compte créé au besoin) ; retourne le document avec le nouveau solde."""
+    return await utilisateurs.find_one_and_update(
+        {"_id": str(user.id)},
+        {"$inc": {"lumes": lumes},
+         "$setOnInsert": {"pseudo": user.name, "derniere_offrande": {}, "roles_temporaires": {}}},
+        projection={"lumes": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+
+class QueteDejaTerminee(Exception):
+    """La quête figure déjà dans les terminées du joueur : rien n’est payé."""
+
+
+async def enregistrer_completion(espace: str, user, quete, rejouable: bool):
+    """
+    Retire l’acceptation, écrit l’historique (terminées, ou journal du jour pour une
+    journalière) et verse la récompense. Retourne le compte avec son nouveau solde,
+    ou None si la quête n’était plus acceptée. Lève DuplicateKeyError si la
+    journalière a déjà été faite aujourd’hui, QueteDejaTerminee si la quête figure
+    déjà dans les terminées (acceptation restée d’un ancien état) : l’upsert n’a
+    alors rien inséré et la transaction est annulée sans paiement.
+    Dans une transaction, c’est tout ou rien, rejouée sur erreur transitoire
+    (voir BaseDonnees.en_transaction). Sans transactions (mongod autonome), un
+    échec après la réclamation retire l’entrée du journal ou la terminée déjà
+    écrite et restaure l’acceptation : le joueur peut réessayer, rien n’est
+    perdu ni payé deux fois.
+    """
+    filtre = {"serveur": espace, "user_id": str(user.id), "quest_id": quete["id"]}
+
+    async def completer(session):
+        reclamee = await progression.find_one_and_delete({**filtre, "statut": STATUT_ACCEPTEE}, session=session)
+        if reclamee is None:
+            return None
+        ecrite = None  # entrée d’historique insérée, à retirer si la suite échoue sans transaction
+        try:
+            if rejouable:
+                ecrite = await journal.inscrire(espace, user, quete, session=session)
+            else:
+                resultat = await progression.update_one(
+                    {**filtre, "statut": STATUT_TERMINEE},
+                    {"$setOnInsert": {"nom": quete["nom"], "categorie": quete["categorie"], "pseudo": user.name}},
+                    upsert=True, session=session,
+                )
+                if resultat.upserted_id is None:
+                    raise QueteDejaTerminee(quete["id"])
+                ecrite = {"_id": resultat.upserted_id}
+            return await crediter(user, quete["recompense"], session=session)
+        except (PyMongoError, QueteDejaTerminee):
+            if session is None:
+                await defaire_completion(filtre, reclamee, ecrite, rejouable)
+            raise
+
+    return await base.en_transaction(completer)
+
+async def defaire_completion(filtre, reclamee, ecrite, rejouable: bool):
+    """Sans transaction : retire l’entrée du journal ou la terminée écrite et remet l’acceptation réclamée."""
+    try:
+        if ecrite is not None and rejouable:
+            await journal.retirer(ecrite)
+        elif ecrite is not None:
+            await progression.delete_one(ecrite)
+        await progression.update_one(
+            {**filtre, "statut": STATUT_ACCEPTEE},
+            {"$setOnInsert": {k: v for k, v in reclamee.items() if k not in ("_id", "statut", *filtre)}},
+            upsert=True,
+        )
+    except PyMongoError as e:
+        print(f"❌ Acceptation de {filtre['quest_id']} par {filtre['user_id']} ({filtre['serveur']}) "
+              f"non restaurée : {e}")
+
+# Un verrou par joueur en cours de complétion (libéré dès qu’il n’est plus référencé)
+_verrous_joueurs = weakref.WeakValueDictionary()
+
+async def terminer_quete(espace: str, user, quete) -> bool:
+    """
+    Termine une quête acceptée sur un serveur et verse la récompense, une seule fois.
+    La quête est d’abord retirée des acceptées par une mise à jour conditionnelle :
+    si elle n’y est plus (autre réaction, autre process), rien n’est payé.
+    Une journalière est inscrite au journal du jour plutôt qu’aux terminées :
+    si elle y est déjà (déjà faite aujourd’hui), rien n’est payé non plus.
+    Voir enregistrer_completion pour l’atomicité des écritures.
+    """
+    user_id = str(user.id)
+    cle = cle_joueur(espace, user_id)
+    verrou = _verrous_joueurs.get(user_id)
+    if verrou is None:
+        verrou = _verrous_joueurs[user_id] = asyncio.Lock()
+
+    async with verrou:
+        rejouable = quete["categorie"] in CATEGORIES_QUOTIDIENNES
+        try:
+            compte = await enregistrer_completion(espace, user, quete, rejouable)
+        except (DuplicateKeyError, QueteDejaTerminee):
+            compte = None  # journalière déjà faite aujourd’hui, ou quête déjà terminée
+        except PyMongoError as e:
+            print(f"❌ Complétion de {quete['id']} par {user_id} ({espace}) non enregistrée : {e}")
+            compte = None
+        if compte is None:
+            cache_joueurs.invalider(cle)
+            cache_pages.invalider(cle)
+            return False
+
+        # Nouveau solde reporté dans le classement en cache, sans le relire
+        classement.maj(user_id, user.name, compte["lumes"])
+        cache_joueurs.terminer(cle, quete["id"], rejouable)
+        cache_pages.invalider(cle)
+        COMPLETIONS.inc(quete["categorie"])
+        LUMES.inc(n=quete["recompense"])
+        return True
+
+@tasks.loop(seconds=CATALOGUE_INTERVALLE)
+@mesure("surveiller_catalogue", DUREE_TACHE, None)
+async def surveiller_catalogue():
+    """Recharge le catalogue si quetes.json a changé (hors de la boucle)."""
+    if await asyncio.to_thread(quetes.recharger_si_modifie):
+        print(f"📚 Catalogue rechargé : version {quetes.actuel.version} ({len(quetes.actuel)} quêtes).")
+        # Rendu de tous les embeds (et trigrammes) : plus d’une seconde sur un gros catalogue
+        try:
+            await asyncio.to_thread(preparer_catalogue)
+        except Exception as e:
+            # Les embeds manquants seront rendus à la demande
+            print(f"❌ Catalogue {quetes.actuel.version} non pré-rendu : {e!r}")
+
+@surveiller_catalogue.error
+async def erreur_surveillance_catalogue(erreur):
+    """Une tâche `tasks.loop` s’arrête sur une exception : la surveillance est relancée."""
+    print(f"❌ Surveillance du catalogue interrompue ({erreur!r}), relancée.")
+    surveiller_catalogue.restart()
+
+def preparer_catalogue():
+    """
+    Pré-rend les embeds du catalogue en service (et signale ce qui dépasse les
+    limites Discord) ; en mode tolérant, construit aussi l’index des réponses approchées.
+    """
+    if REPONSES_TOLERANTES:
+        quetes.actuel.reponses.preparer_tolerance()
+    problemes = rendu.valider(quetes.actuel)
+    for probleme in problemes:
+        print(f"⚠️ Embed {probleme}")
+    print(f"🖼️ Embeds pré-rendus : {len(rendu)} ({len(problemes)} problème(s)).")
+
+async def purger_messages_categories(channel: discord.TextChannel, categories, limit=100):
     """
     Supprime uniquement les anciens messages du bot qui contiennent un embed
-    dont le titre commence par l’emoji de la catégorie.
+    dont le titre commence par l’emoji d’une des catégories (un seul parcours).
+    Ne sert plus qu’au premier passage, avant que les messages soient suivis en base.
     """
-    prefix = EMOJI_PAR_CATEGORIE.get(categorie, "")
+    prefixes = tuple(EMOJI_PAR_CATEGORIE.get(c, "") for c in categories)
+    ids = []
     async for message in channel.history(limit=limit):
         if message.author == bot.user and message.embeds:
             title = message.embeds[0].title or ""
-            if title.startswith(prefix):
-                try:
-                    await message.delete()
-                except:
-                    pass
-
-async def envoyer_quete(channel, quete, categorie):
-    emoji = EMOJI_PAR_CATEGORIE.get(categorie, "❓")
-    couleur = COULEURS_PAR_CATEGORIE.get(categorie, 0xCCCCCC)
-    titre = f"{emoji} {categorie}\n– {quete['id']} {quete['nom']}"
-
-    embed = discord.Embed(title=titre, description=quete["resume"], color=couleur)
-    type_texte = f"{categorie} – {quete['recompense']} Lumes"
-    embed.add_field(name="📌 Type & Récompense", value=type_texte, inline=False)
-    embed.set_footer(text="Clique sur le bouton ci-dessous pour accepter la quête.")
-    await channel.send(embed=embed, view=VueAcceptation(quete, categorie))
-
-def get_quete_non_postee(categorie, quetes_possibles):
-    doc = rotation_collection.find_one({"_id": categorie})
-    deja_postees = doc["postees"] if doc else []
-    restantes = [q for q in quetes_possibles if q["id"] not in deja_postees]
-    if not restantes:
-        restantes = quetes_possibles
-        deja_postees = []
-    quete = choice(restantes)
-    rotation_collection.update_one(
-        {"_id": categorie},
-        {"$set": {"postees": deja_postees + [quete["id"]]}},
-        upsert=True
+            if title.startswith(prefixes):
+                ids.append(message.id)
+    await supprimer_messages(channel, ids)
+
+# Discord refuse la suppression groupée des messages de plus de 14 jours (marge d’une heure)
+AGE_MAX_SUPPRESSION_GROUPEE = datetime.timedelta(days=14) - datetime.timedelta(hours=1)
+
+# Requêtes simultanées par bucket de route Discord
+buckets = Buckets()
+
+async def supprimer_messages(channel: discord.TextChannel, ids):
+    """Supprime des messages par ID : par lots de 100 si récents, un par un sinon."""
+    limite = discord.utils.utcnow() - AGE_MAX_SUPPRESSION_GROUPEE
+    recents = [i for i in ids if discord.utils.snowflake_time(i) > limite]
+    anciens = [i for i in ids if i not in recents]
+
+    async def supprimer_lot(lot):
+        try:
+            async with buckets("suppression_groupee", channel.id, 1):
+                await avec_reessais(lambda: channel.delete_messages([discord.Object(i) for i in lot]))
+        except discord.HTTPException:
+            await asyncio.gather(*(supprimer_un(i) for i in lot))  # message déjà supprimé : repli unitaire
+
+    async def supprimer_un(i):
+        try:
+            async with buckets("suppression", channel.id):
+                await avec_reessais(channel.get_partial_message(i).delete)
+        except (discord.NotFound, discord.Forbidden):
+            pass
+
+    await asyncio.gather(
+        *(supprimer_lot(recents[debut:debut + 100]) for debut in range(0, len(recents), 100)),
+        *(supprimer_un(i) for i in anciens),
     )
-    return quete
+
+async def envoyer_quete(channel, quete, categorie, embed=None):
+    embed = embed or rendu.tableau(quetes.actuel, quete)
+    return await avec_reessais(lambda: channel.send(embed=embed, view=vue_quete(quete)))
+
+async def publier_tableau(channel: discord.TextChannel, plan, rapport: RapportPublication):
+    """
+    Publie un plan préparé d’avance : [(catégorie, [(quête, embed), …]), …].
+    Les messages postés sont enregistrés en base et remplacent ceux du passage
+    précédent : plus de parcours de l’historique du salon.
+    Les envois partagent le bucket du salon et restent dans l’ordre du plan ;
+    lectures, enregistrements et suppressions partent en parallèle.
+    """
+    cles = [f"{channel.id}:{categorie}" for categorie, _ in plan]
+    async with rapport.mesurer("lecture du suivi"):
+        docs = await asyncio.gather(*(tableau_collection.find_one({"_id": cle}) for cle in cles))
+
+    non_suivies = [categorie for (categorie, _), doc in zip(plan, docs) if doc is None]
+    if non_suivies:
+        # Premier passage : les anciens messages ne sont pas encore suivis
+        async with rapport.mesurer("purge initiale"):
+            await purger_messages_categories(channel, non_suivies, limit=100)
+
+    resultats = []
+    async with rapport.mesurer("envoi"):
+        for categorie, a_poster in plan:
+            messages = []
+            try:
+                for quete, embed in a_poster:
+                    messages.append(await envoyer_quete(channel, quete, categorie, embed))
+                resultats.append((messages, True))
+            except discord.HTTPException as e:
+                rapport.erreurs.append(f"envoi {categorie} : {e}")
+                resultats.append((messages, False))
+
+    async def remplacer(cle, categorie, doc, messages, complet):
+        anciens = doc.get("messages", []) if doc else []
+        # Envoi incomplet : on garde les anciens messages, tout sera remplacé au prochain passage
+        suivis = [m.id for m in messages] + ([] if complet else anciens)
+        await tableau_collection.update_one(
+            {"_id": cle},
+            {"$set": {"messages": suivis, "salon": channel.id, "serveur": channel.guild.id, "categorie": categorie}},
+            upsert=True
+        )
+        if complet and anciens:
+            await supprimer_messages(channel, anciens)
+
+    async with rapport.mesurer("nettoyage"):
+        await asyncio.gather(*(
+            remplacer(cle, categorie, doc, messages, complet)
+            for cle, (categorie, _), doc, (messages, complet) in zip(cles, plan, docs, resultats)
+        ))
 
 # ======================
-#  VUE BOUTON "ACCEPTER"
+#  BOUTON "ACCEPTER"
 # ======================
-class VueAcceptation(View):
-    def __init__(self, quete, categorie):
-        super().__init__(timeout=None)
-        self.quete = quete
-        self.categorie = categorie
-
-    @discord.ui.button(label="Accepter 📥", style=discord.ButtonStyle.green)
-    async def accepter(self, interaction: discord.Interaction, button: discord.ui.Button):
-        user_id = str(interaction.user.id)
-        quete_id = self.quete["id"]
-
-        # déjà acceptée ?
-        quete_data = accepted_collection.find_one({"_id": user_id})
-        if quete_data and any(q.get("id") == quete_id for q in quete_data.get("quetes", [])):
-            await interaction.response.send_message(
-                "Tu as déjà accepté cette quête ! Consulte `!mes_quetes`.",
+class BoutonAccepter(discord.ui.DynamicItem[discord.ui.Button], template=r"mdq:accepter:(?P<quete_id>[\w-]+)"):
+    """
+    Bouton persistant : l’ID de quête est dans le custom_id, la quête est relue
+    dans le catalogue au clic. Aucun état par message, les boutons survivent aux redémarrages.
+    """
+    def __init__(self, quete_id: str):
+        super().__init__(discord.ui.Button(
+            label="Accepter 📥",
+            style=discord.ButtonStyle.green,
+            custom_id=f"mdq:accepter:{quete_id}",
+        ))
+        self.quete_id = quete_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["quete_id"])
+
+    async def callback(self, interaction: discord.Interaction):
+        quete = quetes.actuel.quete(self.quete_id)
+        config = serveurs.get(interaction.guild_id)
+        if not quete or config is None:
+            await interaction.response.send_message("Cette quête n’est plus disponible.", ephemeral=True)
+            return
+        # Accusé de réception immédiat ; la réponse suit par followup une fois la quête enregistrée
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        if file_evenements.soumettre(str(interaction.user.id), HAUTE,
+                                     lambda: accepter_quete(interaction, config.espace, quete)) is None:
+            await interaction.followup.send(
+                "⏳ Le Maître des quêtes est débordé, réessaie dans un instant.", ephemeral=True
+            )
+
+bot.add_dynamic_items(BoutonAccepter)
+
+def vue_quete(quete) -> View:
+    """Vue d’un message de quête. Arrêtée d’emblée : rien n’est gardé en mémoire par message."""
+    vue = View(timeout=None)
+    vue.add_item(BoutonAccepter(quete["id"]))
+    vue.stop()
+    return vue
+
+@mesure("accepter")
+async def accepter_quete(interaction: discord.Interaction, espace: str, quete):
+    """Interaction déjà différée : réponses par followup, MP confiés à la file d’envois."""
+    categorie = quete["categorie"]
+    user_id = str(interaction.user.id)
+    cle = cle_joueur(espace, user_id)
+    quete_id = quete["id"]
+
+    etat = await etat_joueur(espace, user_id)
+
+    # déjà acceptée ?
+    if quete_id in etat.acceptees:
+        await interaction.followup.send(
+            "Tu as déjà accepté cette quête ! Consulte `!mes_quetes`.",
+            ephemeral=True
+        )
+        return
+
+    # journalière déjà faite aujourd’hui ? (lecture ponctuelle dans l’index du journal)
+    if categorie in CATEGORIES_QUOTIDIENNES:
+        if await journal.fait_aujourdhui(espace, user_id, quete_id):
+            await interaction.followup.send(
+                f"🌙 Tu as déjà terminé **{quete['nom']}** aujourd’hui. Reviens demain (minuit, heure de Paris) !",
                 ephemeral=True
             )
             return
 
-        # déjà terminée ? (sauf journalières)
-        deja_faite = completed_collection.find_one(
-            {"_id": user_id, "quetes": {"$elemMatch": {"id": quete_id}}}
+    # déjà terminée ? (non rejouable)
+    elif quete_id in etat.terminees:
+        await interaction.followup.send(
+            f"📪 Tu as déjà terminé **{quete['nom']}** (non rejouable). Consulte `!mes_quetes`.",
+            ephemeral=True
         )
-        if deja_faite and self.categorie != "Quêtes Journalières":
-            try:
-                await interaction.user.send(
-                    f"📪 Tu as déjà terminé **{self.quete['nom']}** (non rejouable). "
-                    "Consulte `!mes_quetes`."
-                )
-            except discord.Forbidden:
-                await interaction.response.send_message(
-                    "Tu as déjà terminé cette quête (non rejouable), et je ne peux pas t’envoyer de MP.",
-                    ephemeral=True
-                )
-            return
+        return
 
-        accepted_collection.update_one(
-            {"_id": user_id},
-            {"$addToSet": {
-                "quetes": {
-                    "categorie": self.categorie,
-                    "id": quete_id,
-                    "nom": self.quete["nom"]
-                }
-            }, "$set": {"pseudo": interaction.user.name}},
+    try:
+        await progression.update_one(
+            {"serveur": espace, "user_id": user_id, "quest_id": quete_id, "statut": STATUT_ACCEPTEE},
+            {"$set": {"categorie": categorie, "nom": quete["nom"], "pseudo": interaction.user.name}},
             upsert=True
         )
+    except DuplicateKeyError:
+        pass  # double clic simultané : la quête est déjà enregistrée
+    cache_joueurs.accepter(cle, quete_id)
+    cache_pages.invalider(cle)
 
-        # MP d’instructions
-        if self.categorie == "Quêtes Énigmes":
-            embed = discord.Embed(
-                title="🧩 Quête Énigmes",
-                description=f"**{self.quete['id']} – {self.quete['nom']}**",
-                color=COULEURS_PAR_CATEGORIE.get(self.categorie, 0xCCCCCC)
-            )
-
-            img = self.quete.get("image_url")
+    # MP d’instructions
+    embed = rendu.mp(quetes.actuel, quete)
 
-            if img:
-                # Si un rébus visuel existe, on ne montre pas l’énoncé texte
-                embed.add_field(name="💬 Rébus", value="Observe bien ce symbole...", inline=False)
-                embed.set_image(url=img)
-            else:
-                # Sinon on affiche le texte d’énigme classique
-                embed.add_field(name="💬 Énoncé", value=self.quete["enonce"], inline=False)
-
-            embed.add_field(name="👉 Objectif", value="Trouve la réponse et réponds-moi ici.", inline=False)
-            embed.set_footer(text=f"🏅 Récompense : {self.quete['recompense']} Lumes")
-        else:
-            titre_embed = f"{EMOJI_PAR_CATEGORIE.get(self.categorie, '📜')} {self.categorie}"
-            embed = discord.Embed(
-                title=titre_embed,
-                description=f"**{self.quete['id']} – {self.quete['nom']}**",
-                color=COULEURS_PAR_CATEGORIE.get(self.categorie, 0xCCCCCC)
-            )
-            embed.add_field(name="💬 Description", value=self.quete["description"], inline=False)
-            embed.add_field(name="👉 Objectif", value=self.quete["details_mp"], inline=False)
-            embed.set_footer(text=f"🏅 Récompense : {self.quete['recompense']} Lumes")
-
-        try:
-            await interaction.user.send(embed=embed)
-            await interaction.response.send_message(
-                "Quête acceptée ✅ Regarde tes MP ! (`!mes_quetes` pour le suivi)",
-                ephemeral=True
-            )
-        except discord.Forbidden:
-            await interaction.response.send_message("Je n'arrive pas à t'envoyer de MP 😅", ephemeral=True)
+    envois.envoyer(
+        interaction.user, embed=embed,
+        repli=lambda: interaction.followup.send("Je n'arrive pas à t'envoyer de MP 😅", ephemeral=True),
+    )
+    await interaction.followup.send(
+        "Quête acceptée ✅ Regarde tes MP ! (`!mes_quetes` pour le suivi)",
+        ephemeral=True
+    )
 
 # ======================
 #  POSTERS
 # ======================
+CATEGORIES_HEBDO = ("Quêtes Interactions", "Quêtes Recherches", "Quêtes Énigmes")
+
+async def preparer_plan(tableau: str, journalieres=True, hebdo=True):
+    """
+    Choisit les quêtes à poster et construit leurs embeds avant tout appel Discord.
+    Journalières : les 2 premières ; hebdo : 1 par catégorie, avec la rotation du tableau.
+    """
+    quetes_par_type = quetes.actuel.par_categorie
+    plan = []
+    if journalieres:
+        plan.append(("Quêtes Journalières", quetes_par_type.get("Quêtes Journalières", ())[:2]))
+    if hebdo:
+        tournantes = [c for c in CATEGORIES_HEBDO if quetes_par_type.get(c)]
+        tirages = await asyncio.gather(*(rotation.tirer(c, quetes_par_type[c], tableau) for c in tournantes))
+        plan.extend((c, [q]) for c, q in zip(tournantes, tirages))
+    catalogue = quetes.actuel
+    return [(c, [(q, rendu.tableau(catalogue, q)) for q in a_poster]) for c, a_poster in plan]
+
+# Serveurs publiés en même temps par une publication planifiée
+PUBLICATION_SERVEURS = int(os.getenv("PUBLICATION_SERVEURS", "4"))
+
+# Une publication à la fois par serveur : la commande admin et le scheduler ne se chevauchent pas
+_verrous_publication = {}
+
+async def publier(config, journalieres=True, hebdo=True, annonce=False) -> RapportPublication:
+    rapport = RapportPublication()
+    channel = bot.get_channel(config.salon_quetes) if config.salon_quetes else None
+    if not channel:
+        print(f"❌ Channel quêtes introuvable (serveur {config.guild_id}).")
+        rapport.erreurs.append("salon des quêtes introuvable")
+        return rapport
+
+    async with _verrous_publication.setdefault(config.guild_id, asyncio.Lock()):
+        async with rapport.mesurer("préparation"):
+            plan = await preparer_plan(config.tableau, journalieres, hebdo)
+        await publier_tableau(channel, plan, rapport)
+        if annonce:
+            async with rapport.mesurer("annonce"):
+                await annoncer(config)
+    print(f"[{config.guild_id}] {rapport.resume()}")
+    return rapport
+
+def serveurs_locaux() -> list:
+    """Serveurs configurés servis par ce process (ses shards)."""
+    return [c for c in serveurs if bot.get_guild(c.guild_id) is not None]
+
+async def publier_partout(**options) -> list:
+    """Publie sur chaque serveur local, PUBLICATION_SERVEURS à la fois."""
+    limite = asyncio.Semaphore(PUBLICATION_SERVEURS)
+
+    async def publier_un(config):
+        async with limite:
+            return await publier(config, **options)
+
+    return await asyncio.gather(*(publier_un(c) for c in serveurs_locaux() if c.salon_quetes))
+
+@mesure("poster_journalieres", DUREE_TACHE, None)
 async def poster_journalieres():
     """Poste seulement les 2 quêtes journalières (tous les jours)."""
-    quetes_par_type = charger_quetes()
-    channel = bot.get_channel(QUESTS_CHANNEL_ID)
-    if not channel:
-        print("❌ Channel quêtes introuvable.")
-        return
-
-    await purger_messages_categorie(channel, "Quêtes Journalières", limit=100)
-    for quete in quetes_par_type.get("Quêtes Journalières", [])[:2]:
-        await envoyer_quete(channel, quete, "Quêtes Journalières")
-    print("✅ Journalières postées.")
+    rapports = await publier_partout(hebdo=False)
+    print(f"✅ Journalières postées ({len(rapports)} serveur(s)).")
 
+@mesure("poster_hebdo", DUREE_TACHE, None)
 async def poster_hebdo():
     """Poste 1 interaction + 1 recherche + 1 énigme avec rotation (chaque semaine)."""
-    quetes_par_type = charger_quetes()
-    channel = bot.get_channel(QUESTS_CHANNEL_ID)
-    if not channel:
-        print("❌ Channel quêtes introuvable.")
-        return
-
-    # Interactions
-    interactions = quetes_par_type.get("Quêtes Interactions", [])
-    if interactions:
-        await purger_messages_categorie(channel, "Quêtes Interactions", limit=100)
-        q = get_quete_non_postee("Quêtes Interactions", interactions)
-        await envoyer_quete(channel, q, "Quêtes Interactions")
-
-    # Recherches
-    recherches = quetes_par_type.get("Quêtes Recherches", [])
-    if recherches:
-        await purger_messages_categorie(channel, "Quêtes Recherches", limit=100)
-        q = get_quete_non_postee("Quêtes Recherches", recherches)
-        await envoyer_quete(channel, q, "Quêtes Recherches")
-
-    # Énigmes
-    enigmes = quetes_par_type.get("Quêtes Énigmes", [])
-    if enigmes:
-        await purger_messages_categorie(channel, "Quêtes Énigmes", limit=100)
-        q = get_quete_non_postee("Quêtes Énigmes", enigmes)
-        await envoyer_quete(channel, q, "Quêtes Énigmes")
-
-    print("✅ Hebdomadaires postées.")
+    rapports = await publier_partout(journalieres=False)
+    print(f"✅ Hebdomadaires postées ({len(rapports)} serveur(s)).")
 
+@mesure("annoncer_mise_a_jour", DUREE_TACHE, None)
 async def annoncer_mise_a_jour():
-    if not ANNOUNCE_CHANNEL_ID:
+    """Annonce la mise à jour sur chaque serveur local qui a un salon d’annonces."""
+    await asyncio.gather(*(annoncer(c) for c in serveurs_locaux() if c.salon_annonces))
+
+async def annoncer(config):
+    if not config.salon_annonces:
         return
-    ch = bot.get_channel(ANNOUNCE_CHANNEL_ID)
+    ch = bot.get_channel(config.salon_annonces)
     if ch:
-        await ch.send(
-            "👋 Oyez oyez, <@&1345479226886979641> ! Les quêtes **journalières** et/ou **hebdomadaires** ont été mises à jour "
-            f"dans <#{QUESTS_CHANNEL_ID}>. Puissent les Souffles vous être favorables 🌬️ !"
-        )
+        public = f"<@&{config.role_annonce}>" if config.role_annonce else "aventuriers"
+        await avec_reessais(lambda: ch.send(
+            f"👋 Oyez oyez, {public} ! Les quêtes **journalières** et/ou **hebdomadaires** ont été mises à jour "
+            f"dans <#{config.salon_quetes}>. Puissent les Souffles vous être favorables 🌬️ !"
+        ))
+
+# Publications lancées par commande (référence gardée jusqu’à la fin de la tâche)
+_publications = set()
+
+async def lancer_publication(ctx, message_ok: str, **options):
+    """Répond tout de suite, publie en tâche de fond puis complète la réponse avec le rapport."""
+    config = serveurs.get(ctx.guild.id)
+    if config is None or not config.salon_quetes:
+        await ctx.reply("⚙️ Aucun salon de quêtes sur ce serveur : `!configurer #salon`.")
+        return
+    reponse = await ctx.reply("⏳ Publication en cours…")
+
+    async def publier_et_rapporter():
+        try:
+            rapport = await publier(config, **options)
+        except Exception as e:
+            await reponse.edit(content=f"❌ Publication interrompue : {e}")
+            raise
+        entete = "⚠️ Publication incomplète." if rapport.erreurs else message_ok
+        await reponse.edit(content=f"{entete}\n{rapport.resume()}")
+
+    tache = asyncio.create_task(publier_et_rapporter())
+    _publications.add(tache)
+    tache.add_done_callback(_publications.discard)
 
 # ======================
 #  COMMANDES
 # ======================
 @bot.command()
+@commands.guild_only()
 @commands.has_permissions(administrator=True)
 async def poster_quetes(ctx):
     """Poste tout d’un coup (journalières + hebdo) — commande admin."""
-    await poster_journalieres()
-    await poster_hebdo()
-    await annoncer_mise_a_jour()
-    await ctx.reply("✅ Quêtes postées (journalières + hebdo).")
+    await lancer_publication(ctx, "✅ Quêtes postées (journalières + hebdo).", annonce=True)
 
 @bot.command()
+@commands.guild_only()
 @commands.has_permissions(administrator=True)
 async def journaliere(ctx):
-    await poster_journalieres()
-    await ctx.reply("✅ Journalières postées.")
+    await lancer_publication(ctx, "✅ Journalières postées.", hebdo=False)
 
 @bot.command()
+@commands.guild_only()
 @commands.has_permissions(administrator=True)
 async def hebdo(ctx):
-    await poster_hebdo()
-    await ctx.reply("✅ Hebdomadaires postées.")
-
-@bot.command()
-async def mes_quetes(ctx):
-    user_id = str(ctx.author.id)
-    toutes_quetes = [q for lst in charger_quetes().values() for q in lst]
-
-    user_accept = accepted_collection.find_one({"_id": user_id}) or {}
-    user_done = completed_collection.find_one({"_id": user_id}) or {}
-
-    quetes_accept = user_accept.get("quetes", [])
-    quetes_done = user_done.get("quetes", [])
-
-    ids_accept = set(q["id"] if isinstance(q, dict) else q for q in quetes_accept)
-    ids_done = set(q.get("id") if isinstance(q, dict) else q for q in quetes_done)
-
-    categories = {
-        "Quêtes Journalières": {"emoji": "🕘", "encours": [], "terminees": []},
-        "Quêtes Interactions": {"emoji": "🕹️", "encours": [], "terminees": []},
-        "Quêtes Recherches": {"emoji": "🔍", "encours": [], "terminees": []},
-        "Quêtes Énigmes": {"emoji": "🧩", "encours": [], "terminees": []},
-    }
-
-    for quete in toutes_quetes:
-        cat = quete.get("categorie")
-        if not cat or cat not in categories:
-            continue
-        ligne = f"• {quete['id']} – {quete['nom']}"
-        if quete["id"] in ids_done:
-            categories[cat]["terminees"].append(ligne)
-        elif quete["id"] in ids_accept:
-            categories[cat]["encours"].append(ligne)
-
+    await lancer_publication(ctx, "✅ Hebdomadaires postées.", journalieres=False)
+
+async def pages_mes_quetes(espace: str, user_id: str) -> tuple:
+    """Pages de `!mes_quetes` : état du joueur (cache) + catalogue, rendu mis en cache."""
+    etat = await etat_joueur(espace, user_id)
+    catalogue = quetes.actuel
+    cle = cle_joueur(espace, user_id)
+    pages = cache_pages.get(cle, etat, catalogue.version)
+    if pages is None:
+        pages = paginer(lignes_quetes(etat, catalogue, EMOJI_PAR_CATEGORIE))
+        cache_pages.mettre(cle, etat, catalogue.version, pages)
+    return pages
+
+def embed_mes_quetes(membre, pages, page: int) -> discord.Embed:
     embed = discord.Embed(
-        title=f"📘 Quêtes de {ctx.author.display_name}",
+        title=f"📘 Quêtes de {membre.display_name}",
+        description=pages[page],
         color=0xA86E2A
     )
-    desc = "📜 **Quêtes en cours**\n"
-    for cat, data in categories.items():
-        desc += f"{data['emoji']} __{cat.replace('Quêtes ', '')} :__\n"
-        desc += "\n".join(data["encours"]) + "\n" if data["encours"] else "*Aucune*\n"
+    if len(pages) > 1:
+        embed.set_footer(text=f"Page {page + 1}/{len(pages)}")
+    return embed
+
+# Le serveur est optionnel dans le custom_id : les boutons postés avant le multi-serveur restent valides
+class BoutonPage(discord.ui.DynamicItem[discord.ui.Button],
+                 template=r"mdq:pages:(?:(?P<espace>\d+):)?(?P<user_id>\d+):(?P<page>\d+)"):
+    """Navigation de `!mes_quetes`, sans état par message (comme BoutonAccepter)."""
+    def __init__(self, espace: str, user_id: str, page: int, label: str = "▶️", disabled: bool = False):
+        super().__init__(discord.ui.Button(
+            label=label,
+            style=discord.ButtonStyle.secondary,
+            custom_id=f"mdq:pages:{espace}:{user_id}:{page}",
+            disabled=disabled,
+        ))
+        self.espace = espace
+        self.user_id = user_id
+        self.page = page
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        espace = match["espace"]
+        if espace is None:
+            historique = serveurs.get(interaction.guild_id)
+            espace = historique.espace if historique else await espace_mp(interaction.user)
+        return cls(espace, match["user_id"], int(match["page"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        if str(interaction.user.id) != self.user_id:
+            await interaction.response.send_message("Ce n’est pas ta liste : utilise `!mes_quetes`.", ephemeral=True)
+            return
+        pages = await pages_mes_quetes(self.espace, self.user_id)
+        page = min(self.page, len(pages) - 1)
+        await interaction.response.edit_message(
+            embed=embed_mes_quetes(interaction.user, pages, page),
+            view=vue_pages(self.espace, self.user_id, page, len(pages)),
+        )
 
-    desc += "\n🏅 **Quêtes terminées**\n"
-    for cat, data in categories.items():
-        desc += f"{data['emoji']} __{cat.replace('Quêtes ', '')} :__\n"
-        desc += "\n".join(data["terminees"]) + "\n" if data["terminees"] else "*Aucune*\n"
+bot.add_dynamic_items(BoutonPage)
 
-    embed.description = desc
-    await ctx.send(embed=embed)
+def vue_pages(espace: str, user_id: str, page: int, nb_pages: int):
+    """Boutons précédent / suivant (aucun s’il n’y a qu’une page)."""
+    if nb_pages < 2:
+        return None
+    vue = View(timeout=None)
+    # Les custom_id restent distincts : aux bords, le bouton désactivé pointe sur la page courante
+    vue.add_item(BoutonPage(espace, user_id, max(page - 1, 0), "◀️", disabled=page == 0))
+    vue.add_item(BoutonPage(espace, user_id, min(page + 1, nb_pages - 1), "▶️", disabled=page == nb_pages - 1))
+    vue.stop()
+    return vue
+
+@bot.command()
+@mesure("mes_quetes")
+async def mes_quetes(ctx):
+    user_id = str(ctx.author.id)
+    # Sur un serveur : sa progression ; en MP : celle d’un serveur du joueur (lu en base)
+    if ctx.guild:
+        config = serveurs.get(ctx.guild.id)
+        espace = config.espace if config else None
+    else:
+        espace = await espace_mp(ctx.author)
+    if espace is None:
+        await ctx.send("⚙️ Les quêtes ne sont pas configurées ici.")
+        return
+    pages = await pages_mes_quetes(espace, user_id)
+    await ctx.send(embed=embed_mes_quetes(ctx.author, pages, 0),
+                   view=vue_pages(espace, user_id, 0, len(pages)))
 
 @bot.command()
 async def bourse(ctx):
     user_id = str(ctx.author.id)
-    user = utilisateurs.find_one({"_id": user_id})
+    user = await utilisateurs.find_one({"_id": user_id})
     if not user:
-        utilisateurs.insert_one({
+        await utilisateurs.insert_one({
             "_id": user_id,
             "pseudo": ctx.author.name,
             "lumes": 0,
             "derniere_offrande": {},
             "roles_temporaires": {},
         })
-        user = utilisateurs.find_one({"_id": user_id}) or {}
+        user = await utilisateurs.find_one({"_id": user_id}) or {}
     await ctx.send(f"💰 {ctx.author.mention}, tu possèdes **{user.get('lumes', 0)} Lumes**.")
 
-import discord
-from discord.ext import commands
+MEDAILLES = ("🥇", "🥈", "🥉")
+
+@bot.command(name="classement")
+@mesure("classement")
+async def classement_lumes(ctx):
+    """
+    Top des joueurs par Lumes (cache, sans tri de la collection). Les Lumes sont une
+    monnaie unique, le classement est donc global ; seuls les pseudos des membres
+    de ce serveur (soi-même en MP) sont affichés, les autres joueurs restent anonymes.
+    """
+    top = await classement.top()
+    if not top:
+        await ctx.send("🏆 Personne n’a encore gagné de Lumes.")
+        return
+    lignes = []
+    rang_precedent, lumes_precedentes = 0, None
+    for i, (user_id, pseudo, lumes) in enumerate(top, 1):
+        rang = rang_precedent if lumes == lumes_precedentes else i  # ex æquo : même rang
+        rang_precedent, lumes_precedentes = rang, lumes
+        prefixe = MEDAILLES[rang - 1] if rang <= len(MEDAILLES) else f"`{rang}.`"
+        if not joueur_visible(ctx, user_id):
+            pseudo = "joueur d’un autre serveur"
+        elif ctx.guild:
+            membre = ctx.guild.get_member(int(user_id))
+            pseudo = membre.display_name if membre else pseudo
+        lignes.append(f"{prefixe} **{pseudo or user_id}** — {lumes} Lumes")
+    embed = discord.Embed(title="🏆 Classement des Lumes", description="\n".join(lignes), color=0xFFC107)
+    embed.set_footer(text="!rang pour voir ta place")
+    await ctx.send(embed=embed)
+
+def joueur_visible(ctx, user_id: str) -> bool:
+    """Un joueur n’est nommé que sur un serveur dont il est membre (ou à lui-même en MP)."""
+    if ctx.guild is None:
+        return user_id == str(ctx.author.id)
+    return ctx.guild.get_member(int(user_id)) is not None
+
+@bot.command()
+@mesure("rang")
+async def rang(ctx, membre: discord.Member = None):
+    """Rang d’un joueur (par défaut soi-même) : dichotomie dans les soldes en mémoire."""
+    membre = membre or ctx.author
+    resultat = await classement.rang(str(membre.id))
+    if resultat is None:
+        await ctx.send(f"🏆 {membre.display_name} n’a pas encore de Lumes.", allowed_mentions=NO_MENTIONS)
+        return
+    position, lumes = resultat
+    ordinal = "1ᵉʳ" if position == 1 else f"{position}ᵉ"
+    await ctx.send(f"🏆 {membre.display_name} est **{ordinal}** du classement avec **{lumes} Lumes**.",
+                   allowed_mentions=NO_MENTIONS)
+
+@bot.command()
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def configurer(ctx, salon_quetes: discord.TextChannel = None, salon_annonces: discord.TextChannel = None,
+                     role: discord.Role = None):
+    """
+    Usage: !configurer #quetes [#annonces] [@role]  — commande admin.
+    Sans argument : affiche la configuration de ce serveur.
+    """
+    if salon_quetes is not None:
+        await serveurs.definir(
+            ctx.guild.id,
+            salon_quetes=salon_quetes.id,
+            salon_annonces=salon_annonces.id if salon_annonces else None,
+            role_annonce=role.id if role else None,
+        )
+    config = serveurs.get(ctx.guild.id)
+    if config is None:
+        await ctx.reply("⚙️ Pas encore configuré : `!configurer #quetes [#annonces] [@role]`.")
+        return
+    await ctx.reply(
+        f"⚙️ Tableau : {f'<#{config.salon_quetes}>' if config.salon_quetes else '—'}, "
+        f"annonces : {f'<#{config.salon_annonces}>' if config.salon_annonces else '—'}, "
+        f"rôle : {f'<@&{config.role_annonce}>' if config.role_annonce else '—'}, "
+        f"rotation : `{config.tableau}`",
+        allowed_mentions=discord.AllowedMentions.none(),
+    )
+
+# Opérations en masse (voir operations_masse.py) : exécutées hors de la boucle,
+# avec un message de suivi mis à jour au plus toutes les SUIVI_INTERVALLE secondes
+SUIVI_INTERVALLE = 2.0
+
+async def operation_masse(ctx, titre: str, fonction, *args, **kwargs):
+    """Lance `fonction(base.db, *args)` dans un thread ; retourne son Bilan, ou None après une erreur."""
+    message = await ctx.reply(f"⏳ {titre}…")
+    loop = asyncio.get_running_loop()
+    derniere_maj, edition = 0.0, None
+
+    def progres(bilan):  # appelé depuis le thread, après chaque lot
+        nonlocal derniere_maj, edition
+        if time.monotonic() - derniere_maj >= SUIVI_INTERVALLE:
+            derniere_maj = time.monotonic()
+            edition = asyncio.run_coroutine_threadsafe(message.edit(content=f"⏳ {titre} : {bilan.resume()}"), loop)
+
+    try:
+        bilan = await asyncio.to_thread(fonction, base.db, *args, progres=progres, **kwargs)
+    except (ValueError, PyMongoError) as e:
+        bilan = None
+        texte = f"❌ {titre} interrompu : {e}"
+    else:
+        texte = f"✅ {titre} : {bilan.resume()}."
+    if edition is not None:
+        # Le dernier suivi ne doit pas écraser le bilan final
+        await asyncio.gather(asyncio.wrap_future(edition), return_exceptions=True)
+    await message.edit(content=texte)
+    return bilan
+
+@bot.command(name="exporter")
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def exporter_serveur(ctx):
+    """Sauvegarde JSONL de la progression et de la config de ce serveur — commande admin."""
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".jsonl", delete=False) as f:
+        bilan = await operation_masse(ctx, "Export", exporter, f, ("progression", "journal", "serveurs"),
+                                      ctx.guild.id)
+    try:
+        if bilan is None:
+            return
+        taille = os.path.getsize(f.name)
+        if taille > ctx.guild.filesize_limit:
+            await ctx.reply(f"📦 Export trop lourd pour Discord ({taille // 1024} Kio) : "
+                            f"`python operations_masse.py exporter --serveur {ctx.guild.id}`.")
+            return
+        await ctx.reply(file=discord.File(f.name, filename=f"sauvegarde_{ctx.guild.id}.jsonl"))
+    finally:
+        os.unlink(f.name)
+
+@bot.command(name="importer")
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def importer_serveur(ctx, mode: str = None):
+    """
+    Usage: !importer [simulation] + fichier exporté en pièce jointe — commande admin.
+    La progression importée est rattachée à ce serveur ; comptes et config ne sont pas touchés.
+    """
+    if not ctx.message.attachments:
+        await ctx.reply("📎 Joins le fichier `.jsonl` exporté (`!exporter`).")
+        return
+    simulation = mode == "simulation"
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, "import.jsonl")
+        await ctx.message.attachments[0].save(chemin)
+        with open(chemin, encoding="utf-8") as f:
+            bilan = await operation_masse(ctx, "Import", importer, f, ("progression", "journal"), ctx.guild.id,
+                                          simulation=simulation)
+    if bilan is not None and not simulation:
+        cache_joueurs.vider()
+
+@bot.command()
+@commands.guild_only()
+@commands.is_owner()
+async def recompenser(ctx, montant: int, role: discord.Role, mode: str = None):
+    """
+    Usage: !recompenser 50 @role [simulation] — Lumes pour tous les membres du rôle.
+    Réservée au propriétaire du bot : les soldes et le classement sont communs à
+    tous les serveurs, un admin de serveur ne peut pas créer de Lumes.
+    """
+    simulation = mode == "simulation"
+    attributions = [(str(m.id), montant, m.name) for m in role.members if not m.bot]
+    bilan = await operation_masse(ctx, f"{montant} Lumes pour {role.name}", attribuer_lumes, attributions,
+                                  simulation=simulation)
+    if bilan is not None and not simulation:
+        classement.invalider()
+
+@bot.command()
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def accorder(ctx, quest_id: str, role: discord.Role, mode: str = None):
+    """Usage: !accorder QUETE_ID @role [simulation] — quête terminée et payée pour le rôle (commande admin)."""
+    config = serveurs.get(ctx.guild.id)
+    if config is None:
+        await ctx.reply("⚙️ Serveur non configuré : `!configurer #salon`.")
+        return
+    quete = quetes.actuel.quete(quest_id.upper())
+    if quete is None:
+        await ctx.reply(f"❌ Quête {quest_id} introuvable.")
+        return
+    simulation = mode == "simulation"
+    joueurs = [(str(m.id), m.name) for m in role.members if not m.bot]
+    bilan = await operation_masse(ctx, f"{quete['id']} pour {role.name}", accorder_quete, config.espace, quete,
+                                  joueurs, simulation=simulation)
+    if bilan is not None and not simulation:
+        cache_joueurs.vider()
+        classement.invalider()
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def etat_db(ctx):
+    """Pool Mongo, file d’appels, caches, files d’événements et d’envois — commande admin."""
+    c = cache_joueurs.stats()
+    f = file_evenements.stats()
+    e = envois.stats()
+    k = classement.stats()
+    phases = ", ".join(f"{nom} {d * 1000:.0f} ms" for nom, d in duree_demarrage.items())
+    await ctx.reply(
+        f"🗄️ {base.resume()}\n"
+        f"🚀 Démarrage : {phases or '—'}\n"
+        f"🌐 Shards {GROUPE_SHARDS} ({bot.shard_count or '?'} au total), "
+        f"{len(bot.guilds)} serveurs, {len(serveurs_locaux())}/{len(serveurs)} configurés ici\n"
+        f"👥 Cache joueurs : {c['taille']}/{c['taille_max']}, hits={c['hits']} "
+        f"(dont négatifs {c['hits_negatifs']}), misses={c['misses']}, taux={c['taux']:.0%}\n"
+        f"📘 Cache pages : hits={cache_pages.hits}, misses={cache_pages.misses}\n"
+        f"🖼️ Embeds : {len(rendu)} pré-rendus, hits={rendu.hits}, misses={rendu.misses}\n"
+        f"🏆 Classement : top {k['taille']}, relectures={k['relectures']}, "
+        f"mises à jour incrémentales={k['maj_incrementales']}\n"
+        f"📥 File : {f['profondeur']}/{f['taille_max']} (max {f['profondeur_max']}), "
+        f"{f['workers']} workers, rejets={f['rejets']}, fusions={f['fusions']}\n"
+        f"📤 Envois : {e['profondeur']} en attente, livrés={e['livres']}, replis={e['replis']}, "
+        f"regroupés={e['regroupes']}, p99 ≤ {e['latence_p99'] * 1000:g} ms"
+    )
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def stats(ctx):
+    """Compteurs et latences des handlers — commande admin."""
+    await ctx.reply(f"📈 **Statistiques**\n{metriques.resume()}")
+
+profileur = metriques.Profileur()
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def profil(ctx):
+    """Démarre le profileur par échantillonnage, ou l’arrête et affiche les lignes les plus vues."""
+    if not profileur.actif:
+        profileur.demarrer()
+        await ctx.reply("🔬 Profileur démarré. Relance `!profil` pour l’arrêter et voir le résultat.")
+        return
+    lignes = profileur.arreter()
+    texte = "\n".join(f"{part:6.1%}  {ligne}" for ligne, part in lignes) or "Aucun échantillon."
+    await ctx.reply(f"🔬 **Profil** ({profileur.total} échantillons)\n```\n{texte[:1800]}\n```")
 
 NO_MENTIONS = discord.AllowedMentions(everyone=False, users=True, roles=False, replied_user=False)
 
@@ -439,45 +1047,8 @@ async def show_quete(ctx, quest_id: str = None):
         await ctx.send(f"Je ne trouve pas la quête `{quest_id}`.", allowed_mentions=NO_MENTIONS)
         return
 
-    categorie = categorie_par_id(quest_id)
-
-    # --- Construction d’embed (même logique que tes DMs) ---
-    if categorie == "Quêtes Énigmes":
-        embed = discord.Embed(
-            title="🧩 Quête Énigmes (APERÇU)",
-            description=f"**{quete['id']} – {quete['nom']}**",
-            color=COULEURS_PAR_CATEGORIE.get(categorie, 0xCCCCCC)
-        )
-        img = quete.get("image_url")
-        if img:
-            embed.add_field(name="💬 Rébus", value="Observe bien ce symbole...", inline=False)
-            embed.set_image(url=img)
-        else:
-            embed.add_field(name="💬 Énoncé", value=quete["enonce"], inline=False)
-
-        embed.add_field(name="👉 Objectif", value="Tro uve la réponse et réponds-moi ici.", inline=False)
-        embed.set_footer(text=f"🏅 Récompense : {quete['recompense']} Lumes")
-
-    elif categorie == "Quêtes Recherches":
-        embed = discord.Embed(
-            title=f"🔎 {categorie} (APERÇU)",
-            description=f"**{quete['id']} – {quete['nom']}**",
-            color=COULEURS_PAR_CATEGORIE.get(categorie, 0xCCCCCC)
-        )
-        embed.add_field(name="💬 Indice", value=quete["description"], inline=False)
-        embed.add_field(name="👉 Objectif", value=quete["details_mp"], inline=False)
-        embed.set_footer(text=f"🏅 Récompense : {quete['recompense']} Lumes")
-
-    else:  # Interactions
-        embed = discord.Embed(
-            title=f"🤝 {categorie} (APERÇU)",
-            description=f"**{quete['id']} – {quete['nom']}**",
-            color=COULEURS_PAR_CATEGORIE.get(categorie, 0xCCCCCC)
-        )
-        embed.add_field(name="💬 Description", value=quete["description"], inline=False)
-        embed.add_field(name="👉 Objectif", value=quete["details_mp"], inline=False)
-        embed.set_footer(text=f"🏅 Récompense : {quete['recompense']} Lumes")
-
+    # Même embed que le MP envoyé à l’acceptation
+    embed = rendu.apercu(quetes.actuel, quete)
     await ctx.send(embed=embed, allowed_mentions=NO_MENTIONS)
 
 
@@ -485,129 +1056,335 @@ async def show_quete(ctx, quest_id: str = None):
 #  EVENTS: COMPLETION
 # ======================
 @bot.event
+@mesure("on_raw_reaction_add")
 async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
     if payload.member is None or payload.member.bot:
         return
 
-    user = payload.member
-    user_id = str(payload.user_id)
-    emoji = str(payload.emoji)
-
-    quetes = charger_quetes()
-    user_data = accepted_collection.find_one({"_id": user_id})
-    if not user_data:
+    # Rejet immédiat (sans base) des réactions qui ne terminent aucune quête
+    config = serveurs.get(payload.guild_id)
+    if config is None:
+        return
+    catalogue = quetes.actuel
+    salon = None
+    if REACTIONS_PAR_SALON:
+        ch = bot.get_channel(payload.channel_id)
+        salon = getattr(ch, "name", None)
+    candidats = catalogue.candidats_reaction(str(payload.emoji), salon)
+    if not candidats:
         return
 
-    quetes_acceptees = user_data.get("quetes", [])
-    toutes_quetes = [q for lst in quetes.values() for q in lst]
+    # Le reste passe par la file : une réaction répétée en attente est fusionnée
+    file_evenements.soumettre(
+        str(payload.user_id), BASSE, lambda: traiter_reaction(payload, config.espace, catalogue, candidats),
+        cle_fusion=("reaction", payload.user_id, payload.message_id, str(payload.emoji)),
+    )
 
-    for quete in toutes_quetes:
-        if quete.get("type") != "reaction":
-            continue
-        if quete["id"] not in [q["id"] if isinstance(q, dict) else q for q in quetes_acceptees]:
-            continue
+@mesure("traiter_reaction", compteur=None)
+async def traiter_reaction(payload: discord.RawReactionActionEvent, espace: str, catalogue, candidats):
+    user = payload.member
+    user_id = str(payload.user_id)
 
-        liste_emojis = quete.get("emoji", [])
-        if isinstance(liste_emojis, str):
-            liste_emojis = [liste_emojis]
-
-        if emoji in liste_emojis:
-            accepted_collection.update_one({"_id": user_id}, {"$pull": {"quetes": {"id": quete["id"]}}})
-            completed_collection.update_one(
-                {"_id": user_id},
-                {"$addToSet": {"quetes": {"id": quete["id"], "nom": quete["nom"], "categorie": quete["categorie"]}},
-                 "$set": {"pseudo": user.name}},
-                upsert=True
-            )
-            utilisateurs.update_one(
-                {"_id": user_id},
-                {"$inc": {"lumes": quete["recompense"]},
-                 "$setOnInsert": {"pseudo": user.name, "derniere_offrande": {}, "roles_temporaires": {}}},
-                upsert=True
-            )
-            try:
-                await user.send(f"✨ Tu as terminé **{quete['nom']}** et gagné **{quete['recompense']} Lumes** !")
-            except discord.Forbidden:
-                ch = bot.get_channel(payload.channel_id)
-                if ch:
-                    await ch.send(f"✅ {user.mention} a terminé **{quete['nom']}** ! (MP non reçu)")
-            return
+    communes = candidats & (await etat_joueur(espace, user_id)).acceptees
+    if communes:
+        QUETES_TROUVEES.inc("reaction")
+    for quete_id in sorted(communes):
+        quete = catalogue.quete(quete_id)
+        if not quete or not await terminer_quete(espace, user, quete):
+            continue
+        ch = bot.get_channel(payload.channel_id)
+        envois.envoyer(
+            user, f"✨ Tu as terminé **{quete['nom']}** et gagné **{quete['recompense']} Lumes** !",
+            repli=(lambda: ch.send(f"✅ {user.mention} a terminé **{quete['nom']}** ! (MP non reçu)")) if ch else None,
+        )
+        return
 
 @bot.event
+@mesure("on_message")
 async def on_message(message: discord.Message):
     if message.author.bot:
         return
 
-    # Réponse aux énigmes en MP
+    # MP (réponses aux énigmes, commandes) : traités dans l’ordre, via la file
     if isinstance(message.channel, discord.DMChannel):
-        user = message.author
-        user_id = str(user.id)
-        contenu = message.content.strip()
+        file_evenements.soumettre(str(message.author.id), HAUTE, lambda: traiter_mp(message))
+        return
 
-        quetes = charger_quetes()
-        user_data = accepted_collection.find_one({"_id": user_id})
-        if not user_data:
-            return
+    await attendre_pret()
+    await traiter_commande(message)
 
-        quetes_acceptees = user_data.get("quetes", [])
-        toutes_quetes = [q for lst in quetes.values() for q in lst]
+# Durée de conservation d’une commande réclamée (bien plus que l’écart entre répliques)
+COMMANDES_RETENTION = int(os.getenv("COMMANDES_RETENTION", "3600"))
 
-        for quete in toutes_quetes:
-            if quete["id"] not in [q["id"] if isinstance(q, dict) else q for q in quetes_acceptees]:
-                continue
+async def reclamer_commande(message: discord.Message) -> bool:
+    """
+    Réclame le message de commande pour ce process : les répliques d’une même plage
+    de shards reçoivent chacune l’événement, seule la première insertion de son ID
+    (clé unique `_id`) passe. False si une autre réplique l’a déjà pris.
+    """
+    expire = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=COMMANDES_RETENTION)
+    try:
+        await commandes.insert_one({"_id": message.id, "expire": expire})
+    except DuplicateKeyError:
+        return False
+    except PyMongoError as e:
+        # Sans réclamation, la commande pourrait s’exécuter sur chaque réplique
+        print(f"❌ Commande {message.id} non réclamée, ignorée : {e}")
+        return False
+    return True
+
+async def traiter_commande(message: discord.Message):
+    """Comme bot.process_commands, mais une commande n’est exécutée que par une réplique."""
+    ctx = await bot.get_context(message)
+    if ctx.command is not None and not await reclamer_commande(message):
+        return
+    await bot.invoke(ctx)
 
-            bonne = normaliser(quete.get("reponse_attendue", ""))
-            if normaliser(contenu) == bonne:
-                accepted_collection.update_one({"_id": user_id}, {"$pull": {"quetes": {"id": quete["id"]}}})
-                completed_collection.update_one(
-                    {"_id": user_id},
-                    {"$addToSet": {"quetes": {"id": quete["id"], "nom": quete["nom"], "categorie": quete["categorie"]}},
-                     "$set": {"pseudo": user.name}},
-                    upsert=True
-                )
-                utilisateurs.update_one(
-                    {"_id": user_id},
-                    {"$inc": {"lumes": quete["recompense"]},
-                     "$setOnInsert": {"pseudo": user.name, "derniere_offrande": {}, "roles_temporaires": {}}},
-                    upsert=True
-                )
-                await message.channel.send(
-                    f"✅ Parfait ! Tu as complété **{quete['nom']}** et gagné **{quete['recompense']} Lumes** !"
-                )
+@mesure("traiter_mp", compteur=None)
+async def traiter_mp(message: discord.Message):
+    # Réponse aux énigmes en MP
+    user = message.author
+    contenu = message.content.strip()
+
+    # Quêtes acceptées sur tous les serveurs du joueur, y compris ceux des autres process
+    par_espace = await quetes_en_cours(user)
+    ids_acceptes = frozenset().union(*par_espace.values())
+    if ids_acceptes:
+        catalogue = quetes.actuel
+        trouvees = catalogue.reponses.correspondances(contenu, ids_acceptes, tolerance=REPONSES_TOLERANTES)
+        quete = catalogue.quete(trouvees[0]) if trouvees else None
+        if quete:
+            QUETES_TROUVEES.inc("mp")
+            espace = next(e for e, ids in par_espace.items() if quete["id"] in ids)
+            if not await terminer_quete(espace, user, quete):
                 return
+            envois.envoyer(
+                user, f"✅ Parfait ! Tu as complété **{quete['nom']}** et gagné **{quete['recompense']} Lumes** !"
+            )
+            return
 
-    await bot.process_commands(message)
+    await traiter_commande(message)
 
 # ======================
 #  SCHEDULER
 # ======================
+# Retard max (s) pour rattraper une publication manquée (redémarrage, changement de leader)
+PLANIF_RATTRAPAGE = int(os.getenv("PLANIF_RATTRAPAGE", str(6 * 3600)))
+
 _scheduler = None
+_serveur_metriques = None
+_sonde_boucle = None
 
-@bot.event
-async def on_ready():
-    global _scheduler
-    print(f"✅ Bot prêt : {bot.user}")
+# Seule la réplique qui détient ce bail fait tourner le scheduler ; toutes servent les événements.
+# Un scheduler par plage de shards : il publie sur les serveurs de ces shards.
+bail_planificateur = Bail(base.baux, "planificateur" if GROUPE_SHARDS == "tous" else f"planificateur:{GROUPE_SHARDS}")
 
-    if _scheduler is None:
-        _scheduler = AsyncIOScheduler(timezone=TZ_PARIS)
+def taches_planifiees():
+    """(id, fonction, déclencheur) des publications automatiques."""
+    taches = [
         # Tous les jours 10:30 → journalières
-        _scheduler.add_job(lambda: bot.loop.create_task(poster_journalieres()),
-                           CronTrigger(hour=10, minute=30))
+        ("journalieres", poster_journalieres, CronTrigger(hour=10, minute=30, timezone=TZ_PARIS)),
         # Chaque lundi 10:31 → hebdo (décalé d’1 min pour éviter concurrence)
-        _scheduler.add_job(lambda: bot.loop.create_task(poster_hebdo()),
-                           CronTrigger(day_of_week='mon', hour=10, minute=31))
-        # Annonce après chaque post hebdo
-        if ANNOUNCE_CHANNEL_ID:
-            _scheduler.add_job(lambda: bot.loop.create_task(annoncer_mise_a_jour()),
-                               CronTrigger(day_of_week='mon', hour=10, minute=32))
+        ("hebdo", poster_hebdo, CronTrigger(day_of_week='mon', hour=10, minute=31, timezone=TZ_PARIS)),
+        # Annonce après chaque post hebdo (serveurs qui ont un salon d’annonces)
+        ("annonce", annoncer_mise_a_jour, CronTrigger(day_of_week='mon', hour=10, minute=32, timezone=TZ_PARIS)),
+    ]
+    return taches
 
-        _scheduler.start()
-        print("⏰ Scheduler démarré (journalières quotidiennes, hebdo le lundi).")
+def demarrer_scheduler(boucle: asyncio.AbstractEventLoop):
+    """
+    Scheduler persistant (tâches en base) : les prochaines exécutions survivent
+    aux redémarrages, et une exécution manquée depuis moins de PLANIF_RATTRAPAGE
+    est rattrapée une fois (coalesce). Les tâches existantes ne sont pas recréées,
+    pour garder leur prochaine exécution.
+    Le MongoDBJobStore est synchrone : appelée dans un thread (asyncio.to_thread),
+    le scheduler tournant sur `boucle`. Il ne lit ensuite la base sur la boucle
+    qu’à chaque réveil (échéance d’une tâche, reprise).
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = AsyncIOScheduler(
+            event_loop=boucle,
+            timezone=TZ_PARIS,
+            jobstores={"default": MongoDBJobStore(
+                database=base.db.name, client=base.client,
+                collection=base.nom_taches if GROUPE_SHARDS == "tous" else f"{base.nom_taches}:{GROUPE_SHARDS}",
+            )},
+            job_defaults={"coalesce": True, "misfire_grace_time": PLANIF_RATTRAPAGE, "max_instances": 1},
+        )
+        _scheduler.start(paused=True)
+
+        voulues = taches_planifiees()
+        for id_, fonction, declencheur in voulues:
+            try:
+                job = _scheduler.get_job(id_)
+            except LookupError:
+                # Fonction enregistrée introuvable (module renommé) : la tâche est recréée
+                _scheduler.remove_job(id_)
+                job = None
+            if job is None:
+                _scheduler.add_job(fonction, declencheur, id=id_)
+                continue
+            if job.func is not fonction:
+                _scheduler.modify_job(id_, func=fonction)
+            if str(job.trigger) != str(declencheur):
+                _scheduler.reschedule_job(id_, trigger=declencheur)
+        ids = {id_ for id_, _, _ in voulues}
+        for job in _scheduler.get_jobs():
+            if job.id not in ids:
+                job.remove()
+    _scheduler.resume()
+
+@tasks.loop(seconds=BAIL_DUREE / 3)
+async def maintenir_bail():
+    """Prend ou renouvelle le bail ; démarre ou suspend le scheduler selon le résultat."""
+    etait_leader = bail_planificateur.detenu
+    try:
+        leader = await bail_planificateur.acquerir()
+    except PyMongoError as e:
+        # Bail non confirmé : une autre réplique peut le reprendre à l’expiration
+        print(f"❌ Bail du scheduler non renouvelé : {e}")
+        bail_planificateur.detenu = leader = False
+
+    if leader and not etait_leader:
+        await asyncio.to_thread(demarrer_scheduler, asyncio.get_running_loop())
+        print(f"⏰ Scheduler actif sur cette réplique ({bail_planificateur.identite}).")
+    elif etait_leader and not leader and _scheduler is not None:
+        _scheduler.pause()
+        print("⏸️ Bail perdu : scheduler suspendu sur cette réplique.")
+
+@maintenir_bail.before_loop
+async def avant_bail():
+    # Pas de publication (ni de rattrapage) avant que le cache des serveurs soit rempli
+    await bot.wait_until_ready()
+
+@tasks.loop(seconds=SERVEURS_INTERVALLE)
+async def rafraichir_serveurs():
+    """Reprend les configs modifiées par les autres process."""
+    try:
+        await serveurs.charger()
+    except PyMongoError as e:
+        print(f"❌ Configs serveurs non relues : {e}")
+
+@rafraichir_serveurs.before_loop
+async def avant_rafraichissement():
+    # Les configs viennent d’être lues par demarrer()
+    await asyncio.sleep(SERVEURS_INTERVALLE)
+
+async def reprendre_serveur_historique():
+    """Premier démarrage multi-serveur : QUESTS_CHANNEL_ID & co deviennent la config de leur serveur."""
+    ch = bot.get_channel(QUESTS_CHANNEL_ID) if QUESTS_CHANNEL_ID else None
+    if ch is None or serveurs.get(ch.guild.id) is not None:
+        return
+    if await serveurs.reprendre_historique(
+        ch.guild.id, progression,
+        salon_quetes=QUESTS_CHANNEL_ID,
+        salon_annonces=ANNOUNCE_CHANNEL_ID or None,
+        role_annonce=ANNOUNCE_ROLE_ID or None,
+    ):
+        print(f"🏰 Serveur historique {ch.guild.name} repris dans la configuration par serveur.")
+
+# ======================
+#  DÉMARRAGE
+# ======================
+# Événements reçus avant on_ready : retenus (file fermée, commandes en attente) au plus
+# PRET_DELAI s après la fin de demarrer(), puis traités même si on_ready n’est pas arrivé.
+PRET_DELAI = float(os.getenv("PRET_DELAI", "15"))
+
+pret = asyncio.Event()
+_fin_demarrage = None
+_ouverture_file = None
+# Durée (s) de chaque phase du démarrage, affichée par !etat_db
+duree_demarrage = {}
+
+async def attendre_pret():
+    if pret.is_set() or _fin_demarrage is None:
+        return
+    try:
+        await asyncio.wait_for(pret.wait(), max(0.0, _fin_demarrage + PRET_DELAI - time.monotonic()))
+    except asyncio.TimeoutError:
+        pass
+
+async def phase(nom: str, attente):
+    debut = time.perf_counter()
+    resultat = await attente
+    duree_demarrage[nom] = time.perf_counter() - debut
+    return resultat
+
+async def charger_catalogue():
+    try:
+        catalogue = await asyncio.to_thread(quetes.charger)
+    except (OSError, CatalogueInvalide) as e:
+        raise SystemExit(f"❌ Catalogue {CHEMIN_QUETES} refusé, démarrage annulé : {e}")
+    print(f"📚 Catalogue : version {catalogue.version} ({len(catalogue)} quêtes).")
+
+async def connecter_mongo():
+    await base.ping()
+    await base.creer_index()
+    print(f"🗄️ Mongo : {base.resume()}")
+
+async def demarrer():
+    """
+    Séquence de démarrage, avant la connexion à la passerelle :
+    1. catalogue (lu hors de la boucle) et Mongo (ping, index), en parallèle ;
+    2. caches chauds, en parallèle : embeds et index des réponses, configs des
+       serveurs, top du classement ;
+    3. tâches de fond et envois. La file d’événements s’ouvre à on_ready.
+    """
+    global _fin_demarrage, _ouverture_file, _serveur_metriques, _sonde_boucle
+    debut = time.perf_counter()
+    await asyncio.gather(phase("catalogue", charger_catalogue()), phase("mongo", connecter_mongo()))
+    await asyncio.gather(
+        phase("embeds", asyncio.to_thread(preparer_catalogue)),
+        phase("serveurs", serveurs.charger()),
+        phase("classement", classement.top()),
+    )
+    duree_demarrage["total"] = time.perf_counter() - debut
+    print(f"🚀 Démarrage en {duree_demarrage['total'] * 1000:.0f} ms ("
+          + ", ".join(f"{nom} {d * 1000:.0f} ms" for nom, d in duree_demarrage.items() if nom != "total") + ")")
+
+    _sonde_boucle = asyncio.create_task(metriques.surveiller_boucle())
+    try:
+        _serveur_metriques = await metriques.servir()
+    except OSError as e:
+        # Port déjà pris (autre process sur l’hôte) : le bot tourne sans exporteur
+        print(f"⚠️ Métriques non exportées (METRIQUES_PORT={metriques.METRIQUES_PORT}) : {e}")
+    if _serveur_metriques:
+        print(f"📈 Métriques : http://{metriques.METRIQUES_HOTE}:{metriques.METRIQUES_PORT}/metrics")
+    envois.demarrer()
+    surveiller_catalogue.start()
+    rafraichir_serveurs.start()
+    maintenir_bail.start()
+    _fin_demarrage = time.monotonic()
+    _ouverture_file = asyncio.create_task(ouvrir_file())
+
+async def ouvrir_file():
+    debut = time.perf_counter()
+    await attendre_pret()
+    file_evenements.demarrer()
+    if not pret.is_set():
+        print(f"⚠️ on_ready toujours attendu après {PRET_DELAI:g}s : la file s’ouvre quand même.")
+    print(f"📥 File d’événements ouverte après {time.perf_counter() - debut:.1f}s "
+          f"({file_evenements.profondeur} retenu(s)) : {file_evenements.workers} workers, "
+          f"{file_evenements.taille_max} places.")
+
+@bot.event
+async def on_ready():
+    print(f"✅ Bot prêt : {bot.user}")
+    try:
+        await reprendre_serveur_historique()
+    finally:
+        if not pret.is_set():
+            duree_demarrage["passerelle"] = time.monotonic() - _fin_demarrage
+            pret.set()
+    print(f"🌐 Shards {GROUPE_SHARDS} : {len(bot.guilds)} serveurs, {len(serveurs_locaux())} configurés.")
 
 # ======================
 #  RUN
 # ======================
 if __name__ == "__main__":
-    if not DISCORD_TOKEN or not MONGO_URI or not QUESTS_CHANNEL_ID:
-        print("❌ DISCORD_TOKEN / MONGO_URI / QUESTS_CHANNEL_ID manquant(s).")
+    if not DISCORD_TOKEN or not MONGO_URI:
+        print("❌ DISCORD_TOKEN / MONGO_URI manquant(s).")
+    if SHARDS and not SHARD_COUNT:
+        raise SystemExit("❌ SHARDS nécessite SHARD_COUNT (nombre total de shards).")
     bot.run(DISCORD_TOKEN)
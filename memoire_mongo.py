@@ -0,0 +1,266 @@
+"""
+Collections Mongo en mémoire, même interface awaitable que `CollectionAsync`.
+
+Couvre le sous-ensemble utilisé par le bot : filtres d’égalité et opérateurs
+simples ($ne, $in, $gt, $gte, $lt, $lte, $exists), mises à jour $set, $inc,
+$setOnInsert, $unset, $addToSet, $pull, $push, upserts, projections, index
+uniques. Sert au banc d’essai (banc_essai.py) : aucun serveur nécessaire.
+Une latence simulée par appel peut être ajoutée pour imiter un aller-retour.
+"""
+import asyncio
+import copy
+import itertools
+from types import SimpleNamespace
+
+from pymongo.errors import DuplicateKeyError
+
+_COMPARAISONS = {
+    "$ne": lambda v, x: v != x,
+    "$in": lambda v, x: v in x,
+    "$gt": lambda v, x: v is not None and v > x,
+    "$gte": lambda v, x: v is not None and v >= x,
+    "$lt": lambda v, x: v is not None and v < x,
+    "$lte": lambda v, x: v is not None and v <= x,
+}
+_ABSENT = object()
+
+
+def _lire(doc, chemin):
+    for cle in chemin.split("."):
+        if not isinstance(doc, dict) or cle not in doc:
+            return _ABSENT
+        doc = doc[cle]
+    return doc
+
+
+def _ecrire(doc, chemin, valeur):
+    *parents, cle = chemin.split(".")
+    for p in parents:
+        doc = doc.setdefault(p, {})
+    doc[cle] = valeur
+
+
+def _effacer(doc, chemin):
+    *parents, cle = chemin.split(".")
+    for p in parents:
+        doc = doc.get(p, {})
+    doc.pop(cle, None)
+
+
+def correspond(doc, filtre) -> bool:
+    for chemin, attendu in (filtre or {}).items():
+        valeur = _lire(doc, chemin)
+        if isinstance(attendu, dict) and attendu and all(k.startswith("$") for k in attendu):
+            for op, arg in attendu.items():
+                if op == "$exists":
+                    if (valeur is not _ABSENT) != bool(arg):
+                        return False
+                elif not _COMPARAISONS[op](None if valeur is _ABSENT else valeur, arg):
+                    return False
+        elif isinstance(valeur, list) and not isinstance(attendu, list):
+            if attendu not in valeur:
+                return False
+        elif (None if valeur is _ABSENT else valeur) != attendu:
+            return False
+    return True
+
+
+def appliquer(doc, maj, insertion=False):
+    for op, champs in maj.items():
+        if op == "$setOnInsert" and not insertion:
+            continue
+        for chemin, valeur in champs.items():
+            actuelle = _lire(doc, chemin)
+            if op in ("$set", "$setOnInsert"):
+                _ecrire(doc, chemin, copy.deepcopy(valeur))
+            elif op == "$inc":
+                _ecrire(doc, chemin, (0 if actuelle is _ABSENT else actuelle) + valeur)
+            elif op == "$unset":
+                _effacer(doc, chemin)
+            elif op in ("$addToSet", "$push"):
+                liste = [] if actuelle is _ABSENT else actuelle
+                valeurs = valeur["$each"] if isinstance(valeur, dict) and "$each" in valeur else [valeur]
+                for v in valeurs:
+                    if op == "$push" or v not in liste:
+                        liste.append(v)
+                _ecrire(doc, chemin, liste)
+            elif op == "$pull":
+                if actuelle is not _ABSENT:
+                    _ecrire(doc, chemin, [v for v in actuelle if v != valeur])
+            else:
+                raise NotImplementedError(op)
+
+
+def projeter(doc, projection):
+    if doc is None:
+        return None
+    if not projection:
+        return copy.deepcopy(doc)
+    if any(projection.values()):
+        resultat = {k: copy.deepcopy(doc[k]) for k, v in projection.items() if v and k != "_id" and k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            resultat["_id"] = doc["_id"]
+        return resultat
+    return {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 1)}
+
+
+class CollectionMemoire:
+    def __init__(self, name, latence=0.0):
+        self.name = name
+        self.latence = latence
+        self._docs = {}
+        self._uniques = {}  # champs de l’index unique -> {valeurs: _id}
+        self._index = {}    # premier champ d’un index -> {valeur: {_id}}
+        self._ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self._docs)
+
+    async def _attendre(self):
+        if self.latence:
+            await asyncio.sleep(self.latence)
+        else:
+            await asyncio.sleep(0)
+
+    def _trouver(self, filtre):
+        filtre = filtre or {}
+        if "_id" in filtre and not isinstance(filtre["_id"], dict):
+            candidats = [filtre["_id"]]
+        else:
+            candidats = self._docs.keys()
+            for champ, table in self._index.items():
+                valeur = filtre.get(champ, _ABSENT)
+                if valeur is not _ABSENT and not isinstance(valeur, (dict, list)):
+                    candidats = list(table.get(valeur, ()))
+                    break
+        docs = (self._docs.get(i) for i in candidats)
+        return [d for d in docs if d is not None and correspond(d, filtre)]
+
+    def _indexer(self, doc, retirer=False):
+        for champs, table in self._uniques.items():
+            cle = tuple(doc.get(c) for c in champs)
+            if retirer:
+                table.pop(cle, None)
+            else:
+                table[cle] = doc["_id"]
+        for champ, table in self._index.items():
+            ids = table.setdefault(doc.get(champ), set())
+            if retirer:
+                ids.discard(doc["_id"])
+            else:
+                ids.add(doc["_id"])
+
+    def _verifier_unicite(self, doc):
+        for champs, table in self._uniques.items():
+            cle = tuple(doc.get(c) for c in champs)
+            if table.get(cle, doc["_id"]) != doc["_id"]:
+                raise DuplicateKeyError(f"E11000 {self.name} {dict(zip(champs, cle))}")
+
+    def _inserer(self, doc):
+        doc.setdefault("_id", next(self._ids))
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 {self.name} _id={doc['_id']!r}")
+        self._verifier_unicite(doc)
+        self._docs[doc["_id"]] = doc
+        self._indexer(doc)
+        return doc
+
+    def _mettre_a_jour(self, filtre, maj, upsert):
+        trouves = self._trouver(filtre)
+        if trouves:
+            doc = trouves[0]
+            avant = copy.deepcopy(doc)
+            self._indexer(doc, retirer=True)
+            appliquer(doc, maj)
+            try:
+                self._verifier_unicite(doc)
+            except DuplicateKeyError:
+                doc.clear()
+                doc.update(avant)
+                raise
+            finally:
+                self._indexer(doc)
+            return avant, doc, None
+        if not upsert:
+            return None, None, None
+        doc = {k: copy.deepcopy(v) for k, v in (filtre or {}).items()
+               if not k.startswith("$") and "." not in k
+               and not (isinstance(v, dict) and any(c.startswith("$") for c in v))}
+        appliquer(doc, maj, insertion=True)
+        self._inserer(doc)
+        return None, doc, doc["_id"]
+
+    async def find_one(self, filtre=None, projection=None, **kwargs):
+        await self._attendre()
+        trouves = self._trouver(filtre)
+        return projeter(trouves[0], projection) if trouves else None
+
+    async def find(self, filtre=None, projection=None, sort=None, limit=0, **kwargs):
+        await self._attendre()
+        docs = self._trouver(filtre)
+        for cle, sens in reversed(sort or []):
+            docs.sort(key=lambda d: (_lire(d, cle) is _ABSENT, _lire(d, cle)), reverse=sens < 0)
+        if limit:
+            docs = docs[:limit]
+        return [projeter(d, projection) for d in docs]
+
+    async def count_documents(self, filtre=None, **kwargs):
+        await self._attendre()
+        return len(self._trouver(filtre))
+
+    async def insert_one(self, doc, **kwargs):
+        await self._attendre()
+        doc = self._inserer(copy.deepcopy(doc))
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def update_one(self, filtre, maj, upsert=False, **kwargs):
+        await self._attendre()
+        avant, apres, upserted_id = self._mettre_a_jour(filtre, maj, upsert)
+        return SimpleNamespace(
+            matched_count=int(avant is not None),
+            modified_count=int(avant is not None and avant != apres),
+            upserted_id=upserted_id,
+        )
+
+    async def update_many(self, filtre, maj, **kwargs):
+        await self._attendre()
+        modifies = 0
+        for doc in self._trouver(filtre):
+            avant = copy.deepcopy(doc)
+            self._indexer(doc, retirer=True)
+            appliquer(doc, maj)
+            self._indexer(doc)
+            modifies += avant != doc
+        return SimpleNamespace(modified_count=modifies)
+
+    async def find_one_and_update(self, filtre, maj, projection=None, upsert=False,
+                                  return_document=False, **kwargs):
+        await self._attendre()
+        avant, apres, _ = self._mettre_a_jour(filtre, maj, upsert)
+        return projeter(apres if return_document else avant, projection)
+
+    async def find_one_and_delete(self, filtre, projection=None, **kwargs):
+        await self._attendre()
+        trouves = self._trouver(filtre)
+        if not trouves:
+            return None
+        doc = self._docs.pop(trouves[0]["_id"])
+        self._indexer(doc, retirer=True)
+        return projeter(doc, projection)
+
+    async def delete_one(self, filtre, **kwargs):
+        await self._attendre()
+        trouves = self._trouver(filtre)
+        if trouves:
+            self._indexer(self._docs.pop(trouves[0]["_id"]), retirer=True)
+        return SimpleNamespace(deleted_count=len(trouves[:1]))
+
+    async def create_index(self, cles, unique=False, name=None, **kwargs):
+        champs = (cles,) if isinstance(cles, str) else tuple(c for c, _ in cles)
+        if unique and champs not in self._uniques:
+            self._uniques[champs] = {}
+        if champs[0] != "_id" and champs[0] not in self._index:
+            self._index[champs[0]] = {}
+        for doc in self._docs.values():
+            self._indexer(doc)
+        return name or "_".join(champs)
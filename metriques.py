@@ -0,0 +1,290 @@
+"""
+Métriques du bot : compteurs, histogrammes de latence, retard de boucle.
+
+Conçu pour rester actif en production : une observation coûte un
+`perf_counter` et une recherche dichotomique dans des bornes fixes, sans
+verrou (tout est observé depuis la boucle asyncio, y compris les appels
+Mongo, mesurés côté coroutine).
+
+Export au format texte Prometheus sur un petit serveur HTTP local
+(METRIQUES_PORT, 0 pour désactiver), résumé lisible pour `!stats`, et un
+profileur par échantillonnage activable à chaud. Plusieurs process sur un
+même hôte (un par plage de SHARDS) doivent chacun avoir leur METRIQUES_PORT :
+un port déjà pris désactive l’export de ce process, sans l’arrêter.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+METRIQUES_HOTE = os.getenv("METRIQUES_HOTE", "127.0.0.1")
+METRIQUES_PORT = int(os.getenv("METRIQUES_PORT", "9108"))
+# Période (s) de la sonde de retard de boucle
+METRIQUES_PAS_BOUCLE = float(os.getenv("METRIQUES_PAS_BOUCLE", "0.5"))
+
+BORNES_LATENCE = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _etiquettes(noms, valeurs) -> str:
+    if not noms:
+        return ""
+    paires = ",".join(f'{n}="{str(v).replace(chr(34), chr(39))}"' for n, v in zip(noms, valeurs))
+    return "{" + paires + "}"
+
+
+class Compteur:
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = etiquettes
+        self.valeurs = {}
+
+    def inc(self, *valeurs, n=1):
+        self.valeurs[valeurs] = self.valeurs.get(valeurs, 0) + n
+
+    def total(self):
+        return sum(self.valeurs.values())
+
+    def exporter(self):
+        yield f"# HELP {self.nom} {self.aide}"
+        yield f"# TYPE {self.nom} counter"
+        for valeurs, n in self.valeurs.items():
+            yield f"{self.nom}{_etiquettes(self.etiquettes, valeurs)} {n}"
+
+
+class Histogramme:
+    def __init__(self, nom, aide, etiquettes=(), bornes=BORNES_LATENCE):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = etiquettes
+        self.bornes = bornes
+        self.series = {}  # valeurs d’étiquettes -> [compte par borne (+inf), somme, total]
+
+    def observer(self, valeur, *valeurs):
+        serie = self.series.get(valeurs)
+        if serie is None:
+            serie = self.series[valeurs] = [[0] * (len(self.bornes) + 1), 0.0, 0]
+        serie[0][bisect_left(self.bornes, valeur)] += 1
+        serie[1] += valeur
+        serie[2] += 1
+
+    @contextmanager
+    def chronometre(self, *valeurs):
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observer(time.perf_counter() - debut, *valeurs)
+
+    def quantile(self, q, *valeurs):
+        """Quantile approché : borne supérieure du seau qui le contient."""
+        serie = self.series.get(valeurs)
+        if not serie or not serie[2]:
+            return 0.0
+        rang = q * serie[2]
+        cumul = 0
+        for borne, n in zip(self.bornes + (float("inf"),), serie[0]):
+            cumul += n
+            if cumul >= rang:
+                return borne
+        return float("inf")
+
+    def exporter(self):
+        yield f"# HELP {self.nom} {self.aide}"
+        yield f"# TYPE {self.nom} histogram"
+        for valeurs, (comptes, somme, total) in self.series.items():
+            cumul = 0
+            for borne, n in zip(self.bornes + ("+Inf",), comptes):
+                cumul += n
+                noms = self.etiquettes + ("le",)
+                yield f"{self.nom}_bucket{_etiquettes(noms, valeurs + (borne,))} {cumul}"
+            yield f"{self.nom}_sum{_etiquettes(self.etiquettes, valeurs)} {somme}"
+            yield f"{self.nom}_count{_etiquettes(self.etiquettes, valeurs)} {total}"
+
+
+class Jauge:
+    """Valeur lue à l’export (taille de cache, profondeur de file…)."""
+
+    def __init__(self, nom, aide, fonction):
+        self.nom = nom
+        self.aide = aide
+        self.fonction = fonction
+
+    def exporter(self):
+        yield f"# HELP {self.nom} {self.aide}"
+        yield f"# TYPE {self.nom} gauge"
+        yield f"{self.nom} {self.fonction()}"
+
+
+class Registre:
+    def __init__(self):
+        self.metriques = {}
+
+    def _ajouter(self, metrique):
+        return self.metriques.setdefault(metrique.nom, metrique)
+
+    def compteur(self, nom, aide, etiquettes=()) -> Compteur:
+        return self._ajouter(Compteur(nom, aide, etiquettes))
+
+    def histogramme(self, nom, aide, etiquettes=(), bornes=BORNES_LATENCE) -> Histogramme:
+        return self._ajouter(Histogramme(nom, aide, etiquettes, bornes))
+
+    def jauge(self, nom, aide, fonction) -> Jauge:
+        self.metriques[nom] = Jauge(nom, aide, fonction)
+        return self.metriques[nom]
+
+    def texte_prometheus(self) -> str:
+        lignes = []
+        for metrique in list(self.metriques.values()):
+            lignes.extend(metrique.exporter())
+        return "\n".join(lignes) + "\n"
+
+
+registre = Registre()
+
+EVENEMENTS = registre.compteur("mdq_evenements_total", "Événements reçus par handler.", ("handler",))
+ERREURS = registre.compteur("mdq_erreurs_total", "Exceptions levées par handler.", ("handler",))
+DUREE_HANDLER = registre.histogramme("mdq_handler_secondes", "Durée des handlers.", ("handler",))
+DUREE_MONGO = registre.histogramme("mdq_mongo_secondes", "Durée des appels Mongo (file comprise).",
+                                   ("operation", "collection"))
+DUREE_DISCORD = registre.histogramme("mdq_discord_secondes", "Durée des requêtes HTTP Discord.", ("route",))
+DUREE_TACHE = registre.histogramme("mdq_tache_secondes", "Durée des tâches planifiées.", ("tache",))
+RETARD_BOUCLE = registre.histogramme("mdq_retard_boucle_secondes", "Retard de réveil de la boucle asyncio.")
+QUETES_TROUVEES = registre.compteur("mdq_quetes_trouvees_total", "Événements correspondant à une quête.",
+                                    ("source",))
+COMPLETIONS = registre.compteur("mdq_completions_total", "Quêtes terminées.", ("categorie",))
+LUMES = registre.compteur("mdq_lumes_versees_total", "Lumes versées en récompense.")
+
+
+def mesure(nom: str, histogramme: Histogramme = DUREE_HANDLER, compteur: Compteur = EVENEMENTS):
+    """Décorateur de coroutine : compte l’appel, mesure sa durée, compte ses exceptions."""
+    def decorer(fonction):
+        @wraps(fonction)
+        async def envelopper(*args, **kwargs):
+            if compteur is not None:
+                compteur.inc(nom)
+            debut = time.perf_counter()
+            try:
+                return await fonction(*args, **kwargs)
+            except Exception:
+                ERREURS.inc(nom)
+                raise
+            finally:
+                histogramme.observer(time.perf_counter() - debut, nom)
+        return envelopper
+    return decorer
+
+
+def instrumenter_http(http):
+    """Mesure chaque requête du client HTTP de discord.py, par route (méthode + chemin générique)."""
+    requete = http.request
+
+    @wraps(requete)
+    async def request(route, **kwargs):
+        with DUREE_DISCORD.chronometre(f"{route.method} {route.path}"):
+            return await requete(route, **kwargs)
+
+    http.request = request
+
+
+async def surveiller_boucle(pas=METRIQUES_PAS_BOUCLE):
+    """Sonde : l’écart entre le réveil prévu et le réveil réel mesure le blocage de la boucle."""
+    while True:
+        debut = time.perf_counter()
+        await asyncio.sleep(pas)
+        RETARD_BOUCLE.observer(max(0.0, time.perf_counter() - debut - pas))
+
+
+async def _repondre(lecteur, ecrivain):
+    try:
+        requete = await asyncio.wait_for(lecteur.readline(), 5)
+        while (await asyncio.wait_for(lecteur.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass
+        if requete.split(b" ")[1:2] == [b"/metrics"]:
+            corps, statut = registre.texte_prometheus().encode(), "200 OK"
+        else:
+            corps, statut = b"not found\n", "404 Not Found"
+        ecrivain.write(
+            f"HTTP/1.1 {statut}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(corps)}\r\nConnection: close\r\n\r\n".encode() + corps
+        )
+        await ecrivain.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        ecrivain.close()
+
+
+async def servir(port=METRIQUES_PORT, hote=METRIQUES_HOTE):
+    """Serveur HTTP local : GET /metrics. Retourne None si désactivé (port 0)."""
+    if not port:
+        return None
+    return await asyncio.start_server(_repondre, hote, port)
+
+
+class Profileur:
+    """
+    Profileur par échantillonnage : un thread relève périodiquement la pile
+    du thread de la boucle et compte les lignes en cours d’exécution.
+    """
+
+    def __init__(self, periode=0.005):
+        self.periode = periode
+        self.echantillons = Counter()
+        self.total = 0
+        self._thread = None
+        self._arret = threading.Event()
+
+    @property
+    def actif(self) -> bool:
+        return self._thread is not None
+
+    def demarrer(self, thread_id=None):
+        if self.actif:
+            return
+        cible = thread_id or threading.get_ident()
+        self.echantillons.clear()
+        self.total = 0
+        self._arret.clear()
+        self._thread = threading.Thread(target=self._boucle, args=(cible,), name="profileur", daemon=True)
+        self._thread.start()
+
+    def _boucle(self, cible):
+        while not self._arret.wait(self.periode):
+            frame = sys._current_frames().get(cible)
+            if frame is None:
+                continue
+            code = frame.f_code
+            self.echantillons[f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"] += 1
+            self.total += 1
+
+    def arreter(self, top=15) -> list:
+        """Arrête l’échantillonnage ; retourne [(ligne, part des échantillons)]."""
+        if self._thread is not None:
+            self._arret.set()
+            self._thread.join()
+            self._thread = None
+        return [(ligne, n / self.total) for ligne, n in self.echantillons.most_common(top)] if self.total else []
+
+
+def resume() -> str:
+    """Résumé court pour `!stats`."""
+    lignes = []
+    for (handler,), n in sorted(EVENEMENTS.valeurs.items()):
+        p50 = DUREE_HANDLER.quantile(0.5, handler) * 1000
+        p99 = DUREE_HANDLER.quantile(0.99, handler) * 1000
+        erreurs = ERREURS.valeurs.get((handler,), 0)
+        lignes.append(f"• {handler} : {n} évt, p50 ≤ {p50:g} ms, p99 ≤ {p99:g} ms"
+                      + (f", {erreurs} erreurs" if erreurs else ""))
+    mongo = sum(s[2] for s in DUREE_MONGO.series.values())
+    discord_ = sum(s[2] for s in DUREE_DISCORD.series.values())
+    lignes.append(f"🔎 Quêtes trouvées : {QUETES_TROUVEES.total()}, terminées : {COMPLETIONS.total()}, "
+                  f"Lumes versées : {LUMES.total()}")
+    lignes.append(f"🗄️ Appels Mongo : {mongo} ; 🌐 requêtes Discord : {discord_}")
+    lignes.append(f"⏳ Retard de boucle : p99 ≤ {RETARD_BOUCLE.quantile(0.99) * 1000:g} ms")
+    return "\n".join(lignes)
@@ -0,0 +1,77 @@
+"""
+Migration hors ligne : quetes_acceptees / quetes_terminees -> progression_quetes.
+
+Lit les anciens documents (un par joueur, tableau `quetes`) en flux par lots et
+les écrit en un document par (joueur, quête, statut) avec des upserts groupés.
+Relançable sans risque : les upserts ne créent jamais de doublon.
+Sans --serveur, les entrées sont rattachées au serveur historique au premier
+démarrage du bot ; après ce démarrage, passer l’ID du serveur.
+
+Usage : MONGO_URI=... python migrer_progression.py [--taille-lot 1000] [--serveur ID]
+"""
+import argparse
+import os
+import time
+
+from pymongo import MongoClient, UpdateOne
+
+from base_donnees import INDEX_PROGRESSION
+
+STATUTS = (
+    ("quetes_acceptees", "acceptee"),
+    ("quetes_terminees", "terminee"),
+)
+
+
+def operations(doc, statut, serveur=None):
+    user_id = str(doc["_id"])
+    pseudo = doc.get("pseudo")
+    for q in doc.get("quetes", []):
+        quete_id = q.get("id") if isinstance(q, dict) else q
+        if not quete_id:
+            continue
+        champs = {"pseudo": pseudo}
+        if isinstance(q, dict):
+            champs.update({k: q[k] for k in ("nom", "categorie") if k in q})
+        filtre = {"user_id": user_id, "quest_id": str(quete_id).upper(), "statut": statut}
+        if serveur:
+            filtre["serveur"] = serveur
+        yield UpdateOne(
+            filtre,
+            {"$setOnInsert": champs},
+            upsert=True,
+        )
+
+
+def migrer(db, taille_lot=1000, serveur=None):
+    cible = db.progression_quetes
+    for cles, options in INDEX_PROGRESSION:
+        cible.create_index(cles, **options)
+
+    for source, statut in STATUTS:
+        debut = time.perf_counter()
+        joueurs = ecrits = 0
+        lot = []
+        for doc in db[source].find({}, batch_size=taille_lot):
+            joueurs += 1
+            lot.extend(operations(doc, statut, serveur))
+            if len(lot) >= taille_lot:
+                ecrits += cible.bulk_write(lot, ordered=False).upserted_count
+                lot = []
+                print(f"  {source} : {joueurs} joueurs lus, {ecrits} entrées créées…")
+        if lot:
+            ecrits += cible.bulk_write(lot, ordered=False).upserted_count
+        print(f"✅ {source} : {joueurs} joueurs, {ecrits} entrées créées "
+              f"en {time.perf_counter() - debut:.1f}s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--taille-lot", type=int, default=1000)
+    parser.add_argument("--serveur", help="ID du serveur Discord des entrées migrées")
+    args = parser.parse_args()
+
+    uri = os.getenv("MONGO_URI")
+    if not uri:
+        raise SystemExit("❌ MONGO_URI manquant.")
+    migrer(MongoClient(uri).lumharel_bot, args.taille_lot, args.serveur)
@@ -0,0 +1,313 @@
+"""
+Opérations en masse : sauvegarde / restauration JSONL, attribution de Lumes
+et de quêtes à des milliers de joueurs.
+
+- export : chaque collection est lue par curseur (lots de MASSE_TAILLE_LOT) et
+  écrite ligne à ligne ({"collection": …, "doc": …}, JSON étendu pour les dates
+  et ObjectId) : la mémoire ne dépend pas du nombre de joueurs ;
+- import : le fichier est lu ligne à ligne et réécrit par `bulk_write` non
+  ordonnés d’upserts sur la clé naturelle de chaque collection (relançable
+  sans doublon) ; `vers_serveur` rattache la progression à un autre serveur ;
+- Lumes et quêtes : un `$inc` / upsert par joueur, envoyés par lots ; une quête
+  accordée n’est payée qu’aux joueurs qui ne l’avaient pas encore terminée.
+  En cas d’arrêt entre les deux écritures d’un lot, un joueur peut manquer sa
+  récompense, jamais la recevoir deux fois.
+
+En simulation, rien n’est écrit : les lignes sont lues et vérifiées, les
+opérations comptées (pour une quête, les déjà-terminées sont relues).
+Les fonctions sont synchrones (pymongo) : le bot les lance hors de la boucle.
+
+Usage : MONGO_URI=... python operations_masse.py exporter [-o sauvegarde.jsonl] [--serveur ID]
+        MONGO_URI=... python operations_masse.py importer sauvegarde.jsonl [--vers-serveur ID] [--simulation]
+        MONGO_URI=... python operations_masse.py lumes gagnants.csv [--montant 50] [--simulation]
+        MONGO_URI=... python operations_masse.py accorder QUETE_ID joueurs.csv --serveur ID [--simulation]
+"""
+import argparse
+import os
+import time
+from itertools import islice
+
+from bson import json_util
+from pymongo import DeleteOne, MongoClient, ReplaceOne, UpdateOne
+
+from journal import CATEGORIES_QUOTIDIENNES
+
+MASSE_TAILLE_LOT = int(os.getenv("MASSE_TAILLE_LOT", "1000"))
+
+# Nom court -> (collection Mongo, clé naturelle utilisée par l’import)
+COLLECTIONS = {
+    "utilisateurs": ("utilisateurs", ("_id",)),
+    "progression": ("progression_quetes", ("serveur", "user_id", "quest_id", "statut")),
+    "journal": ("journal_quotidien", ("serveur", "user_id", "quest_id", "jour")),
+    "serveurs": ("config_serveurs", ("_id",)),
+}
+
+_JSON = json_util.RELAXED_JSON_OPTIONS
+
+
+class Bilan:
+    """Compteurs d’une opération en masse, lus par le suivi de progression."""
+
+    def __init__(self, operation: str, simulation=False):
+        self.operation = operation
+        self.simulation = simulation
+        self._debut = time.perf_counter()
+        self.lus = 0
+        self.ecrits = 0
+        self.ignores = 0
+        self.lots = 0
+        self.lumes = 0
+
+    @property
+    def duree(self) -> float:
+        return time.perf_counter() - self._debut
+
+    def resume(self) -> str:
+        texte = f"{self.lus} lus, {self.ecrits} {'à écrire' if self.simulation else 'écrits'}"
+        if self.ignores:
+            texte += f", {self.ignores} ignorés"
+        if self.lumes:
+            texte += f", {self.lumes} Lumes"
+        texte += f" — {self.lots} lot(s) en {self.duree:.1f}s"
+        return texte + (" (simulation : rien n’a été écrit)" if self.simulation else "")
+
+
+def par_lots(elements, taille: int):
+    iterateur = iter(elements)
+    while lot := list(islice(iterateur, taille)):
+        yield lot
+
+
+def _filtre_serveur(nom: str, serveur) -> dict:
+    if serveur is None or nom == "utilisateurs":
+        return {}  # comptes (Lumes) communs à tous les serveurs
+    if nom == "serveurs":
+        return {"_id": int(serveur)}
+    return {"serveur": str(serveur)}
+
+
+def _ecrire(collection, operations, simulation, bilan, progres):
+    if simulation:
+        bilan.ecrits += len(operations)
+    else:
+        resultat = collection.bulk_write(operations, ordered=False)
+        bilan.ecrits += resultat.upserted_count + resultat.modified_count
+    bilan.lots += 1
+    if progres:
+        progres(bilan)
+
+
+def exporter(db, sortie, collections=tuple(COLLECTIONS), serveur=None, taille_lot=MASSE_TAILLE_LOT,
+             progres=None) -> Bilan:
+    """Écrit les collections dans `sortie` (fichier texte), une ligne JSON par document."""
+    bilan = Bilan("export")
+    for nom in collections:
+        collection = db[COLLECTIONS[nom][0]]
+        for doc in collection.find(_filtre_serveur(nom, serveur), batch_size=taille_lot):
+            sortie.write(json_util.dumps({"collection": nom, "doc": doc}, json_options=_JSON) + "\n")
+            bilan.lus += 1
+            bilan.ecrits += 1
+            if bilan.lus % taille_lot == 0:
+                bilan.lots += 1
+                if progres:
+                    progres(bilan)
+    if bilan.lus % taille_lot:
+        bilan.lots += 1
+    return bilan
+
+
+def importer(db, lignes, collections=tuple(COLLECTIONS), vers_serveur=None, simulation=False,
+             taille_lot=MASSE_TAILLE_LOT, progres=None) -> Bilan:
+    """
+    Réécrit les documents d’un export (upsert sur la clé naturelle). Lève ValueError
+    sur une ligne invalide : lancer d’abord en simulation pour tout vérifier.
+    """
+    bilan = Bilan("import", simulation)
+    en_attente = {}  # nom -> [ReplaceOne], au plus un lot par collection
+    for numero, ligne in enumerate(lignes, 1):
+        if not ligne.strip():
+            continue
+        try:
+            entree = json_util.loads(ligne, json_options=_JSON)
+            nom, doc = entree["collection"], entree["doc"]
+            collection, cle = COLLECTIONS[nom]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"ligne {numero} : entrée illisible ({e!r})") from e
+        bilan.lus += 1
+        if nom not in collections or (vers_serveur is not None and nom == "serveurs"):
+            bilan.ignores += 1
+            continue
+        if vers_serveur is not None and "serveur" in cle:
+            doc["serveur"] = str(vers_serveur)
+        manquants = [c for c in cle if c not in doc]
+        if manquants:
+            raise ValueError(f"ligne {numero} : champ(s) {', '.join(manquants)} manquant(s) ({nom})")
+        if cle != ("_id",):
+            doc.pop("_id", None)  # l’ObjectId d’origine pourrait entrer en conflit
+        lot = en_attente.setdefault(nom, [])
+        lot.append(ReplaceOne({c: doc[c] for c in cle}, doc, upsert=True))
+        if len(lot) >= taille_lot:
+            _ecrire(db[collection], lot, simulation, bilan, progres)
+            en_attente[nom] = []
+    for nom, lot in en_attente.items():
+        if lot:
+            _ecrire(db[COLLECTIONS[nom][0]], lot, simulation, bilan, progres)
+    return bilan
+
+
+def _ouverture_compte(pseudo) -> dict:
+    champs = {"derniere_offrande": {}, "roles_temporaires": {}}
+    if pseudo:
+        champs["pseudo"] = pseudo
+    return champs
+
+
+def attribuer_lumes(db, attributions, simulation=False, taille_lot=MASSE_TAILLE_LOT, progres=None) -> Bilan:
+    """Verse des Lumes : `attributions` = (user_id, montant, pseudo ou None), comptes créés au besoin."""
+    bilan = Bilan("lumes", simulation)
+    for lot in par_lots(attributions, taille_lot):
+        bilan.lus += len(lot)
+        bilan.lumes += sum(montant for _, montant, _ in lot)
+        operations = [
+            UpdateOne({"_id": str(user_id)},
+                      {"$inc": {"lumes": montant}, "$setOnInsert": _ouverture_compte(pseudo)},
+                      upsert=True)
+            for user_id, montant, pseudo in lot
+        ]
+        _ecrire(db.utilisateurs, operations, simulation, bilan, progres)
+    return bilan
+
+
+def accorder_quete(db, espace: str, quete, joueurs, simulation=False, taille_lot=MASSE_TAILLE_LOT,
+                   progres=None) -> Bilan:
+    """
+    Marque `quete` terminée sur un serveur pour `joueurs` = (user_id, pseudo ou None)
+    et verse sa récompense aux seuls nouveaux ; une acceptation en cours est retirée.
+    """
+    if quete["categorie"] in CATEGORIES_QUOTIDIENNES:
+        raise ValueError(f"{quete['id']} est une quête journalière : elle ne s’accorde pas en masse.")
+    bilan = Bilan("quete", simulation)
+    progression = db.progression_quetes
+    for lot in par_lots(joueurs, taille_lot):
+        lot = list({str(user_id): pseudo for user_id, pseudo in lot}.items())
+        bilan.lus += len(lot)
+        if simulation:
+            deja = {d["user_id"] for d in progression.find(
+                {"serveur": espace, "quest_id": quete["id"], "statut": "terminee",
+                 "user_id": {"$in": [user_id for user_id, _ in lot]}},
+                {"user_id": 1, "_id": 0},
+            )}
+            nouveaux = [(user_id, pseudo) for user_id, pseudo in lot if user_id not in deja]
+        else:
+            operations = [
+                UpdateOne({"serveur": espace, "user_id": user_id, "quest_id": quete["id"], "statut": "terminee"},
+                          {"$setOnInsert": {"nom": quete["nom"], "categorie": quete["categorie"], "pseudo": pseudo}},
+                          upsert=True)
+                for user_id, pseudo in lot
+            ] + [
+                DeleteOne({"serveur": espace, "user_id": user_id, "quest_id": quete["id"], "statut": "acceptee"})
+                for user_id, _ in lot
+            ]
+            resultat = progression.bulk_write(operations, ordered=False)
+            # Index des upserts = position dans le lot : seuls ces joueurs n’avaient pas la quête
+            nouveaux = [lot[i] for i in sorted(resultat.upserted_ids)]
+        bilan.ecrits += len(nouveaux)
+        bilan.ignores += len(lot) - len(nouveaux)
+        if nouveaux and quete["recompense"]:
+            bilan.lumes += quete["recompense"] * len(nouveaux)
+            if not simulation:
+                db.utilisateurs.bulk_write([
+                    UpdateOne({"_id": user_id},
+                              {"$inc": {"lumes": quete["recompense"]}, "$setOnInsert": _ouverture_compte(pseudo)},
+                              upsert=True)
+                    for user_id, pseudo in nouveaux
+                ], ordered=False)
+        bilan.lots += 1
+        if progres:
+            progres(bilan)
+    return bilan
+
+
+def lire_lignes_csv(lignes):
+    """Champs des lignes non vides (séparées par des virgules) ; `#` commente une ligne."""
+    for ligne in lignes:
+        ligne = ligne.strip()
+        if ligne and not ligne.startswith("#"):
+            yield [champ.strip() for champ in ligne.split(",")]
+
+
+def lire_attributions(lignes, montant_defaut=None):
+    """Lignes `user_id[,montant[,pseudo]]` -> (user_id, montant, pseudo)."""
+    for champs in lire_lignes_csv(lignes):
+        montant = champs[1] if len(champs) > 1 and champs[1] else montant_defaut
+        if montant is None:
+            raise ValueError(f"montant manquant pour {champs[0]} (ou passer --montant)")
+        yield champs[0], int(montant), champs[2] if len(champs) > 2 else None
+
+
+def lire_joueurs(lignes):
+    """Lignes `user_id[,pseudo]` -> (user_id, pseudo)."""
+    for champs in lire_lignes_csv(lignes):
+        yield champs[0], champs[1] if len(champs) > 1 else None
+
+
+if __name__ == "__main__":
+    from catalogue import SourceCatalogue
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--taille-lot", type=int, default=MASSE_TAILLE_LOT)
+    commandes = parser.add_subparsers(dest="commande", required=True)
+
+    p = commandes.add_parser("exporter", help="collections -> JSONL")
+    p.add_argument("-o", "--sortie", default="sauvegarde.jsonl")
+    p.add_argument("--collections", default=",".join(COLLECTIONS))
+    p.add_argument("--serveur", help="n’exporter que la progression et la config de ce serveur")
+
+    p = commandes.add_parser("importer", help="JSONL -> collections (upserts)")
+    p.add_argument("fichier")
+    p.add_argument("--collections", default=",".join(COLLECTIONS))
+    p.add_argument("--vers-serveur", help="rattacher la progression importée à ce serveur")
+    p.add_argument("--simulation", action="store_true")
+
+    p = commandes.add_parser("lumes", help="verser des Lumes (lignes user_id[,montant[,pseudo]])")
+    p.add_argument("fichier")
+    p.add_argument("--montant", type=int, help="montant des lignes qui n’en donnent pas")
+    p.add_argument("--simulation", action="store_true")
+
+    p = commandes.add_parser("accorder", help="marquer une quête terminée (lignes user_id[,pseudo])")
+    p.add_argument("quete")
+    p.add_argument("fichier")
+    p.add_argument("--serveur", required=True)
+    p.add_argument("--simulation", action="store_true")
+    args = parser.parse_args()
+
+    uri = os.getenv("MONGO_URI")
+    if not uri:
+        raise SystemExit("❌ MONGO_URI manquant.")
+    db = MongoClient(uri).lumharel_bot
+
+    def afficher(bilan):
+        print(f"  {bilan.operation} : {bilan.resume()}…")
+
+    try:
+        if args.commande == "exporter":
+            with open(args.sortie, "w", encoding="utf-8") as f:
+                bilan = exporter(db, f, args.collections.split(","), args.serveur, args.taille_lot, afficher)
+        elif args.commande == "importer":
+            with open(args.fichier, encoding="utf-8") as f:
+                bilan = importer(db, f, args.collections.split(","), args.vers_serveur, args.simulation,
+                                 args.taille_lot, afficher)
+        elif args.commande == "lumes":
+            with open(args.fichier, encoding="utf-8") as f:
+                bilan = attribuer_lumes(db, lire_attributions(f, args.montant), args.simulation,
+                                        args.taille_lot, afficher)
+        else:
+            quete = SourceCatalogue(os.getenv("QUETES_JSON_PATH", "quetes.json")).charger().quete(args.quete.upper())
+            if quete is None:
+                raise ValueError(f"quête {args.quete} introuvable dans le catalogue")
+            with open(args.fichier, encoding="utf-8") as f:
+                bilan = accorder_quete(db, args.serveur, quete, lire_joueurs(f), args.simulation,
+                                       args.taille_lot, afficher)
+    except (KeyError, ValueError) as e:
+        raise SystemExit(f"❌ {e}")
+    print(f"✅ {bilan.operation} : {bilan.resume()}.")
@@ -0,0 +1,84 @@
+"""
+Pages de `!mes_quetes`, rendues une fois et gardées en cache par joueur.
+
+Le rendu ne parcourt que les quêtes du joueur (recherchées dans le catalogue
+par ID) et découpe le texte en pages sous la limite de description d’un
+embed Discord (4096 caractères). Une entrée du cache n’est valable que pour
+l’EtatJoueur et la version du catalogue qui l’ont produite ; les handlers
+l’invalident aussi explicitement après acceptation ou complétion.
+"""
+import os
+from collections import OrderedDict
+
+# Caractères max par page (limite Discord : 4096 pour la description)
+MES_QUETES_TAILLE_PAGE = int(os.getenv("MES_QUETES_TAILLE_PAGE", "1800"))
+CACHE_PAGES_TAILLE = int(os.getenv("CACHE_PAGES_TAILLE", "2000"))
+
+
+def lignes_quetes(etat, catalogue, emojis) -> list:
+    """
+    Lignes (texte, entête à répéter en haut d’une nouvelle page ou None),
+    quêtes en cours puis terminées, par catégorie dans l’ordre de `emojis`.
+    """
+    lignes = []
+    for titre, ids in (("📜 **Quêtes en cours**", etat.acceptees),
+                       ("🏅 **Quêtes terminées**", etat.terminees)):
+        par_categorie = {cat: [] for cat in emojis}
+        for quete_id in sorted(ids):
+            quete = catalogue.quete(quete_id)
+            if quete and quete["categorie"] in par_categorie:
+                par_categorie[quete["categorie"]].append(f"• {quete['id']} – {quete['nom']}")
+
+        if lignes:
+            lignes.append(("", None))
+        lignes.append((titre, None))
+        for cat, items in par_categorie.items():
+            entete = f"{emojis[cat]} __{cat.replace('Quêtes ', '')} :__"
+            lignes.append((entete, None))
+            if not items:
+                lignes.append(("*Aucune*", None))
+            lignes.extend((item, f"{entete} *(suite)*") for item in items)
+    return lignes
+
+
+def paginer(lignes, taille=MES_QUETES_TAILLE_PAGE) -> tuple:
+    pages = []
+    courante = []
+    longueur = 0
+    for texte, entete in lignes:
+        if courante and longueur + len(texte) + 1 > taille:
+            pages.append("\n".join(courante))
+            courante = [entete] if entete else []
+            longueur = len(entete) + 1 if entete else 0
+        courante.append(texte)
+        longueur += len(texte) + 1
+    pages.append("\n".join(courante).strip() or "*Aucune quête*")
+    return tuple(pages)
+
+
+class CachePages:
+    """LRU borné : user_id -> (EtatJoueur, version du catalogue, pages)."""
+
+    def __init__(self, taille_max=CACHE_PAGES_TAILLE):
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str, etat, version: str):
+        entree = self._entrees.get(user_id)
+        if entree is None or entree[0] is not etat or entree[1] != version:
+            self.misses += 1
+            return None
+        self._entrees.move_to_end(user_id)
+        self.hits += 1
+        return entree[2]
+
+    def mettre(self, user_id: str, etat, version: str, pages):
+        self._entrees[user_id] = (etat, version, pages)
+        self._entrees.move_to_end(user_id)
+        while len(self._entrees) > self.taille_max:
+            self._entrees.popitem(last=False)
+
+    def invalider(self, user_id: str):
+        self._entrees.pop(user_id, None)
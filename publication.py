@@ -0,0 +1,81 @@
+"""
+Publication du tableau des quêtes.
+
+Tout est préparé avant le premier appel Discord (tirages de rotation, vues).
+Les catégories sont ensuite publiées l’une après l’autre : les envois dans un
+même salon partagent un bucket de rate limit, ils restent donc en série, dans
+l’ordre du tableau (les messages gardent leur ordre d’affichage). Seules les
+lectures du suivi, les écritures en base et les suppressions, qui ne dépendent
+pas de ce bucket, partent en parallèle (PUBLICATION_PARALLELE par bucket).
+discord.py gère lui-même les 429 ; les erreurs serveur (5xx) et délais
+dépassés sont réessayés ici avec un backoff exponentiel.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+import discord
+
+PUBLICATION_ESSAIS = int(os.getenv("PUBLICATION_ESSAIS", "3"))
+PUBLICATION_BACKOFF = float(os.getenv("PUBLICATION_BACKOFF", "1.0"))
+# Requêtes simultanées par bucket hors envois (suppressions unitaires, etc.)
+PUBLICATION_PARALLELE = int(os.getenv("PUBLICATION_PARALLELE", "4"))
+
+ERREURS_REESSAYABLES = (discord.DiscordServerError, asyncio.TimeoutError)
+
+
+async def avec_reessais(fabrique, essais=PUBLICATION_ESSAIS, backoff=PUBLICATION_BACKOFF):
+    """Appelle `fabrique()` (qui crée la coroutine) et réessaie sur erreur transitoire."""
+    for essai in range(essais):
+        try:
+            return await fabrique()
+        except ERREURS_REESSAYABLES:
+            if essai == essais - 1:
+                raise
+            await asyncio.sleep(backoff * 2 ** essai)
+
+
+class RapportPublication:
+    """Durée de chaque étape d’une publication, et erreurs rencontrées."""
+
+    def __init__(self):
+        self._debut = time.perf_counter()
+        self.etapes = {}
+        self.erreurs = []
+
+    @asynccontextmanager
+    async def mesurer(self, etape: str):
+        debut = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.erreurs.append(f"{etape} : {e!r}")
+            raise
+        finally:
+            self.etapes[etape] = self.etapes.get(etape, 0.0) + time.perf_counter() - debut
+
+    @property
+    def duree(self) -> float:
+        return time.perf_counter() - self._debut
+
+    def resume(self) -> str:
+        lignes = [f"⏱️ Publication en {self.duree:.2f}s"]
+        lignes += [f"• {etape} : {duree:.2f}s" for etape, duree in self.etapes.items()]
+        lignes += [f"⚠️ {erreur}" for erreur in self.erreurs]
+        return "\n".join(lignes)
+
+
+class Buckets:
+    """Un sémaphore par bucket (route, salon) : borne les requêtes simultanées."""
+
+    def __init__(self, parallele=PUBLICATION_PARALLELE):
+        self.parallele = parallele
+        self._semaphores = {}
+
+    def __call__(self, route: str, salon_id: int, parallele: int = None) -> asyncio.Semaphore:
+        cle = (route, salon_id)
+        semaphore = self._semaphores.get(cle)
+        if semaphore is None:
+            semaphore = self._semaphores[cle] = asyncio.Semaphore(parallele or self.parallele)
+        return semaphore
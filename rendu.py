@@ -0,0 +1,196 @@
+"""
+Embeds des quêtes : tableau, MP d’instructions et aperçu admin.
+
+Chaque embed est construit une seule fois par version du catalogue et gardé
+sous forme de dict sérialisé ; un accès ne fait que recréer l’objet Embed
+autour de ce dict (les embeds rendus ne doivent pas être modifiés).
+
+Les limites de Discord sont vérifiées au chargement du catalogue
+(`valider`) : un texte trop long est signalé et tronqué, au lieu de faire
+échouer l’envoi dans un handler.
+"""
+import discord
+
+EMOJI_PAR_CATEGORIE = {
+    "Quêtes Journalières": "🕘",
+    "Quêtes Interactions": "🕹️",
+    "Quêtes Recherches": "🔍",
+    "Quêtes Énigmes": "🧩",
+}
+COULEURS_PAR_CATEGORIE = {
+    "Quêtes Journalières": 0x4CAF50,
+    "Quêtes Interactions": 0x2196F3,
+    "Quêtes Recherches": 0x9C27B0,
+    "Quêtes Énigmes": 0xFFC107,
+}
+
+# Limites Discord d’un embed
+TITRE_MAX = 256
+DESCRIPTION_MAX = 4096
+NOM_CHAMP_MAX = 256
+VALEUR_CHAMP_MAX = 1024
+PIED_MAX = 2048
+TOTAL_MAX = 6000
+
+GENRES = ("tableau", "mp", "apercu")
+
+
+def _tronquer(texte: str, maximum: int) -> str:
+    texte = str(texte)
+    return texte if len(texte) <= maximum else texte[:maximum - 1] + "…"
+
+
+def construire_tableau(quete) -> discord.Embed:
+    """Message du tableau des quêtes (avec le bouton Accepter)."""
+    categorie = quete["categorie"]
+    emoji = EMOJI_PAR_CATEGORIE.get(categorie, "❓")
+    couleur = COULEURS_PAR_CATEGORIE.get(categorie, 0xCCCCCC)
+    titre = f"{emoji} {categorie}\n– {quete['id']} {quete['nom']}"
+
+    embed = discord.Embed(title=titre, description=quete["resume"], color=couleur)
+    type_texte = f"{categorie} – {quete['recompense']} Lumes"
+    embed.add_field(name="📌 Type & Récompense", value=type_texte, inline=False)
+    embed.set_footer(text="Clique sur le bouton ci-dessous pour accepter la quête.")
+    return embed
+
+
+def construire_mp(quete) -> discord.Embed:
+    """MP d’instructions envoyé à l’acceptation."""
+    categorie = quete["categorie"]
+    if categorie == "Quêtes Énigmes":
+        embed = discord.Embed(
+            title="🧩 Quête Énigmes",
+            description=f"**{quete['id']} – {quete['nom']}**",
+            color=COULEURS_PAR_CATEGORIE.get(categorie, 0xCCCCCC)
+        )
+
+        img = quete.get("image_url")
+
+        if img:
+            # Si un rébus visuel existe, on ne montre pas l’énoncé texte
+            embed.add_field(name="💬 Rébus", value="Observe bien ce symbole...", inline=False)
+            embed.set_image(url=img)
+        else:
+            # Sinon on affiche le texte d’énigme classique
+            embed.add_field(name="💬 Énoncé", value=quete["enonce"], inline=False)
+
+        embed.add_field(name="👉 Objectif", value="Trouve la réponse et réponds-moi ici.", inline=False)
+    else:
+        titre_embed = f"{EMOJI_PAR_CATEGORIE.get(categorie, '📜')} {categorie}"
+        embed = discord.Embed(
+            title=titre_embed,
+            description=f"**{quete['id']} – {quete['nom']}**",
+            color=COULEURS_PAR_CATEGORIE.get(categorie, 0xCCCCCC)
+        )
+        embed.add_field(name="💬 Description", value=quete["description"], inline=False)
+        embed.add_field(name="👉 Objectif", value=quete["details_mp"], inline=False)
+    embed.set_footer(text=f"🏅 Récompense : {quete['recompense']} Lumes")
+    return embed
+
+
+def construire_apercu(quete) -> discord.Embed:
+    """Aperçu admin (`!show_quete`) : le MP tel que le joueur le recevra."""
+    embed = construire_mp(quete)
+    embed.title = f"{embed.title} (APERÇU)"
+    return embed
+
+
+CONSTRUCTEURS = {"tableau": construire_tableau, "mp": construire_mp, "apercu": construire_apercu}
+
+
+def ajuster(donnees: dict) -> list:
+    """Tronque sur place ce qui dépasse les limites Discord ; retourne la liste des dépassements."""
+    depassements = []
+
+    def borner(objet, cle, maximum, nom):
+        valeur = objet.get(cle)
+        if valeur is not None and len(str(valeur)) > maximum:
+            depassements.append(f"{nom} ({len(str(valeur))}/{maximum})")
+            objet[cle] = _tronquer(valeur, maximum)
+
+    borner(donnees, "title", TITRE_MAX, "titre")
+    borner(donnees, "description", DESCRIPTION_MAX, "description")
+    for champ in donnees.get("fields", []):
+        borner(champ, "name", NOM_CHAMP_MAX, "nom de champ")
+        borner(champ, "value", VALEUR_CHAMP_MAX, f"champ « {champ.get('name')} »")
+    if "footer" in donnees:
+        borner(donnees["footer"], "text", PIED_MAX, "pied")
+
+    total = (len(donnees.get("title") or "") + len(donnees.get("description") or "")
+             + sum(len(c.get("name", "")) + len(c.get("value", "")) for c in donnees.get("fields", []))
+             + len(donnees.get("footer", {}).get("text", "")))
+    if total > TOTAL_MAX:
+        depassements.append(f"total ({total}/{TOTAL_MAX})")
+        if donnees.get("description"):
+            donnees["description"] = _tronquer(donnees["description"],
+                                               max(1, len(donnees["description"]) - (total - TOTAL_MAX)))
+    return depassements
+
+
+class Rendu:
+    """
+    Embeds rendus par (genre, ID de quête), pour la version du catalogue en cours.
+    (version, dicts) est remplacé d’un bloc : `valider` peut tourner dans un thread
+    pendant que les handlers lisent le cache depuis la boucle.
+    """
+
+    def __init__(self):
+        self._cache = (None, {})
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache[1])
+
+    @property
+    def version(self):
+        return self._cache[0]
+
+    def _dict(self, catalogue, genre: str, quete) -> dict:
+        version, dicts = self._cache
+        if catalogue.version != version:
+            dicts = {}
+            self._cache = (catalogue.version, dicts)
+        cle = (genre, quete["id"])
+        donnees = dicts.get(cle)
+        if donnees is None:
+            self.misses += 1
+            donnees = CONSTRUCTEURS[genre](quete).to_dict()
+            ajuster(donnees)
+            dicts[cle] = donnees
+        else:
+            self.hits += 1
+        return donnees
+
+    def embed(self, catalogue, genre: str, quete) -> discord.Embed:
+        return discord.Embed.from_dict(self._dict(catalogue, genre, quete))
+
+    def tableau(self, catalogue, quete) -> discord.Embed:
+        return self.embed(catalogue, "tableau", quete)
+
+    def mp(self, catalogue, quete) -> discord.Embed:
+        return self.embed(catalogue, "mp", quete)
+
+    def apercu(self, catalogue, quete) -> discord.Embed:
+        return self.embed(catalogue, "apercu", quete)
+
+    def valider(self, catalogue) -> list:
+        """
+        Rend tous les embeds du catalogue (ce qui remplit le cache) et retourne
+        les problèmes : champ manquant ou texte au-delà des limites Discord.
+        """
+        dicts = {}
+        problemes = []
+        for quete in catalogue.toutes:
+            for genre in GENRES:
+                try:
+                    donnees = CONSTRUCTEURS[genre](quete).to_dict()
+                except KeyError as e:
+                    problemes.append(f"{quete['id']} ({genre}) : champ manquant {e}")
+                    continue
+                depassements = ajuster(donnees)
+                if depassements:
+                    problemes.append(f"{quete['id']} ({genre}) : tronqué — {', '.join(depassements)}")
+                dicts[(genre, quete["id"])] = donnees
+        self._cache = (catalogue.version, dicts)
+        return problemes
@@ -0,0 +1,158 @@
+"""
+Moteur de correspondance des réponses (Énigmes / Recherches).
+
+Les réponses attendues sont normalisées une seule fois à la construction :
+- table de hachage réponse normalisée -> IDs de quêtes (correspondance exacte) ;
+- index de trigrammes pour un mode tolérant aux fautes de frappe, borné en
+  distance d’édition.
+
+Aucune dépendance à Discord : utilisable seul pour les tests et mesures.
+"""
+import re
+import unicodedata
+
+_GUILLEMETS = re.compile(r'[“”«»]')
+_ESPACES = re.compile(r"\s+")
+
+# Longueur minimale d’une réponse pour accepter une faute, et distance max par palier.
+TOLERANCE_LONGUEUR_MIN = 4
+TOLERANCE_PALIERS = ((8, 1), (None, 2))  # <= 8 car. : 1 faute, au-delà : 2
+CANDIDATS_MAX = 20
+
+
+def normaliser(texte):
+    if not isinstance(texte, str):
+        return ""
+    texte = texte.lower().strip()
+    texte = unicodedata.normalize("NFKD", texte)
+    texte = "".join(c for c in texte if not unicodedata.combining(c))
+    texte = texte.replace("’", "'")
+    texte = _GUILLEMETS.sub('"', texte)
+    texte = _ESPACES.sub(" ", texte)
+    texte = texte.replace("\u200b", "")
+    return texte
+
+
+def variantes_reponse(quete) -> list:
+    """Réponses acceptées d’une quête : `reponse_attendue` (texte ou liste) + `reponses_acceptees`."""
+    variantes = []
+    for champ in ("reponse_attendue", "reponses_acceptees"):
+        valeur = quete.get(champ)
+        if isinstance(valeur, str):
+            variantes.append(valeur)
+        elif isinstance(valeur, (list, tuple)):
+            variantes.extend(v for v in valeur if isinstance(v, str))
+    return variantes
+
+
+def trigrammes(texte: str) -> set:
+    t = f"  {texte} "
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+def distance_max(longueur: int) -> int:
+    if longueur < TOLERANCE_LONGUEUR_MIN:
+        return 0
+    for borne, distance in TOLERANCE_PALIERS:
+        if borne is None or longueur <= borne:
+            return distance
+    return 0
+
+
+def distance_bornee(a: str, b: str, maximum: int) -> int:
+    """Distance de Levenshtein, ou `maximum + 1` dès qu’elle dépasse `maximum`."""
+    if abs(len(a) - len(b)) > maximum:
+        return maximum + 1
+    precedente = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        courante = [i]
+        for j, cb in enumerate(b, 1):
+            courante.append(min(
+                precedente[j] + 1,
+                courante[j - 1] + 1,
+                precedente[j - 1] + (ca != cb),
+            ))
+        if min(courante) > maximum:
+            return maximum + 1
+        precedente = courante
+    return precedente[-1]
+
+
+class MoteurReponses:
+    """Réponses normalisées de toutes les quêtes à réponse texte."""
+
+    def __init__(self, quetes):
+        self.exactes = {}    # réponse normalisée -> tuple d’IDs
+        self._trigrammes = None  # trigramme -> set de réponses normalisées (mode tolérant seulement)
+        exactes = {}
+        for quete in quetes:
+            # Un instantané compilé fournit les réponses déjà normalisées
+            cles = quete.get("reponses_normalisees")
+            if cles is None:
+                cles = [normaliser(v) for v in variantes_reponse(quete)]
+            for cle in cles:
+                if not cle:
+                    continue
+                exactes.setdefault(cle, []).append(quete["id"])
+        for cle, ids in exactes.items():
+            self.exactes[cle] = tuple(dict.fromkeys(ids))
+
+    def __len__(self):
+        return len(self.exactes)
+
+    @property
+    def trigrammes(self) -> dict:
+        """Index de trigrammes, construit au premier besoin : le mode exact n’en a pas l’usage."""
+        self.preparer_tolerance()
+        return self._trigrammes
+
+    def preparer_tolerance(self):
+        """Construit l’index de trigrammes du mode tolérant, s’il ne l’est pas déjà."""
+        if self._trigrammes is None:
+            index = {}
+            for cle in self.exactes:
+                for tri in trigrammes(cle):
+                    index.setdefault(tri, set()).add(cle)
+            self._trigrammes = index
+
+    def _approchees(self, texte: str) -> list:
+        """Réponses à distance d’édition bornée, de la plus proche à la plus lointaine."""
+        maximum = distance_max(len(texte))
+        if not maximum:
+            return []
+        scores = {}
+        for tri in trigrammes(texte):
+            for cle in self.trigrammes.get(tri, ()):
+                scores[cle] = scores.get(cle, 0) + 1
+        candidats = sorted(scores, key=scores.get, reverse=True)[:CANDIDATS_MAX]
+        trouvees = []
+        for cle in candidats:
+            limite = min(maximum, distance_max(len(cle)))
+            if not limite:
+                continue
+            d = distance_bornee(texte, cle, limite)
+            if d <= limite:
+                trouvees.append((d, cle))
+        trouvees.sort()
+        return [cle for _, cle in trouvees]
+
+    def correspondances(self, texte: str, parmi=None, tolerance: bool = False) -> list:
+        """
+        IDs des quêtes dont une réponse correspond à `texte`, limités à `parmi`
+        (ex. quêtes acceptées) si fourni. Exact d’abord, puis approché si `tolerance`.
+        """
+        texte = normaliser(texte)
+        if not texte:
+            return []
+        ids = self._filtrer([texte], parmi)
+        if not ids and tolerance:
+            ids = self._filtrer(self._approchees(texte), parmi)
+        return ids
+
+    def _filtrer(self, cles, parmi) -> list:
+        ids = []
+        for cle in cles:
+            for qid in self.exactes.get(cle, ()):
+                if (parmi is None or qid in parmi) and qid not in ids:
+                    ids.append(qid)
+        return ids
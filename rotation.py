@@ -0,0 +1,74 @@
+"""
+Rotation des quêtes hebdomadaires.
+
+Chaque (tableau, catégorie) a un document : une permutation mélangée des IDs
+de quêtes et un curseur. Un tirage est un seul `find_one_and_update` avec
+`$inc` sur le curseur, qui ne renvoie que le curseur : taille constante, et
+deux process qui postent en même temps obtiennent deux positions différentes.
+
+La permutation dépend uniquement du tableau, de la catégorie et de la liste
+des IDs : quand le catalogue change, chaque process recalcule la même, et le
+premier qui voit la nouvelle version la réinitialise en base.
+"""
+import hashlib
+import random
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Tableau par défaut (un seul salon de quêtes)
+TABLEAU_DEFAUT = "principal"
+
+
+def version_ids(ids) -> str:
+    return hashlib.sha1("\n".join(ids).encode()).hexdigest()[:12]
+
+
+def permutation(cle: str, ids, version: str) -> tuple:
+    """Mélange déterministe : même clé et mêmes IDs -> même ordre partout."""
+    ordre = list(ids)
+    random.Random(f"{cle}:{version}").shuffle(ordre)
+    return tuple(ordre)
+
+
+class RotationQuetes:
+    def __init__(self, collection):
+        self.collection = collection
+        self._ordres = {}  # (clé, version) -> permutation
+
+    def _ordre(self, cle: str, ids, version: str) -> tuple:
+        ordre = self._ordres.get((cle, version))
+        if ordre is None:
+            ordre = self._ordres[(cle, version)] = permutation(cle, ids, version)
+        return ordre
+
+    async def tirer(self, categorie: str, quetes_possibles, tableau=TABLEAU_DEFAUT):
+        """Quête suivante de la permutation ; on recommence au début une fois tout posté."""
+        par_id = {q["id"]: q for q in quetes_possibles}
+        if not par_id:
+            return None
+        ids = sorted(par_id)
+        version = version_ids(ids)
+        cle = f"{tableau}:{categorie}"
+        ordre = self._ordre(cle, ids, version)
+
+        for _ in range(3):
+            doc = await self.collection.find_one_and_update(
+                {"_id": cle, "version": version},
+                {"$inc": {"curseur": 1}},
+                projection={"_id": 0, "curseur": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is not None:
+                return par_id[ordre[(doc["curseur"] - 1) % len(ordre)]]
+            # Document absent ou catalogue modifié : nouvelle permutation, curseur à zéro
+            try:
+                await self.collection.update_one(
+                    {"_id": cle, "version": {"$ne": version}},
+                    {"$set": {"version": version, "ordre": list(ordre), "curseur": 0,
+                              "tableau": tableau, "categorie": categorie}},
+                    upsert=True,
+                )
+            except DuplicateKeyError:
+                pass  # un autre process vient de l’initialiser avec la même version
+        raise RuntimeError(f"Rotation {cle} : impossible d’avancer le curseur")
@@ -0,0 +1,88 @@
+"""
+Configuration par serveur Discord : salon du tableau, salon et rôle d’annonce.
+
+Un document par serveur dans `config_serveurs`. Tout est lu au démarrage et
+gardé en mémoire : les handlers ne lisent jamais leur config dans Mongo.
+`!configurer` écrit puis applique tout de suite en local ; les changements
+faits par les autres process sont repris à la relecture périodique
+(SERVEURS_INTERVALLE).
+
+Chaque serveur a son propre espace de progression (champ `serveur` des
+documents de progression_quetes) et sa propre rotation (`tableau`). Le
+serveur historique (QUESTS_CHANNEL_ID) est repris au premier démarrage :
+il garde la rotation "principal" et les progressions déjà enregistrées.
+"""
+import os
+
+from pymongo import ReturnDocument
+
+from rotation import TABLEAU_DEFAUT
+
+SERVEURS_INTERVALLE = float(os.getenv("SERVEURS_INTERVALLE", "300"))
+
+
+class ConfigServeur:
+    __slots__ = ("guild_id", "salon_quetes", "salon_annonces", "role_annonce", "tableau")
+
+    def __init__(self, guild_id: int, salon_quetes=None, salon_annonces=None, role_annonce=None, tableau=None):
+        self.guild_id = guild_id
+        self.salon_quetes = salon_quetes
+        self.salon_annonces = salon_annonces
+        self.role_annonce = role_annonce
+        # Clé de rotation : une permutation par serveur
+        self.tableau = tableau or str(guild_id)
+
+    @classmethod
+    def depuis_doc(cls, doc) -> "ConfigServeur":
+        return cls(doc["_id"], doc.get("salon_quetes"), doc.get("salon_annonces"),
+                   doc.get("role_annonce"), doc.get("tableau"))
+
+    @property
+    def espace(self) -> str:
+        """Valeur du champ `serveur` des progressions de ce serveur."""
+        return str(self.guild_id)
+
+
+class ConfigsServeurs:
+    def __init__(self, collection):
+        self.collection = collection
+        self._configs = {}  # guild_id -> ConfigServeur
+
+    def __iter__(self):
+        return iter(list(self._configs.values()))
+
+    def __len__(self):
+        return len(self._configs)
+
+    def get(self, guild_id):
+        return self._configs.get(guild_id) if guild_id is not None else None
+
+    async def charger(self):
+        """Relit toutes les configs (remplacement en bloc, atomique pour les handlers)."""
+        docs = await self.collection.find({})
+        self._configs = {d["_id"]: ConfigServeur.depuis_doc(d) for d in docs}
+
+    async def definir(self, guild_id: int, **champs) -> ConfigServeur:
+        doc = await self.collection.find_one_and_update(
+            {"_id": guild_id}, {"$set": champs}, upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        config = self._configs[guild_id] = ConfigServeur.depuis_doc(doc)
+        return config
+
+    async def reprendre_historique(self, guild_id: int, progression, **champs) -> bool:
+        """
+        Crée la config du serveur historique si elle n’existe pas encore, avec la
+        rotation "principal", et rattache à ce serveur les progressions sans serveur.
+        Retourne True si la reprise vient d’avoir lieu.
+        """
+        avant = await self.collection.find_one_and_update(
+            {"_id": guild_id},
+            {"$setOnInsert": {**champs, "tableau": TABLEAU_DEFAUT}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+        if avant is not None:
+            return False
+        await progression.update_many({"serveur": {"$exists": False}}, {"$set": {"serveur": str(guild_id)}})
+        await self.charger()
+        return True